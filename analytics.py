@@ -0,0 +1,297 @@
+import json
+import logging
+import os
+import time
+
+import numpy as np
+
+from archive import ACTION_CAPTURE, ACTION_INVALID_CAPTURE
+from captures import find_all_captures
+from cards import Card
+
+logger = logging.getLogger(__name__)
+
+ANALYTICS_DIR = os.path.join("logs", "analytics")
+
+# One row per logged move. Codes: model indexes meta["models"], error is
+# 0 (none), 1 (model error) or 2 (transport error).
+COLUMNS = {
+    "game": np.int32,               # row in meta["games"]
+    "move": np.int16,               # move number within the game
+    "seat": np.int8,
+    "player_count": np.int8,
+    "model": np.int16,
+    "hand_size": np.int8,
+    "table_size": np.int8,
+    "played_card": np.int8,         # Card.id
+    "available_captures": np.int16,  # legal captures over the whole hand
+    "available_escoba": np.bool_,
+    "chosen_capture": np.int8,      # table cards captured, 0 for a drop
+    "invalid_capture": np.bool_,
+    "missed_capture": np.bool_,     # dropped a card although a capture was available
+    "escoba": np.bool_,
+    "missed_escoba": np.bool_,
+    "error": np.int8,
+}
+ERROR_CODES = {None: 0, False: 0, True: 1, "transport": 2}
+
+def _error_code(value):
+    # Anything else that was logged as an error is the model's.
+    return ERROR_CODES.get(value, 1) if value is None or isinstance(value, (bool, str)) else 1
+
+def compile_record(record, game_row, model_codes):
+    """
+    Column values for every move of one compact archive record (see
+    archive.compact_game), as a dict of lists. model_codes maps model names
+    to codes and is extended in place.
+    """
+    models = {p["name"]: p.get("model") or p["name"] for p in (record.get("meta") or {}).get("players", [])}
+    seats = [model_codes.setdefault(models.get(name, name), len(model_codes)) for name in record["players"]]
+    player_count = len(record["players"])
+    columns = {name: [] for name in COLUMNS}
+    table = [Card.from_id(card_id) for card_id in record["table0"]]
+    number = 0
+    for entry in record["log"]:
+        if entry[0] != "m":
+            continue
+        _, seat, hand, played, captured, action, escoba = entry[:7]
+        extra = entry[7] if len(entry) > 7 else {}
+        hand_cards = [Card.from_id(card_id) for card_id in hand]
+        options = find_all_captures(hand_cards, table)
+        available = sum(len(captures) for captures in options.values())
+        available_escoba = any(clears for captures in options.values() for _, clears in captures)
+        chosen = len(captured) if action == ACTION_CAPTURE else 0
+
+        columns["game"].append(game_row)
+        columns["move"].append(number)
+        columns["seat"].append(seat)
+        columns["player_count"].append(player_count)
+        columns["model"].append(seats[seat])
+        columns["hand_size"].append(len(hand))
+        columns["table_size"].append(len(table))
+        columns["played_card"].append(played)
+        columns["available_captures"].append(available)
+        columns["available_escoba"].append(available_escoba)
+        columns["chosen_capture"].append(chosen)
+        columns["invalid_capture"].append(action == ACTION_INVALID_CAPTURE)
+        columns["missed_capture"].append(available > 0 and chosen == 0)
+        columns["escoba"].append(bool(escoba))
+        columns["missed_escoba"].append(available_escoba and not escoba)
+        columns["error"].append(_error_code(extra.get("error")))
+
+        if action == ACTION_CAPTURE:
+            taken = set(captured)
+            table = [card for card in table if card.id not in taken]
+        else:
+            table.append(Card.from_id(played))
+        number += 1
+    return columns
+
+# -------------------------------
+# Build
+# -------------------------------
+def _load_meta(directory):
+    path = os.path.join(directory, "meta.json")
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def build(archive, directory=None, rebuild=False, parquet=False):
+    """
+    Compiles the move records of every archived game into one .npy file per
+    column in `directory` (plus meta.json with the model and game lists).
+    Games already compiled are kept, so only new games are parsed unless
+    rebuild is set. parquet=True also writes moves.parquet (needs pyarrow).
+    Returns {"games", "new_games", "moves", "elapsed"}.
+    """
+    directory = directory or ANALYTICS_DIR
+    started = time.perf_counter()
+    meta = None if rebuild else _load_meta(directory)
+    existing = MoveTable.load(directory) if meta else None
+    if meta is None:
+        meta = {"models": [], "games": []}
+    model_codes = {model: code for code, model in enumerate(meta["models"])}
+    known = {game["id"] for game in meta["games"]}
+
+    new = {name: [] for name in COLUMNS}
+    new_games = 0
+    for game_id, _, _, _ in archive.query():
+        if game_id in known:
+            continue
+        record = archive.get(game_id)
+        meta["games"].append({"id": game_id, "ts": record["ts"], "players": len(record["players"])})
+        for name, values in compile_record(record, len(meta["games"]) - 1, model_codes).items():
+            new[name].extend(values)
+        new_games += 1
+    meta["models"] = sorted(model_codes, key=model_codes.get)
+
+    os.makedirs(directory, exist_ok=True)
+    if new_games or existing is None:
+        for name, dtype in COLUMNS.items():
+            column = np.asarray(new[name], dtype=dtype)
+            if existing is not None:
+                column = np.concatenate([existing.columns[name], column])
+            # Write beside the old file and swap, so open memory maps stay valid.
+            tmp_path = os.path.join(directory, f"{name}.tmp.npy")
+            np.save(tmp_path, column)
+            os.replace(tmp_path, os.path.join(directory, f"{name}.npy"))
+        meta["built"] = time.time()
+        tmp_path = os.path.join(directory, "meta.json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, os.path.join(directory, "meta.json"))
+
+    table = MoveTable.load(directory)
+    if parquet:
+        table.to_parquet(os.path.join(directory, "moves.parquet"))
+    return {"games": len(meta["games"]), "new_games": new_games, "moves": len(table),
+            "elapsed": time.perf_counter() - started}
+
+# -------------------------------
+# Queries
+# -------------------------------
+class MoveTable:
+    """
+    The compiled move columns, memory-mapped read-only. where() narrows the
+    rows; count(), mean(), share(), rate() and per_game() aggregate them, optionally
+    grouped by a column (model codes are reported as model names).
+    """
+    def __init__(self, columns, meta, selection=None):
+        self.columns = columns
+        self.meta = meta
+        self.selection = selection
+
+    @classmethod
+    def load(cls, directory=None):
+        directory = directory or ANALYTICS_DIR
+        meta = _load_meta(directory)
+        if meta is None:
+            raise FileNotFoundError(f"No analytics data in {directory}; run `cli.py analytics build` first")
+        columns = {
+            name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+            for name in COLUMNS
+        }
+        return cls(columns, meta)
+
+    def __len__(self):
+        if self.selection is None:
+            return len(self.columns["game"])
+        return int(np.count_nonzero(self.selection))
+
+    def column(self, name):
+        values = self.columns[name]
+        return values if self.selection is None else values[self.selection]
+
+    def model_code(self, model):
+        try:
+            return self.meta["models"].index(model)
+        except ValueError:
+            return -1
+
+    def where(self, **conditions):
+        """
+        Rows where every column equals the given value (a model name for
+        model). A callable value is applied to the column and must return a
+        boolean array, e.g. table_size=lambda size: size >= 4.
+        """
+        selection = np.ones(len(self.columns["game"]), dtype=bool) if self.selection is None \
+            else self.selection.copy()
+        for name, value in conditions.items():
+            if name == "model" and isinstance(value, str):
+                value = self.model_code(value)
+            column = self.columns[name]
+            selection &= value(column) if callable(value) else column == value
+        return MoveTable(self.columns, self.meta, selection)
+
+    def _labels(self, by, codes):
+        if by == "model":
+            return [self.meta["models"][code] for code in codes]
+        return [int(code) for code in codes]
+
+    # Every column holds small non-negative ints, so groups are bincount bins.
+    def _groups(self, by):
+        keys = self.column(by).astype(np.intp)
+        return keys, (int(keys.max()) + 1 if len(keys) else 0)
+
+    def _grouped(self, by, totals, counts):
+        present = np.flatnonzero(counts)
+        return dict(zip(self._labels(by, present), (totals[present] / counts[present]).tolist()))
+
+    def count(self, by=None):
+        if by is None:
+            return len(self)
+        keys, size = self._groups(by)
+        counts = np.bincount(keys, minlength=size)
+        present = np.flatnonzero(counts)
+        return dict(zip(self._labels(by, present), counts[present].tolist()))
+
+    def mean(self, name, by=None):
+        """
+        Mean of a column, overall or {group: mean}.
+        """
+        return self._mean(self.column(name), by)
+
+    def share(self, name, value, by=None):
+        """
+        Share of rows where a column equals value, e.g. share("error", 1).
+        """
+        return self._mean(self.column(name) == value, by)
+
+    def _mean(self, values, by):
+        if by is None:
+            return float(values.mean()) if len(values) else None
+        keys, size = self._groups(by)
+        totals = np.bincount(keys, weights=values, minlength=size)
+        return self._grouped(by, totals, np.bincount(keys, minlength=size))
+
+    def rate(self, name, by=None, **conditions):
+        """
+        Share of rows (matching conditions, see where) where a boolean column
+        is set, e.g. rate("missed_capture", by="model",
+        available_captures=lambda n: n > 0).
+        """
+        return (self.where(**conditions) if conditions else self).mean(name, by)
+
+    def per_game(self, name, by=None):
+        """
+        Sum of a column per game, averaged over the games in each group, e.g.
+        per_game("escoba", by="player_count").
+        """
+        values = self.column(name)
+        games = self.column("game").astype(np.int64)
+        if by is None:
+            count = len(np.unique(games))
+            return float(values.sum() / count) if count else None
+        keys, size = self._groups(by)
+        totals = np.bincount(keys, weights=values, minlength=size)
+        # Distinct (group, game) pairs give the number of games per group.
+        pairs = np.unique(games * size + keys)
+        return self._grouped(by, totals, np.bincount(pairs % size, minlength=size))
+
+    def to_parquet(self, path):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError as ex:
+            raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)") from ex
+        data = {name: np.asarray(self.column(name)) for name in COLUMNS}
+        data["model"] = np.asarray(self.meta["models"], dtype=object)[data["model"]] \
+            if self.meta["models"] else data["model"]
+        pyarrow.parquet.write_table(pyarrow.table(data), path)
+        return path
+
+def report(table):
+    """
+    The standard questions, as {title: {group: value}}.
+    """
+    return {
+        "moves by model": table.count(by="model"),
+        "missed capture rate by model": table.rate("missed_capture", by="model",
+                                                   available_captures=lambda n: n > 0),
+        "missed escoba rate by model": table.rate("missed_escoba", by="model", available_escoba=True),
+        "invalid capture rate by model": table.rate("invalid_capture", by="model"),
+        "model error rate by model": table.share("error", ERROR_CODES[True], by="model"),
+        "transport error rate by model": table.share("error", ERROR_CODES["transport"], by="model"),
+        "escobas per game by player count": table.per_game("escoba", by="player_count"),
+    }
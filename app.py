@@ -1,18 +1,34 @@
-from flask import Flask, render_template, jsonify, request
+import json
+import os
+from datetime import datetime, timezone
+from flask import Flask, Response, redirect, render_template, jsonify, request, stream_with_context
+from archive import GameArchive
+from bots import is_bot, make_strategy
 from game import GameManager, Player
+from instrumentation import Instrumentation
+from jobs import Job, JobQueue, JobStore, QueueFull
 from llm_client import LLMClient
 from rankings import RankingSystem
+from scheduler import RequestScheduler
+from telemetry import summarize_by_model
 import logging
-from config import OPENROUTER_API_KEY, DEFAULT_MODEL, DEFAULT_MODELS  # Updated import
+from config import OPENROUTER_API_KEY, DEFAULT_MODEL, DEFAULT_MODELS, JOB_WORKERS, JOB_QUEUE_LIMIT, LOG_LEVEL
 from utils import save_game_log
 
 # Configure logging
-logging.basicConfig(level=logging.DEBUG,
+logging.basicConfig(level=LOG_LEVEL,
                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 ranking_system = RankingSystem()
+game_archive = GameArchive()
+# One scheduler for every job, so per-model rate limits hold across concurrent games.
+request_scheduler = RequestScheduler()
+# Phase timings and event counters of every game played here, served at /metrics.
+metrics = Instrumentation()
+job_store = JobStore()
+job_queue = JobQueue(job_store, workers=JOB_WORKERS, max_pending=JOB_QUEUE_LIMIT)
 
 @app.route("/")
 def index():
@@ -20,62 +36,203 @@ def index():
                          default_models=DEFAULT_MODELS,
                          default_api_key=OPENROUTER_API_KEY)
 
+# The last rendered rankings page, keyed by leaderboard revision.
+_rankings_page = {"revision": None, "html": None}
+
 @app.route("/rankings")
 def rankings():
-    rankings_data = ranking_system.get_rankings()
-    return render_template("rankings.html", rankings=rankings_data)
+    board = ranking_system.get_leaderboard()
+    etag = f"rankings-{board['revision']}"
+    updated = None
+    if board["updated"] is not None:
+        updated = datetime.fromtimestamp(int(board["updated"]), timezone.utc)
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains(etag)
+    else:
+        not_modified = updated is not None and request.if_modified_since is not None \
+            and updated <= request.if_modified_since
+    if not_modified:
+        response = Response(status=304)
+    else:
+        if _rankings_page["revision"] != board["revision"]:
+            _rankings_page["html"] = render_template("rankings.html", rankings=board["models"])
+            _rankings_page["revision"] = board["revision"]
+        response = Response(_rankings_page["html"], mimetype="text/html")
+    response.set_etag(etag)
+    if updated is not None:
+        response.last_modified = updated
+    response.cache_control.no_cache = True
+    return response
 
-@app.route("/simulate", methods=["POST"])
-def simulate():
-    # Read parameters from the POST JSON payload.
-    data = request.get_json()
-    logger.debug(f"Received simulation request with data: {data}")
+def build_players(data):
+    """
+    Creates the players for a simulation request payload.
+    """
     try:
         num_players = int(data.get("num_players", 3))
     except ValueError:
         num_players = 3
-    logger.debug(f"Number of players: {num_players}")
+    logger.debug("Number of players: %s", num_players)
     
     # Use the API key from the configuration as default if not supplied.
     api_key = data.get("api_key", OPENROUTER_API_KEY)
     models = data.get("models", [])
-    logger.debug(f"Using models: {models}")
+    logger.debug("Using models: %s", models)
     
     players = []
     for i in range(num_players):
         # Use provided model if available; otherwise default.
         model_choice = models[i] if i < len(models) and models[i].strip() != "" else DEFAULT_MODEL
         # Use the model name as the player name to be consistent with CLI
-        players.append(Player(model_choice, api_key=api_key, model=model_choice))
-    logger.debug(f"Created players: {players}")
-    
-    game_manager = GameManager(players)
-    ai_client = LLMClient(api_key=api_key)
+        players.append(Player(model_choice, api_key=api_key, model=model_choice,
+                              strategy=make_strategy(model_choice) if is_bot(model_choice) else None))
+    logger.debug("Created players: %s", players)
+    return players, api_key
+
+def run_game(players, api_key, on_event=None, suffix=None):
+    """
+    Plays a game, updates the rankings and saves the log (suffix goes into
+    the log file name, which doubles as the game's archive id).
+    """
+    game_manager = GameManager(players, on_event=on_event, instrumentation=metrics)
+    ai_client = LLMClient(api_key=api_key, scheduler=request_scheduler)
     
     logger.debug("Starting game...")
     final_scores = game_manager.play_game(ai_client=ai_client)
-    logger.debug(f"Game completed. Final scores: {final_scores}")
+    logger.debug("Game completed. Final scores: %s", final_scores)
     
     # Update rankings with the game results
-    ranking_system.update_rankings(final_scores)
+    ranking_system.update_rankings(final_scores, usage=summarize_by_model(players),
+                                   stats=game_manager.player_stats())
     logger.debug("Rankings updated successfully")
     
     # Save detailed game log
     log_file = save_game_log(
         game_manager.game_log,
-        metadata=game_manager.metadata
+        metadata=game_manager.metadata,
+        suffix=suffix
     )
-    logger.info(f"Game log saved to {log_file}")
-    
-    return jsonify(
-        game_log=game_manager.game_log,
-        final_scores=final_scores,
-        log_file=log_file
+    # Archived under the log file's name, so `archive import` skips the file.
+    game_archive.add_game(game_manager.game_log, metadata=game_manager.metadata,
+                          game_id=os.path.splitext(os.path.basename(log_file))[0])
+    return game_manager, final_scores, log_file
+
+def run_game_job(job, players, api_key):
+    # Jobs run concurrently, so the job id keeps their log files apart.
+    game_manager, final_scores, log_file = run_game(players, api_key, on_event=job.publish, suffix=job.id[:8])
+    summary = {"final_scores": final_scores, "log_file": log_file}
+    job.finish(dict(summary, game_log=game_manager.game_log), summary=summary)
+
+def job_urls(job):
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/jobs/{job.id}",
+        "result_url": f"/jobs/{job.id}/result",
+        "events_url": f"/jobs/{job.id}/events",
+    }
+
+def queue_game():
+    """
+    Queues a game for the POSTed JSON payload. Returns the job, or a 503
+    response when the queue is full.
+    """
+    # Read parameters from the POST JSON payload.
+    data = request.get_json()
+    logger.debug("Received simulation request with data: %s", data)
+    players, api_key = build_players(data)
+    job = Job({"models": [p.model for p in players]})
+    try:
+        job_queue.submit(job, run_game_job, players, api_key)
+    except QueueFull as ex:
+        logger.warning("%s", ex)
+        response = jsonify(error=str(ex))
+        response.headers["Retry-After"] = "30"
+        return None, (response, 503)
+    return job, None
+
+@app.route("/simulate", methods=["POST"])
+def simulate():
+    """
+    Queues a game and returns its job id immediately (202). Poll
+    /jobs/<job_id> and /jobs/<job_id>/result, or follow
+    /jobs/<job_id>/events. Returns 503 when the queue is full.
+    """
+    job, busy = queue_game()
+    if busy:
+        return busy
+    return jsonify(job_urls(job)), 202
+
+@app.route("/simulate/stream", methods=["POST"])
+def simulate_stream():
+    """
+    Queues a game and redirects (303) to its event stream, for clients that
+    want the events straight from the POST.
+    """
+    job, busy = queue_game()
+    if busy:
+        return busy
+    return redirect(f"/jobs/{job.id}/events", code=303)
+
+@app.route("/jobs/<job_id>")
+def job_status(job_id):
+    job = job_store.get(job_id)
+    if job is None:
+        return jsonify(error="Unknown job"), 404
+    return jsonify(job.describe())
+
+@app.route("/jobs/<job_id>/result")
+def job_result(job_id):
+    job = job_store.get(job_id)
+    if job is None:
+        return jsonify(error="Unknown job"), 404
+    if job.status == "failed":
+        return jsonify(job.describe()), 500
+    if not job.done:
+        return jsonify(job.describe()), 202
+    return jsonify(job.result)
+
+@app.route("/jobs/<job_id>/events")
+def job_events(job_id):
+    """
+    Server-Sent Events stream of a job's game events. Reconnecting clients
+    send Last-Event-ID (or ?last_event_id=) and only get what they missed.
+    """
+    job = job_store.get(job_id)
+    if job is None:
+        return jsonify(error="Unknown job"), 404
+    last_id = request.headers.get("Last-Event-ID", request.args.get("last_event_id", -1))
+    try:
+        last_id = int(last_id)
+    except ValueError:
+        last_id = -1
+
+    def stream(last_id):
+        while True:
+            events = job.events_after(last_id)
+            if not events:
+                # Comment line keeps proxies from closing an idle connection.
+                yield ": keep-alive\n\n"
+                continue
+            for event_id, kind, data in events:
+                yield f"id: {event_id}\nevent: {kind}\ndata: {json.dumps(data)}\n\n"
+                last_id = event_id
+                if kind in ("done", "failed"):
+                    return
+
+    return Response(
+        stream_with_context(stream(last_id)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
+@app.route("/metrics")
+def prometheus_metrics():
+    return Response(metrics.prometheus(), mimetype="text/plain; version=0.0.4")
+
 @app.route("/models")
 def models():
-    logger.debug(f"Returning models: {DEFAULT_MODELS}")
+    logger.debug("Returning models: %s", DEFAULT_MODELS)
     return jsonify(DEFAULT_MODELS)
 
 if __name__ == '__main__':
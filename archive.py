@@ -0,0 +1,417 @@
+import glob
+import json
+import logging
+import os
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+
+from cards import Card
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIR = os.path.join("logs", "archive")
+SEGMENT_BYTES = 64 * 1024 * 1024
+FORMAT_VERSION = 1
+
+# Move actions, stored as small ints.
+ACTION_DROP = 0
+ACTION_CAPTURE = 1
+ACTION_INVALID_CAPTURE = 2
+ACTION_TEXT = {
+    ACTION_DROP: "Played card to table (no capture)",
+    ACTION_INVALID_CAPTURE: "Played card to table (invalid capture provided, treated as no capture)",
+}
+MOVE_KEYS = {"player", "hand", "table_before", "played_card", "action", "escoba", "table_after"}
+
+INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    id TEXT PRIMARY KEY,
+    segment TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    timestamp TEXT NOT NULL,
+    num_players INTEGER NOT NULL,
+    winner TEXT,
+    early_termination INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS games_timestamp ON games (timestamp);
+CREATE INDEX IF NOT EXISTS games_winner ON games (winner);
+CREATE TABLE IF NOT EXISTS game_models (
+    game_id TEXT NOT NULL,
+    model TEXT NOT NULL,
+    score INTEGER,
+    PRIMARY KEY (game_id, model)
+);
+CREATE INDEX IF NOT EXISTS game_models_model ON game_models (model);
+CREATE TABLE IF NOT EXISTS move_quality (
+    game_id TEXT NOT NULL,
+    move INTEGER NOT NULL,
+    model TEXT,
+    legal_moves INTEGER NOT NULL,
+    rollouts INTEGER NOT NULL,
+    expected REAL NOT NULL,
+    best_expected REAL NOT NULL,
+    regret REAL NOT NULL,
+    optimal INTEGER NOT NULL,
+    PRIMARY KEY (game_id, move)
+);
+CREATE INDEX IF NOT EXISTS move_quality_model ON move_quality (model);
+"""
+
+# -------------------------------
+# Compact encoding
+# -------------------------------
+def _ids(card_strs):
+    return [Card.from_str(name).id for name in card_strs]
+
+def _names(card_ids):
+    return [str(Card.from_id(card_id)) for card_id in card_ids]
+
+def compact_game(game_log, metadata=None, game_id=None, timestamp=None):
+    """
+    Encodes a verbose game_log as a compact record: card ids instead of card
+    strings, players as seat indices, and the table stored once (the table
+    before the first move) with every later table derived from the moves.
+    """
+    metadata = metadata or {}
+    # Self-play games repeat a name; moves only need it back, so the first seat will do.
+    players = [p["name"] for p in metadata.get("players", [])]
+
+    def seat(name):
+        if name not in players:
+            players.append(name)
+        return players.index(name)
+
+    table0 = None
+    entries = []
+    for entry in game_log:
+        if "event" in entry:
+            event = dict(entry)
+            for key in ("cards", "collected"):
+                if key in event:
+                    event[key] = _ids(event[key])
+            entries.append(["e", event])
+            continue
+
+        before = _ids(entry["table_before"])
+        after = _ids(entry["table_after"])
+        if table0 is None:
+            table0 = before
+        played = Card.from_str(entry["played_card"]).id
+        action_text = entry.get("action", "")
+        if action_text.startswith("Captured "):
+            # Keep the order the player listed them in.
+            captured = _ids(action_text[len("Captured "):].split(", "))
+        else:
+            captured = [card_id for card_id in before if card_id not in after]
+        if captured:
+            action = ACTION_CAPTURE
+        elif "invalid capture" in action_text:
+            action = ACTION_INVALID_CAPTURE
+        else:
+            action = ACTION_DROP
+        move = ["m", seat(entry["player"]), _ids(entry["hand"]), played, captured,
+                action, int(bool(entry.get("escoba")))]
+        extra = {k: v for k, v in entry.items() if k not in MOVE_KEYS}
+        if extra:
+            move.append(extra)
+        entries.append(move)
+
+    scores = next((e["scores"] for e in reversed(game_log) if e.get("event") == "final_scores"), {})
+    return {
+        "v": FORMAT_VERSION,
+        "id": game_id or uuid.uuid4().hex,
+        "ts": timestamp or datetime.now().isoformat(),
+        "meta": metadata,
+        "players": players,
+        "table0": table0 or [],
+        "log": entries,
+        "scores": scores,
+    }
+
+def expand_game(record):
+    """
+    Rebuilds the verbose {"metadata", "timestamp", "game_log"} form that
+    utils.save_game_log writes, from a compact record.
+    """
+    players = record["players"]
+    table = list(record["table0"])
+    game_log = []
+    for entry in record["log"]:
+        if entry[0] == "e":
+            event = dict(entry[1])
+            for key in ("cards", "collected"):
+                if key in event:
+                    event[key] = _names(event[key])
+            game_log.append(event)
+            continue
+
+        _, seat, hand, played, captured, action, escoba = entry[:7]
+        move = {
+            "player": players[seat],
+            "hand": _names(hand),
+            "table_before": _names(table),
+            "played_card": str(Card.from_id(played)),
+        }
+        if action == ACTION_CAPTURE:
+            table = [card_id for card_id in table if card_id not in captured]
+            move["action"] = f"Captured {', '.join(_names(captured))}"
+        else:
+            table.append(played)
+            move["action"] = ACTION_TEXT[action]
+        move["escoba"] = bool(escoba)
+        move["table_after"] = _names(table)
+        if len(entry) > 7:
+            move.update(entry[7])
+        game_log.append(move)
+    return {"metadata": record["meta"], "timestamp": record["ts"], "game_log": game_log}
+
+# -------------------------------
+# Archive
+# -------------------------------
+class GameArchive:
+    """
+    Append-only store of compact game records.
+
+    Records are JSON lines in rotated segment files (segment-000001.jsonl, ...)
+    and an sqlite index maps each game to its segment, byte offset, timestamp,
+    models, scores and outcome. Appends take the index's write lock, so
+    threads and processes can share one archive.
+    """
+    def __init__(self, directory=None, segment_bytes=SEGMENT_BYTES):
+        self.directory = directory or ARCHIVE_DIR
+        self.segment_bytes = segment_bytes
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(self.directory, "index.sqlite"),
+                                     check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(INDEX_SCHEMA)
+
+    def _segments(self):
+        return sorted(glob.glob(os.path.join(self.directory, "segment-*.jsonl")))
+
+    def _current_segment(self):
+        segments = self._segments()
+        if segments and os.path.getsize(segments[-1]) < self.segment_bytes:
+            return segments[-1]
+        return os.path.join(self.directory, f"segment-{len(segments) + 1:06d}.jsonl")
+
+    def append(self, record):
+        """
+        Appends a compact record (see compact_game) and indexes it.
+        """
+        line = (json.dumps(record, separators=(",", ":")) + "\n").encode()
+        scores = record.get("scores") or {}
+        best = max(scores.values()) if scores else None
+        leaders = [name for name, score in scores.items() if score == best]
+        early = any(e[0] == "e" and e[1].get("event") == "early_termination" for e in record["log"])
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                segment = self._current_segment()
+                with open(segment, "ab") as f:
+                    offset = f.tell()
+                    f.write(line)
+                self._conn.execute(
+                    "INSERT INTO games (id, segment, offset, length, timestamp, num_players, winner, "
+                    "early_termination) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (record["id"], os.path.basename(segment), offset, len(line), record["ts"],
+                     len(record["players"]), leaders[0] if len(leaders) == 1 else None, int(early))
+                )
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO game_models (game_id, model, score) VALUES (?, ?, ?)",
+                    [(record["id"], name, scores.get(name)) for name in record["players"]]
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return record["id"]
+
+    def add_game(self, game_log, metadata=None, game_id=None):
+        """
+        Compacts and appends a verbose game log; returns the game id.
+        """
+        return self.append(compact_game(game_log, metadata, game_id=game_id))
+
+    def query(self, model=None, since=None, until=None, winner=None, early_termination=None, limit=None):
+        """
+        Index lookup; returns (id, segment, offset, length) rows in file order.
+        """
+        clauses, params = [], []
+        if model is not None:
+            clauses.append("id IN (SELECT game_id FROM game_models WHERE model = ?)")
+            params.append(model)
+        if since is not None:
+            clauses.append("timestamp >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("timestamp < ?")
+            params.append(until)
+        if winner is not None:
+            clauses.append("winner = ?")
+            params.append(winner)
+        if early_termination is not None:
+            clauses.append("early_termination = ?")
+            params.append(int(early_termination))
+        sql = "SELECT id, segment, offset, length FROM games"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY segment, offset"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def iter_games(self, expand=False, **filters):
+        """
+        Lazily yields game records. Without filters every segment is streamed
+        line by line; with filters (see query) only the indexed games are read.
+        expand=True yields the verbose save_game_log form instead.
+        """
+        decode = expand_game if expand else (lambda record: record)
+        if not filters:
+            for segment in self._segments():
+                with open(segment, "rb") as f:
+                    for line in f:
+                        yield decode(json.loads(line))
+            return
+
+        handle, handle_name = None, None
+        try:
+            for _, segment, offset, length in self.query(**filters):
+                if segment != handle_name:
+                    if handle:
+                        handle.close()
+                    handle = open(os.path.join(self.directory, segment), "rb")
+                    handle_name = segment
+                handle.seek(offset)
+                yield decode(json.loads(handle.read(length)))
+        finally:
+            if handle:
+                handle.close()
+
+    def get(self, game_id, expand=False):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT segment, offset, length FROM games WHERE id = ?", (game_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        with open(os.path.join(self.directory, row[0]), "rb") as f:
+            f.seek(row[1])
+            record = json.loads(f.read(row[2]))
+        if not expand:
+            return record
+        game = expand_game(record)
+        quality = self.move_quality(game_id)
+        if quality:
+            moves = [entry for entry in game["game_log"] if "event" not in entry]
+            for index, annotation in quality.items():
+                moves[index]["quality"] = annotation
+        return game
+
+    # -------------------------------
+    # Move annotations
+    # -------------------------------
+    def annotate_moves(self, game_id, annotations):
+        """
+        Stores move-quality results for one game: (move index, model, result)
+        tuples, where result is an evaluator.evaluate_position dict.
+        """
+        rows = [
+            (game_id, index, model, len(result["moves"]), result["rollouts"], result["expected"],
+             result["best_expected"], result["regret"], int(result["played"] == result["best"]))
+            for index, model, result in annotations
+        ]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO move_quality (game_id, move, model, legal_moves, rollouts, "
+                    "expected, best_expected, regret, optimal) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def evaluated_games(self, model=None):
+        sql = "SELECT DISTINCT game_id FROM move_quality"
+        params = ()
+        if model is not None:
+            sql += " WHERE model = ?"
+            params = (model,)
+        with self._lock:
+            return {row[0] for row in self._conn.execute(sql, params)}
+
+    def move_quality(self, game_id):
+        """
+        {move index: {"legal_moves", "rollouts", "expected", "best_expected",
+        "regret", "optimal"}} for one evaluated game.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT move, legal_moves, rollouts, expected, best_expected, regret, optimal "
+                "FROM move_quality WHERE game_id = ? ORDER BY move", (game_id,)
+            ).fetchall()
+        return {
+            move: {"legal_moves": legal, "rollouts": rollouts, "expected": expected,
+                   "best_expected": best, "regret": regret, "optimal": bool(optimal)}
+            for move, legal, rollouts, expected, best, regret, optimal in rows
+        }
+
+    def regret_by_model(self, blunder=0.5):
+        """
+        Per-model move quality over every evaluated move with a real choice
+        (more than one legal move): moves, mean regret, share of optimal
+        moves and share of blunders (regret >= blunder points).
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT model, COUNT(*), AVG(regret), AVG(optimal), AVG(regret >= ?) FROM move_quality "
+                "WHERE legal_moves > 1 GROUP BY model ORDER BY AVG(regret)", (blunder,)
+            ).fetchall()
+        return {
+            model: {"moves": moves, "mean_regret": regret, "optimal_rate": optimal, "blunder_rate": blunders}
+            for model, moves, regret, optimal, blunders in rows
+        }
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM games").fetchone()[0]
+
+    def import_legacy_logs(self, pattern=os.path.join("logs", "game_*.json")):
+        """
+        Appends every per-game JSON file written by utils.save_game_log.
+        Files are keyed by name, so importing twice does not duplicate games.
+        """
+        imported = 0
+        for path in sorted(glob.glob(pattern)):
+            game_id = os.path.splitext(os.path.basename(path))[0]
+            with self._lock:
+                exists = self._conn.execute("SELECT 1 FROM games WHERE id = ?", (game_id,)).fetchone()
+            if exists:
+                continue
+            with open(path) as f:
+                data = json.load(f)
+            record = compact_game(data["game_log"], data.get("metadata"), game_id=game_id,
+                                  timestamp=data.get("timestamp"))
+            self.append(record)
+            imported += 1
+        logger.info(f"Imported {imported} legacy game logs into {self.directory}")
+        return imported
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __getstate__(self):
+        # Process-pool workers reopen the index themselves.
+        return {"directory": self.directory, "segment_bytes": self.segment_bytes}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
@@ -0,0 +1,232 @@
+import json
+import logging
+import threading
+import time
+from collections import Counter
+from functools import partial
+
+from llm_client import API_URL
+from scheduler import TransportError
+from telemetry import add_usage, record_request
+
+logger = logging.getLogger(__name__)
+
+# Appended to the client's system prompt for a batched request.
+BATCH_PROMPT = """You are deciding moves for several independent games at once. Each position is numbered and must be answered on its own, exactly as you would answer it alone.
+Reply with JSON only: {"moves": [<answer for position 1>, <answer for position 2>, ...]}, one answer per position, in order."""
+
+def batch_schema(batch):
+    # Constrained mode: one {"move": n} per position, each n within that position's list.
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "moves",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": {"moves": {
+                    "type": "array",
+                    "minItems": len(batch),
+                    "maxItems": len(batch),
+                    "items": {
+                        "type": "object",
+                        "properties": {"move": {"type": "integer", "minimum": 1,
+                                                "maximum": max(len(item.legal) for item in batch)}},
+                        "required": ["move"],
+                        "additionalProperties": False,
+                    },
+                }},
+                "required": ["moves"],
+                "additionalProperties": False,
+            },
+        },
+    }
+
+def _split(total, parts, index):
+    # Integer share `index` of `total` split `parts` ways; the shares add up to total.
+    return total // parts + (1 if index < total % parts else 0)
+
+class _Decision:
+    __slots__ = ("player", "table", "legal", "queued", "result", "done")
+
+    def __init__(self, player, table, legal):
+        self.player = player
+        self.table = table
+        self.legal = legal
+        self.queued = time.perf_counter()
+        self.result = None
+        self.done = threading.Event()
+
+class _Batch:
+    __slots__ = ("decisions", "full")
+
+    def __init__(self):
+        self.decisions = []
+        self.full = threading.Event()
+
+class BatchingClient:
+    """
+    Opt-in batching wrapper around a (sync) LLMClient shared by many games.
+
+    Moves for the same model that are requested within `window` seconds of
+    each other are sent as one chat completion listing every position; the
+    answers come back as {"moves": [...]} and go back to the waiting games.
+    The first game to ask leads the batch: it waits up to `window` (less if
+    `max_batch` decisions arrive first), then sends the request. A batch of
+    one is sent as a normal request.
+
+    Each game is charged an equal share of the batch's tokens and cost and
+    one request at the full latency it saw. A position whose answer is
+    missing or unusable gets the usual fallback move and counts as a model
+    error for that game only; a transport failure fails the whole batch.
+    """
+    def __init__(self, client, window=0.05, max_batch=8):
+        self.client = client
+        self.window = window
+        self.max_batch = max(1, max_batch)
+        self._open = {}  # model -> _Batch still accepting decisions
+        self._lock = threading.Lock()
+        self.sizes = Counter()
+        self.stats = {"decisions": 0, "batches": 0, "wait_seconds": 0.0, "max_wait": 0.0,
+                      "failed_answers": 0}
+
+    def __getattr__(self, name):
+        # Everything else (model_name, cache, scheduler, ...) is the wrapped client's.
+        return getattr(self.client, name)
+
+    def get_move(self, player, table_cards, usage=None, legal=None):
+        """
+        Same contract as LLMClient.get_move; blocks until this decision's
+        batch has been answered.
+        """
+        cached = self.client.cached_move(player, table_cards)
+        if cached is not None:
+            if usage is not None:
+                usage["cached"] = usage.get("cached", 0) + 1
+            return cached[0], cached[1], False
+
+        model = self.client.model_name(player)
+        decision = _Decision(player, list(table_cards), self.client.listed_moves(player, table_cards, legal))
+        with self._lock:
+            batch = self._open.get(model)
+            leader = batch is None
+            if leader:
+                batch = self._open[model] = _Batch()
+            batch.decisions.append(decision)
+            if len(batch.decisions) >= self.max_batch:
+                del self._open[model]
+                batch.full.set()
+
+        if leader:
+            batch.full.wait(self.window)
+            with self._lock:
+                if self._open.get(model) is batch:
+                    del self._open[model]
+            self._send(model, batch.decisions)
+        else:
+            decision.done.wait()
+
+        card, capture, error, spent = decision.result
+        if usage is not None:
+            for key, value in spent.items():
+                usage[key] = usage.get(key, 0) + value
+            record_request(usage, time.perf_counter() - decision.queued)
+        return card, capture, error
+
+    def _send(self, model, batch):
+        started = time.perf_counter()
+        waits = [started - decision.queued for decision in batch]
+        with self._lock:
+            self.sizes[len(batch)] += 1
+            self.stats["batches"] += 1
+            self.stats["decisions"] += len(batch)
+            self.stats["wait_seconds"] += sum(waits)
+            self.stats["max_wait"] = max(self.stats["max_wait"], max(waits))
+
+        try:
+            if len(batch) == 1:
+                decision = batch[0]
+                spent = {}
+                # get_move already looked in the cache; go straight to the request.
+                card, capture, error = self.client.request_move(decision.player, decision.table,
+                                                                usage=spent, legal=decision.legal)
+                # The client counted the request itself; get_move records it with the wait included.
+                spent.pop("requests", None)
+                spent.pop("latencies", None)
+                decision.result = (card, capture, error, spent)
+                return
+            self._send_batch(model, batch)
+        except Exception as e:
+            logger.exception("Batched request to %s failed", model)
+            for decision in batch:
+                if decision.result is None:
+                    decision.result = self.client.fallback_move(decision.player, e) + ({},)
+        finally:
+            for decision in batch:
+                decision.done.set()
+
+    def _send_batch(self, model, batch):
+        client = self.client
+        positions = "\n\n".join(
+            f"Position {number}:\n{client.user_prompt(decision.player, decision.table, decision.legal)}"
+            for number, decision in enumerate(batch, 1)
+        )
+        body = {
+            "model": model,
+            "messages": [
+                {"role": "system", "content": client.system_content(client.system_prompt + "\n" + BATCH_PROMPT)},
+                {"role": "user", "content": positions},
+            ],
+            "usage": {"include": True},
+        }
+        if client.legal_moves == "constrained":
+            body["response_format"] = batch_schema(batch)
+
+        reported = {}
+        try:
+            response = client.scheduler.send(model, partial(
+                client.session.post,
+                url=API_URL,
+                headers=client.headers(),
+                data=json.dumps(body),
+                timeout=client.timeout
+            ))
+            try:
+                response_data = response.json()
+                add_usage(reported, response_data)
+                answers = client.response_json(response_data)["moves"]
+            except TransportError:
+                client.scheduler.record_failure(model)
+                raise
+            client.scheduler.record_success(model)
+        except TransportError as e:
+            for decision in batch:
+                decision.result = client.fallback_move(decision.player, e, "transport") + ({},)
+            return
+        except Exception as e:
+            # The provider answered; the model's reply was unusable.
+            client.scheduler.record_success(model)
+            answers = []
+            logger.error("Unusable batched answer from %s: %s", model, e)
+
+        for index, decision in enumerate(batch):
+            spent = {key: _split(reported[key], len(batch), index)
+                     for key in ("prompt_tokens", "completion_tokens") if key in reported}
+            spent["cost"] = reported.get("cost", 0.0) / len(batch)
+            try:
+                card, capture = client.move_from_json(answers[index], decision.legal)
+            except Exception as e:
+                with self._lock:
+                    self.stats["failed_answers"] += 1
+                decision.result = client.fallback_move(decision.player, e) + (spent,)
+                continue
+            client.store_move(decision.player, decision.table, card, capture, decision.legal)
+            decision.result = (card, capture, False, spent)
+
+    def batching_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["sizes"] = dict(sorted(self.sizes.items()))
+        stats["mean_size"] = stats["decisions"] / stats["batches"] if stats["batches"] else 0.0
+        stats["mean_wait"] = stats["wait_seconds"] / stats["decisions"] if stats["decisions"] else 0.0
+        return stats
@@ -0,0 +1,179 @@
+import argparse
+import json
+import logging
+import random
+import resource
+import time
+import timeit
+import tracemalloc
+
+from bots import make_strategy, BOT_PREFIX
+from captures import capture_index, find_valid_captures
+from game import Card, GameManager, Player, cards_to_mask
+from scoring import score_batch
+
+# -------------------------------
+# Headless simulation
+# -------------------------------
+def new_headless_game(num_players, strategy, seed):
+    rng = random.Random(seed)
+    players = [
+        Player(f"{BOT_PREFIX}{strategy}-{i + 1}", model=f"{BOT_PREFIX}{strategy}",
+               strategy=make_strategy(strategy, rng=rng))
+        for i in range(num_players)
+    ]
+    return GameManager(players, seed=seed, record_log=False)
+
+def simulate(num_games, num_players=2, strategy="random", seed=0, trace_memory=False):
+    """
+    Plays num_games games between local bots with logging and game_log
+    construction disabled, and returns throughput numbers.
+
+    Each game is seeded with seed + index, so runs with the same arguments
+    replay the same games. Peak memory comes from tracemalloc when
+    trace_memory is set (slower), otherwise from the process max RSS.
+    """
+    previous_disable = logging.root.manager.disable
+    logging.disable(logging.CRITICAL)
+    if trace_memory:
+        tracemalloc.start()
+    try:
+        moves = 0
+        started = time.perf_counter()
+        for index in range(num_games):
+            game = new_headless_game(num_players, strategy, seed + index)
+            game.play_game()
+            moves += game.turns_played
+        elapsed = time.perf_counter() - started
+        if trace_memory:
+            peak_bytes = tracemalloc.get_traced_memory()[1]
+        else:
+            # ru_maxrss is reported in kilobytes on Linux.
+            peak_bytes = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+        logging.disable(previous_disable)
+
+    return {
+        "games": num_games,
+        "players": num_players,
+        "strategy": strategy,
+        "seed": seed,
+        "moves": moves,
+        "elapsed": elapsed,
+        "games_per_sec": num_games / elapsed if elapsed else 0.0,
+        "moves_per_sec": moves / elapsed if elapsed else 0.0,
+        "peak_memory_mb": peak_bytes / (1024 * 1024),
+        "peak_memory_source": "tracemalloc" if trace_memory else "max_rss",
+    }
+
+# -------------------------------
+# Component microbenchmarks
+# -------------------------------
+def bench_find_valid_captures(seed=0, positions=500, table_size=6):
+    rng = random.Random(seed)
+    cases = []
+    for _ in range(positions):
+        cards = rng.sample(Card.ALL, table_size + 1)
+        cases.append((cards[0], cards[1:]))
+    number = 5
+    elapsed = timeit.timeit(lambda: [find_valid_captures(p, t) for p, t in cases], number=number)
+    return elapsed / (positions * number) * 1e6
+
+def finished_games(seed=0, num_players=2, games=200):
+    finished = []
+    for index in range(games):
+        game = new_headless_game(num_players, "random", seed + index)
+        logging.disable(logging.CRITICAL)
+        try:
+            game.play_game()
+        finally:
+            logging.disable(logging.NOTSET)
+        finished.append(game)
+    return finished
+
+def bench_calculate_scores(seed=0, num_players=2, games=200):
+    finished = finished_games(seed, num_players, games)
+    number = 5
+    elapsed = timeit.timeit(lambda: [g.calculate_scores() for g in finished], number=number)
+    return elapsed / (games * number) * 1e6
+
+def bench_score_batch(seed=0, num_players=2, games=200):
+    finished = finished_games(seed, num_players, games)
+    masks = [[cards_to_mask(p.captured) for p in g.players] for g in finished]
+    escobas = [[p.escobas for p in g.players] for g in finished]
+    number = 20
+    elapsed = timeit.timeit(lambda: score_batch(masks, escobas), number=number)
+    return elapsed / (games * number) * 1e6
+
+def warm_up(num_games, player_counts, strategy="random", seed=0):
+    """
+    Plays untimed games so the capture index is filled before anything is
+    measured. The warm-up seeds sit below the measured ones, so the timed
+    games still have to look up positions they never saw in the warm-up.
+    """
+    for num_players in player_counts:
+        simulate(num_games, num_players, strategy=strategy, seed=seed - num_games)
+
+def run_suite(num_games=2000, player_counts=(2, 3, 4), strategy="random", seed=0, trace_memory=False,
+              warmup=200):
+    """
+    Runs the headless simulation for every player count plus the component
+    microbenchmarks, and returns all results.
+
+    Unless warmup is 0, the capture index is warmed up first (see warm_up);
+    the index size before the timed runs is reported either way, since a
+    cold index makes the first numbers include filling it.
+    """
+    if warmup:
+        warm_up(warmup, player_counts, strategy, seed)
+    results = {"simulation": [], "components": {},
+               "warmup_games": warmup, "capture_index_entries": len(capture_index.entries)}
+    for num_players in player_counts:
+        results["simulation"].append(
+            simulate(num_games, num_players, strategy=strategy, seed=seed, trace_memory=trace_memory)
+        )
+    results["components"]["find_valid_captures_us"] = bench_find_valid_captures(seed)
+    results["components"]["calculate_scores_us"] = bench_calculate_scores(seed)
+    results["components"]["score_batch_us"] = bench_score_batch(seed)
+    return results
+
+def print_suite(results):
+    if results["warmup_games"]:
+        print(f"capture index warmed with {results['warmup_games']} games per player count "
+              f"({results['capture_index_entries']} entries)")
+    else:
+        print(f"capture index not warmed ({results['capture_index_entries']} entries before timing); "
+              "timings include filling the rest")
+    print(f"{'players':>7} {'strategy':>10} {'games/s':>10} {'moves/s':>11} {'peak MB':>9}")
+    for row in results["simulation"]:
+        print(f"{row['players']:>7} {row['strategy']:>10} {row['games_per_sec']:>10.0f} "
+              f"{row['moves_per_sec']:>11.0f} {row['peak_memory_mb']:>9.1f}")
+    components = results["components"]
+    print(f"find_valid_captures: {components['find_valid_captures_us']:.1f}us/call")
+    print(f"calculate_scores:    {components['calculate_scores_us']:.1f}us/call")
+    print(f"score_batch:         {components['score_batch_us']:.2f}us/game")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless Escoba engine benchmark")
+    parser.add_argument("-n", "--games", type=int, default=2000, help="Games per player count")
+    parser.add_argument("-p", "--players", type=int, nargs="+", default=[2, 3, 4], choices=[2, 3, 4])
+    parser.add_argument("--strategy", default="random", help="Bot strategy for every seat")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="Measure peak memory with tracemalloc (slower)")
+    parser.add_argument("--warmup", type=int, default=200,
+                        help="Untimed games per player count that fill the capture index first (0 to start cold)")
+    parser.add_argument("--json", metavar="PATH", help="Also write the results as JSON")
+    args = parser.parse_args(argv)
+
+    results = run_suite(args.games, tuple(args.players), args.strategy, args.seed, args.trace_memory,
+                        args.warmup)
+    print_suite(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+import random
+
+from captures import CAPTURE_SUM, LegalMoves
+from cards import Card
+
+BOT_PREFIX = "bot/"
+
+# Rough point weights used to compare moves: an escoba and the 7 of Coins are
+# worth a point each, the other categories are shared out over many cards.
+ESCOBA_WEIGHT = 1.0
+CARD_WEIGHT = 1 / 20
+COIN_WEIGHT = 1 / 10
+SEVEN_WEIGHT = 1 / 4
+SIETE_DE_OROS_WEIGHT = 1.0
+
+def card_worth(card):
+    worth = CARD_WEIGHT
+    if card.suit == "Coins":
+        worth += COIN_WEIGHT
+    if card.rank == "7":
+        worth += SEVEN_WEIGHT
+        if card.suit == "Coins":
+            worth += SIETE_DE_OROS_WEIGHT
+    return worth
+
+def legal_moves(hand, table_cards):
+    """
+    Every legal move as (card, capture_cards, escoba). Each card in hand can
+    always be dropped to the table (empty capture).
+    """
+    return LegalMoves(hand, table_cards).moves
+
+def move_value(card, capture, escoba, table_cards):
+    """
+    Immediate value of a move for the player making it.
+    """
+    if not capture:
+        # Dropping a card offers it to the opponents, and a table that sums to
+        # 15 minus some card value hands the next player an escoba.
+        value = -card_worth(card) / 2
+        table_sum = card.value + sum(c.value for c in table_cards)
+        if 0 < CAPTURE_SUM - table_sum <= 10:
+            value -= ESCOBA_WEIGHT / 2
+        return value
+    value = card_worth(card) + sum(card_worth(c) for c in capture)
+    if escoba:
+        value += ESCOBA_WEIGHT
+    return value
+
+def as_response(move):
+    card, capture, _ = move
+    return str(card), [str(c) for c in capture], False
+
+# -------------------------------
+# Strategies
+# -------------------------------
+class Strategy:
+    """
+    Local player strategy. get_move has the same contract as
+    LLMClient.get_move, returning (card, capture_set, error_flag) with card
+    strings, so a strategy can stand in for the LLM client anywhere.
+
+    Without an rng of its own a strategy draws from the game's seeded RNG
+    (player.rng), so a game with bot seats is reproduced by its seed and its
+    checkpoints cover the bots too.
+    """
+    name = "strategy"
+
+    def __init__(self, rng=None):
+        self.rng = rng
+
+    def choose(self, player, table_cards, moves, rng, captured):
+        raise NotImplementedError
+
+    def get_move(self, player, table_cards, legal=None, captured=()):
+        """
+        legal is the turn's LegalMoves if GameManager already computed it;
+        captured holds every player's captured cards, which are public.
+        """
+        moves = legal.moves if legal is not None else legal_moves(player.hand, table_cards)
+        rng = self.rng or player.rng or random
+        return as_response(self.choose(player, table_cards, moves, rng, captured))
+
+class RandomBot(Strategy):
+    """
+    Plays a uniformly random legal move.
+    """
+    name = "random"
+
+    def choose(self, player, table_cards, moves, rng, captured):
+        return rng.choice(moves)
+
+class GreedyBot(Strategy):
+    """
+    Plays the move with the best immediate value: escobas first, then the
+    7 of Coins, sevens, coins and card count; drops the cheapest card safely.
+    """
+    name = "greedy"
+
+    def choose(self, player, table_cards, moves, rng, captured):
+        return max(moves, key=lambda move: move_value(*move, table_cards))
+
+class MonteCarloBot(Strategy):
+    """
+    One-ply lookahead: for each legal move, samples hands for the next
+    opponent from the unseen cards and subtracts that opponent's best greedy
+    reply from the move's own value.
+    """
+    name = "montecarlo"
+
+    def __init__(self, samples=16, rng=None):
+        super().__init__(rng)
+        self.samples = samples
+
+    def choose(self, player, table_cards, moves, rng, captured):
+        seen = set(player.hand) | set(table_cards) | set(player.captured) | set(captured)
+        unseen = [card for card in Card.ALL if card not in seen]
+        hand_size = min(3, len(unseen))
+        if not hand_size:
+            return max(moves, key=lambda move: move_value(*move, table_cards))
+
+        hands = [rng.sample(unseen, hand_size) for _ in range(self.samples)]
+        best_move, best_score = None, None
+        for move in moves:
+            card, capture, _ = move
+            table_after = [c for c in table_cards if c not in capture]
+            if not capture:
+                table_after.append(card)
+            reply_total = 0.0
+            for hand in hands:
+                replies = legal_moves(hand, table_after)
+                reply_total += max(move_value(*reply, table_after) for reply in replies)
+            score = move_value(*move, table_cards) - reply_total / len(hands)
+            if best_score is None or score > best_score:
+                best_move, best_score = move, score
+        return best_move
+
+STRATEGIES = {
+    RandomBot.name: RandomBot,
+    GreedyBot.name: GreedyBot,
+    MonteCarloBot.name: MonteCarloBot,
+}
+
+def is_bot(model):
+    return model.startswith(BOT_PREFIX)
+
+def make_strategy(model, rng=None):
+    """
+    Builds the strategy for a model name such as "bot/greedy".
+    """
+    name = model[len(BOT_PREFIX):] if is_bot(model) else model
+    if name not in STRATEGIES:
+        raise ValueError(f"Unknown bot '{model}', expected one of "
+                         f"{[BOT_PREFIX + n for n in STRATEGIES]}")
+    return STRATEGIES[name](rng=rng)
@@ -0,0 +1,340 @@
+import json
+import logging
+import os
+import random
+import threading
+import timeit
+from itertools import combinations, product
+
+from config import CAPTURE_INDEX_PATH
+
+logger = logging.getLogger(__name__)
+
+CAPTURE_SUM = 15
+# A played card is worth at least 1, so table subsets never need to exceed 14.
+MAX_NEEDED = CAPTURE_SUM - 1
+
+# -------------------------------
+# Subset-sum solver
+# -------------------------------
+def subset_sum_masks(values, max_target=MAX_NEEDED):
+    """
+    Returns a list indexed by target (0..max_target) of every bitmask over
+    `values` whose selected values sum to that target.
+
+    Classic 0/1 subset-sum DP, keeping the masks instead of a boolean: each
+    card extends the partial subsets that still fit under max_target, so the
+    work is bounded by the number of partial sums <= 14 rather than 2^n.
+    """
+    solutions = [[] for _ in range(max_target + 1)]
+    solutions[0].append(0)
+    for index, value in enumerate(values):
+        bit = 1 << index
+        for target in range(max_target, value - 1, -1):
+            partial = solutions[target - value]
+            if partial:
+                solutions[target].extend(mask | bit for mask in partial)
+    solutions[0] = []
+    return solutions
+
+def _ordered(masks):
+    # Match itertools.combinations order: by size, then by card position.
+    return sorted(masks, key=lambda m: (m.bit_count(), mask_indices(m)))
+
+def mask_indices(mask):
+    indices = []
+    index = 0
+    while mask:
+        if mask & 1:
+            indices.append(index)
+        mask >>= 1
+        index += 1
+    return indices
+
+def capture_masks(played_value, table_values):
+    """
+    Bitmasks over table_values that capture together with a card of played_value.
+    """
+    needed = CAPTURE_SUM - played_value
+    if needed <= 0:
+        return []
+    return _ordered(subset_sum_masks(table_values, needed)[needed])
+
+# -------------------------------
+# Capture index
+# -------------------------------
+# Card values are 1..10 and at most four cards share a value, so which
+# subsets of a table can capture depends only on how many cards of each value
+# it holds: a value-count vector that packs into one int, 3 bits per value.
+VALUES = range(1, 11)
+COUNT_BITS = 3
+COUNT_UNIT = [1 << (COUNT_BITS * value) for value in range(11)]
+COUNT_MASK = (1 << COUNT_BITS) - 1
+NEEDED_BITS = 4
+
+def value_partitions(max_target=MAX_NEEDED):
+    """
+    Returns a list indexed by target (0..max_target) of every multiset of
+    card values summing to that target, as ((value, count), ...) tuples.
+    """
+    partitions = [[] for _ in range(max_target + 1)]
+
+    def extend(value, remaining, parts, target):
+        if remaining == 0:
+            partitions[target].append(tuple(parts))
+            return
+        for v in range(min(value, remaining), 0, -1):
+            for count in range(1, min(4, remaining // v) + 1):
+                extend(v - 1, remaining - v * count, parts + [(v, count)], target)
+
+    for target in range(1, max_target + 1):
+        extend(10, target, [], target)
+    return partitions
+
+def table_counts(table_cards):
+    """
+    The packed value-count vector of a table (the capture index key).
+    """
+    counts = 0
+    for card in table_cards:
+        counts += COUNT_UNIT[card.value]
+    return counts
+
+class CaptureIndex:
+    """
+    Lookup table from (needed, table value counts) to the value multisets
+    that capture, so a capture search is one dict lookup plus expanding each
+    multiset to concrete cards; most positions have no capture at all and
+    stop at the lookup.
+
+    Entries are filled on first use (there are at most 14 * 5^10 keys, far
+    fewer in practice) and can be saved to, and loaded from, a JSON file
+    (CAPTURE_INDEX_PATH), so later runs start with a warm index.
+    """
+    def __init__(self, path=None):
+        self.partitions = value_partitions()
+        self.entries = {}
+        self.path = path
+        self.dirty = False
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            self.load(path)
+
+    def lookup(self, needed, counts):
+        key = needed | (counts << NEEDED_BITS)
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = tuple(
+                partition for partition in self.partitions[needed]
+                if all((counts >> (COUNT_BITS * value)) & COUNT_MASK >= count for value, count in partition)
+            )
+            with self._lock:
+                self.entries[key] = entry
+                self.dirty = True
+        return entry
+
+    def load(self, path):
+        # JSON keys are strings and tuples come back as lists; rebuild both.
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            entries = {
+                int(key): tuple(tuple((int(value), int(count)) for value, count in partition)
+                                for partition in entry)
+                for key, entry in data.items()
+            }
+        except (OSError, ValueError, TypeError, AttributeError) as ex:
+            logger.warning("Ignoring capture index %s: %s", path, ex)
+            return
+        with self._lock:
+            self.entries.update(entries)
+        logger.debug("Loaded %d capture index entries from %s", len(entries), path)
+
+    def save(self, path=None):
+        path = path or self.path
+        if not path:
+            return None
+        with self._lock:
+            entries = dict(self.entries)
+            self.dirty = False
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({str(key): entry for key, entry in entries.items()}, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+        return path
+
+capture_index = CaptureIndex(CAPTURE_INDEX_PATH)
+if CAPTURE_INDEX_PATH:
+    import atexit
+    atexit.register(lambda: capture_index.dirty and capture_index.save())
+
+def value_positions(table_cards):
+    """
+    Table positions grouped by card value.
+    """
+    positions = {}
+    for index, card in enumerate(table_cards):
+        positions.setdefault(card.value, []).append(index)
+    return positions
+
+def expand_partitions(partitions, positions):
+    """
+    Sorted table positions for every way of picking the value multisets in
+    `partitions`, in itertools.combinations order.
+    """
+    picks = []
+    for partition in partitions:
+        if len(partition) == 1:
+            value, count = partition[0]
+            picks.extend(combinations(positions[value], count))
+            continue
+        for chosen in product(*[combinations(positions[value], count) for value, count in partition]):
+            picks.append(tuple(sorted(i for group in chosen for i in group)))
+    if len(picks) > 1:
+        picks.sort(key=lambda indices: (len(indices), indices))
+    return picks
+
+def capture_positions(played_value, table_cards, index=None):
+    """
+    Positions of the table cards in every capture for a card of played_value,
+    from the capture index.
+    """
+    needed = CAPTURE_SUM - played_value
+    if not 0 < needed <= MAX_NEEDED:
+        return []
+    partitions = (index or capture_index).lookup(needed, table_counts(table_cards))
+    if not partitions:
+        return []
+    return expand_partitions(partitions, value_positions(table_cards))
+
+# -------------------------------
+# Card-level helpers
+# -------------------------------
+def find_valid_captures(played_card, table_cards):
+    """
+    Every set of table cards that sums to 15 with played_card, as lists of
+    Card objects (same contract as the original combinations-based search).
+    """
+    return [[table_cards[i] for i in picks] for picks in capture_positions(played_card.value, table_cards)]
+
+def find_captures(played_card, table_cards):
+    """
+    Like find_valid_captures, but returns (cards, escoba) pairs where escoba is
+    True when the capture clears the whole table.
+    """
+    size = len(table_cards)
+    return [
+        ([table_cards[i] for i in picks], len(picks) == size)
+        for picks in capture_positions(played_card.value, table_cards)
+    ]
+
+def find_all_captures(hand, table_cards):
+    """
+    Captures for every card in hand from one grouping of the table.
+    Returns {card: [(cards, escoba), ...]} for each card in hand.
+    """
+    size = len(table_cards)
+    counts = table_counts(table_cards)
+    positions = None
+    result = {}
+    for card in hand:
+        needed = CAPTURE_SUM - card.value
+        partitions = capture_index.lookup(needed, counts) if 0 < needed <= MAX_NEEDED else ()
+        if partitions and positions is None:
+            positions = value_positions(table_cards)
+        result[card] = [
+            ([table_cards[i] for i in picks], len(picks) == size)
+            for picks in (expand_partitions(partitions, positions) if partitions else ())
+        ]
+    return result
+
+class LegalMoves:
+    """
+    Every legal move for a hand on a table, computed once per turn.
+    moves[i] is (card, capture_cards, escoba) with the drop of each card
+    first, and `index` maps a move's canonical key (card id, capture
+    bitmask over Card.id) to i, so checking an answer is one dict lookup.
+    """
+    __slots__ = ("moves", "index")
+
+    def __init__(self, hand, table_cards):
+        self.moves = []
+        self.index = {}
+        for card, captures in find_all_captures(hand, table_cards).items():
+            self.index[(card.id, 0)] = len(self.moves)
+            self.moves.append((card, [], False))
+            for capture, escoba in captures:
+                self.index[(card.id, move_key_mask(capture))] = len(self.moves)
+                self.moves.append((card, capture, escoba))
+
+    def find(self, card, capture_cards):
+        """
+        Index of playing card with capture_cards (in any order), or None
+        if that is not a legal move.
+        """
+        return self.index.get((card.id, move_key_mask(capture_cards)))
+
+    def __len__(self):
+        return len(self.moves)
+
+    def __iter__(self):
+        return iter(self.moves)
+
+    def __getitem__(self, i):
+        return self.moves[i]
+
+def move_key_mask(cards):
+    mask = 0
+    for card in cards:
+        mask |= 1 << card.id
+    return mask
+
+# -------------------------------
+# Microbenchmarks
+# -------------------------------
+def _combinations_captures(played_card, table_cards):
+    # Reference implementation the solver replaces.
+    needed = CAPTURE_SUM - played_card.value
+    valid_sets = []
+    for i in range(1, len(table_cards) + 1):
+        for combo in combinations(table_cards, i):
+            if sum(card.value for card in combo) == needed:
+                valid_sets.append(list(combo))
+    return valid_sets
+
+def _dp_captures(played_card, table_cards):
+    # Subset-sum DP the capture index replaces.
+    masks = capture_masks(played_card.value, [card.value for card in table_cards])
+    return [[table_cards[i] for i in mask_indices(mask)] for mask in masks]
+
+def run_benchmarks(sizes=(4, 8, 12, 16), positions=50, seed=0):
+    """
+    Times the DP solver and the capture index against the combinations
+    search on random tables.
+    """
+    from game import Deck
+
+    rng = random.Random(seed)
+    print(f"{'table':>5} {'combinations':>14} {'dp solver':>12} {'index':>10} {'speedup':>8}")
+    for size in sizes:
+        cases = []
+        for _ in range(positions):
+            cards = list(Deck().cards)
+            rng.shuffle(cards)
+            cases.append((cards[0], cards[1:size + 1]))
+
+        for played, table in cases:
+            expected = _combinations_captures(played, table)
+            assert _dp_captures(played, table) == expected
+            assert find_valid_captures(played, table) == expected
+
+        number = max(1, 2000 // (2 ** min(size, 12)))
+        old = timeit.timeit(lambda: [_combinations_captures(p, t) for p, t in cases], number=number)
+        dp = timeit.timeit(lambda: [_dp_captures(p, t) for p, t in cases], number=number)
+        new = timeit.timeit(lambda: [find_valid_captures(p, t) for p, t in cases], number=number)
+        per_call = positions * number
+        print(f"{size:>5} {old / per_call * 1e6:>12.1f}us {dp / per_call * 1e6:>10.1f}us "
+              f"{new / per_call * 1e6:>8.1f}us {old / new:>7.1f}x")
+
+if __name__ == "__main__":
+    run_benchmarks()
@@ -0,0 +1,87 @@
+class Card:
+    """
+    Cards are interned: there are exactly 40 Card instances, created once at
+    import, and Card(suit, rank) returns the shared one. Value, prime order,
+    id and string form are precomputed, so cards compare and hash by identity
+    and a Deck is just a copy of the 40-card template.
+
+    Card.id is suit_index * 10 + rank_index (0..39), which is also the bit used
+    by cards_to_mask for bitset representations of hands, tables and piles.
+    """
+    __slots__ = ("suit", "rank", "value", "prime", "id", "_name")
+
+    SUITS = ["Coins", "Cups", "Batons", "Swords"]
+    RANKS = ["1", "2", "3", "4", "5", "6", "7", "Sota", "Caballo", "Rey"]
+    CAPTURE_VALUES = {
+        "1": 1,
+        "2": 2,
+        "3": 3,
+        "4": 4,
+        "5": 5,
+        "6": 6,
+        "7": 7,
+        "Sota": 8,
+        "Caballo": 9,
+        "Rey": 10,
+    }
+    # Prime ranking order: best card is '7', then '6', '1', etc.
+    PRIME_ORDER = ["7", "6", "1", "5", "4", "3", "2", "Sota", "Caballo", "Rey"]
+
+    _interned = {}
+    _by_name = {}
+    ALL = ()
+
+    def __new__(cls, suit, rank):
+        try:
+            return cls._interned[(suit, rank)]
+        except KeyError:
+            raise ValueError(f"Unknown card: {rank} of {suit}") from None
+
+    @classmethod
+    def _create(cls, suit, rank):
+        card = object.__new__(cls)
+        setattr_ = object.__setattr__
+        setattr_(card, "suit", suit)
+        setattr_(card, "rank", rank)
+        setattr_(card, "value", cls.CAPTURE_VALUES[rank])
+        setattr_(card, "prime", cls.PRIME_ORDER.index(rank))
+        setattr_(card, "id", cls.SUITS.index(suit) * 10 + cls.RANKS.index(rank))
+        setattr_(card, "_name", f"{rank} of {suit}")
+        return card
+
+    @classmethod
+    def from_id(cls, card_id):
+        return cls.ALL[card_id]
+
+    @classmethod
+    def from_str(cls, name):
+        """
+        Looks up a card by its string form ("7 of Coins"); None if unknown.
+        """
+        return cls._by_name.get(name)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Card instances are immutable")
+
+    def __reduce__(self):
+        # Unpickling goes back through __new__, so it yields the interned card.
+        return (Card, (self.suit, self.rank))
+
+    def __repr__(self):
+        return self._name
+
+Card.ALL = tuple(Card._create(suit, rank) for suit in Card.SUITS for rank in Card.RANKS)
+Card._interned = {(card.suit, card.rank): card for card in Card.ALL}
+Card._by_name = {card._name: card for card in Card.ALL}
+
+def cards_to_mask(cards):
+    """
+    Encodes a collection of cards as a 40-bit integer (bit i = Card.id i).
+    """
+    mask = 0
+    for card in cards:
+        mask |= 1 << card.id
+    return mask
+
+def mask_to_cards(mask):
+    return [card for card in Card.ALL if mask >> card.id & 1]
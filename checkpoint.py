@@ -0,0 +1,117 @@
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+def write_json_atomic(path, data):
+    """
+    Writes data as JSON beside path and swaps it in, so a crash mid-write
+    leaves the previous checkpoint intact. Not fsynced: this guards against
+    the process dying, which is the common case, at a cost small enough to
+    pay after every turn.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+def read_json(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+class GameCheckpoint:
+    """
+    Saves a game's engine state (GameManager.snapshot) to `path` after every
+    `every` turns. Pass it to GameManager as checkpoint=, and resume with
+    GameManager.restore(checkpoint.load(), players).
+    """
+    def __init__(self, path, every=1):
+        self.path = path
+        self.every = max(1, every)
+
+    def __call__(self, game):
+        # Always save the opening deal and the end of each hand.
+        if game.turns_played % self.every == 0 or not any(player.hand for player in game.players):
+            write_json_atomic(self.path, game.snapshot())
+
+    def load(self):
+        return read_json(self.path)
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+class TournamentCheckpoint:
+    """
+    Progress of one tournament in `directory`:
+
+        tournament.json   the run's settings and schedule
+        results.jsonl     one line per finished game (its tournament result)
+        games/            a GameCheckpoint per game in flight
+
+    Results are appended as games finish, so a run killed at any point can be
+    continued with the same schedule: finished games are skipped and games
+    in flight resume from their last turn.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self.path = os.path.join(directory, "tournament.json")
+        self.results_path = os.path.join(directory, "results.jsonl")
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def settings(self):
+        state = read_json(self.path)
+        if state is None:
+            raise FileNotFoundError(f"No tournament checkpoint in {self.directory}")
+        return state["settings"]
+
+    def start(self, schedule, settings=None):
+        """
+        Records the schedule (and settings) of a new run, or checks that an
+        existing run has the same schedule. Returns the results of the games
+        already finished, by index.
+        """
+        schedule = [list(seating) for seating in schedule]
+        state = read_json(self.path)
+        if state is None:
+            write_json_atomic(self.path, {"settings": settings or {}, "schedule": schedule})
+            return {}
+        if state["schedule"] != schedule:
+            raise ValueError(f"{self.directory} holds a different tournament schedule")
+        return self.finished()
+
+    def finished(self):
+        finished = {}
+        if not os.path.exists(self.results_path):
+            return finished
+        with open(self.results_path) as f:
+            for line in f:
+                try:
+                    result = json.loads(line)
+                except json.JSONDecodeError:
+                    # A line cut short by the crash; that game is played again.
+                    logger.warning("Ignoring a truncated result in %s", self.results_path)
+                    continue
+                finished[result["index"]] = result
+        return finished
+
+    def game_path(self, index):
+        return os.path.join(self.directory, "games", f"game-{index:05d}.json")
+
+    def record(self, result):
+        """
+        Appends a finished game's result and drops its game checkpoint.
+        """
+        with open(self.results_path, "a") as f:
+            f.write(json.dumps(result, separators=(",", ":")) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        GameCheckpoint(self.game_path(result["index"])).remove()
@@ -1,14 +1,338 @@
+import argparse
+import json
 import logging
+import os
+import analytics
+from archive import GameArchive
+from bots import is_bot, make_strategy
+from checkpoint import GameCheckpoint, TournamentCheckpoint
 from game import GameManager, Player
 from llm_client import LLMClient
 from utils import setup_logging, save_game_log
 from config import OPENROUTER_API_KEY, DEFAULT_MODEL, DEFAULT_MODELS  # Updated import
+from evaluator import BLUNDER_REGRET, POLICIES, MoveEvaluator
 from rankings import RankingSystem  # Import the ranking system
+from instrumentation import Instrumentation
+from ratings import BradleyTerryRatings, elo_from_history
+from move_cache import MoveCache
+from replay import replay_archive
+from telemetry import summarize_by_model
+from tournament import Tournament, SCHEDULES, print_summary
 
-def main():
-    setup_logging()
-    ranking_system = RankingSystem()  # Initialize the ranking system
-    
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Escoba Bench CLI")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Log at DEBUG level (every move)")
+    subparsers = parser.add_subparsers(dest="command")
+
+    play_parser = subparsers.add_parser("play", help="Play a single interactive game (default)")
+    play_parser.add_argument("--checkpoint", metavar="PATH", help="Save the game to PATH after every turn")
+
+    tournament_parser = subparsers.add_parser("tournament", help="Run many games concurrently")
+    tournament_parser.add_argument("-n", "--num-games", type=int, default=10,
+                                   help="Number of games (per seating for all-pairs)")
+    tournament_parser.add_argument("-j", "--concurrency", type=int, default=4,
+                                   help="Maximum number of games in flight")
+    tournament_parser.add_argument("-p", "--players", type=int, default=2, choices=[2, 3, 4],
+                                   help="Players per game")
+    tournament_parser.add_argument("--schedule", choices=SCHEDULES, default="round-robin")
+    tournament_parser.add_argument("--models", nargs="+", default=DEFAULT_MODELS,
+                                   help="Models to schedule (default: DEFAULT_MODELS); "
+                                        "bot/random, bot/greedy and bot/montecarlo play locally")
+    tournament_parser.add_argument("--processes", action="store_true",
+                                   help="Use a process pool instead of threads")
+    tournament_parser.add_argument("--async", dest="use_async", action="store_true",
+                                   help="Drive all games from one event loop with AsyncLLMClient")
+    tournament_parser.add_argument("--speculate", type=int, nargs="?", const=3, default=0, metavar="WIDTH",
+                                   help="Prefetch the next player's move on the WIDTH (default 3) most likely "
+                                        "tables while the current move is in flight (not with --async)")
+    tournament_parser.add_argument("--batch", type=int, nargs="?", const=8, default=0, metavar="SIZE",
+                                   help="Send moves for the same model from concurrent games as one request of up "
+                                        "to SIZE (default 8) positions (thread pool only)")
+    tournament_parser.add_argument("--batch-window", type=float, default=50, metavar="MS",
+                                   help="How long the first move of a batch waits for others (default 50ms)")
+    tournament_parser.add_argument("--compact", action="store_true",
+                                   help="Use the compact prompt (short card codes, condensed rules)")
+    tournament_parser.add_argument("--cache-prompt", action="store_true",
+                                   help="Mark the system prompt as a cacheable prefix for providers that support it")
+    tournament_parser.add_argument("--legal-moves", choices=("list", "constrained"),
+                                   help="List the legal moves in the prompt and have the model pick one by number; "
+                                        "'constrained' also enforces it with a response_format schema")
+    tournament_parser.add_argument("--cache", metavar="PATH",
+                                   help="Reuse moves for repeated positions, persisted to this sqlite file")
+    tournament_parser.add_argument("--cache-bypass", action="store_true",
+                                   help="Always query the model but still record answers in the cache")
+    tournament_parser.add_argument("--pretty-logs", action="store_true",
+                                   help="Write one pretty-printed JSON file per game instead of the archive")
+    tournament_parser.add_argument("--metrics", metavar="PATH",
+                                   help="Write per-phase timings and event counters as JSON")
+    tournament_parser.add_argument("--profile", metavar="DIR",
+                                   help="cProfile games into DIR/game-<seed>.prof (with --async, only games that do "
+                                        "not overlap another profiled one)")
+    tournament_parser.add_argument("--profile-every", type=int, default=1, metavar="N",
+                                   help="Profile one game in every N (default 1)")
+    tournament_parser.add_argument("--checkpoint", metavar="DIR",
+                                   help="Save progress to DIR after every turn; continue with `resume DIR`")
+    tournament_parser.add_argument("--api-key", default=OPENROUTER_API_KEY)
+
+    resume_parser = subparsers.add_parser("resume", help="Continue a checkpointed tournament or game")
+    resume_parser.add_argument("path", help="Tournament checkpoint directory or game checkpoint file")
+    resume_parser.add_argument("--api-key", default=OPENROUTER_API_KEY)
+
+    ratings_parser = subparsers.add_parser("ratings", help="Recompute ratings from the full game history")
+    ratings_parser.add_argument("--method", choices=["bradley-terry", "elo"], default="bradley-terry")
+    ratings_parser.add_argument("--k-factor", type=float, default=32,
+                                help="K-factor for --method elo")
+    ratings_parser.add_argument("--prior-games", type=float, default=1.0,
+                                help="Regularizing draws per model for --method bradley-terry")
+
+    archive_parser = subparsers.add_parser("archive", help="Work with the compact game archive")
+    archive_subparsers = archive_parser.add_subparsers(dest="archive_command", required=True)
+    archive_subparsers.add_parser("import", help="Import per-game JSON logs from logs/")
+    list_parser = archive_subparsers.add_parser("list", help="List archived games")
+    list_parser.add_argument("--model")
+    list_parser.add_argument("--winner")
+    list_parser.add_argument("--since", help="ISO timestamp")
+    list_parser.add_argument("--limit", type=int, default=20)
+    show_parser = archive_subparsers.add_parser("show", help="Print one game in the verbose log format")
+    show_parser.add_argument("game_id")
+
+    replay_parser = subparsers.add_parser("replay", help="Re-simulate archived games from their seeds")
+    replay_parser.add_argument("--model")
+    replay_parser.add_argument("--since", help="ISO timestamp")
+    replay_parser.add_argument("--limit", type=int)
+    replay_parser.add_argument("--show-mismatches", action="store_true",
+                               help="List games whose recomputed scores differ from the logged ones")
+
+    evaluate_parser = subparsers.add_parser("evaluate", help="Grade archived moves by Monte Carlo rollouts")
+    evaluate_parser.add_argument("--model", help="Only grade this model's moves")
+    evaluate_parser.add_argument("--since", help="ISO timestamp")
+    evaluate_parser.add_argument("--limit", type=int)
+    evaluate_parser.add_argument("--rollouts", type=int, default=200, help="Samples per position")
+    evaluate_parser.add_argument("--policy", choices=sorted(POLICIES), default="greedy",
+                                 help="Bot policy for the playouts")
+    evaluate_parser.add_argument("-j", "--workers", type=int, help="Worker processes (default: all cores)")
+    evaluate_parser.add_argument("--seed", type=int, default=0)
+    evaluate_parser.add_argument("--force", action="store_true", help="Re-grade games already evaluated")
+    evaluate_parser.add_argument("--report", action="store_true",
+                                 help="Only print the per-model move quality stored in the archive")
+
+    analytics_parser = subparsers.add_parser("analytics", help="Columnar move statistics over the archive")
+    analytics_subparsers = analytics_parser.add_subparsers(dest="analytics_command", required=True)
+    build_parser = analytics_subparsers.add_parser("build", help="Compile new archived games into .npy columns")
+    build_parser.add_argument("--rebuild", action="store_true", help="Recompile every game")
+    build_parser.add_argument("--parquet", action="store_true", help="Also write moves.parquet (needs pyarrow)")
+    report_parser = analytics_subparsers.add_parser("report", help="Print the standard per-model statistics")
+    query_parser = analytics_subparsers.add_parser("query", help="Aggregate one column")
+    query_parser.add_argument("column", choices=sorted(analytics.COLUMNS))
+    query_parser.add_argument("--how", choices=["mean", "per-game", "count"], default="mean")
+    query_parser.add_argument("--by", choices=sorted(analytics.COLUMNS), help="Group by this column")
+    for sub in (report_parser, query_parser):
+        sub.add_argument("--model", help="Only this model's moves")
+        sub.add_argument("--players", type=int, choices=[2, 3, 4], help="Only games with this many players")
+    for sub in (build_parser, report_parser, query_parser):
+        sub.add_argument("--dir", default=analytics.ANALYTICS_DIR)
+    return parser.parse_args(argv)
+
+# Tournament options saved in a checkpoint; everything else is per invocation.
+CHECKPOINT_EXCLUDE = ("command", "verbose", "api_key", "checkpoint")
+
+def run_tournament(args):
+    checkpoint = TournamentCheckpoint(args.checkpoint) if args.checkpoint else None
+    settings = {key: value for key, value in vars(args).items() if key not in CHECKPOINT_EXCLUDE}
+    ranking_system = RankingSystem()
+    cache = None
+    if args.cache or args.cache_bypass:
+        cache = MoveCache(path=args.cache, bypass=args.cache_bypass)
+    tournament = Tournament(
+        args.models,
+        api_key=args.api_key,
+        num_games=args.num_games,
+        players_per_game=args.players,
+        schedule=args.schedule,
+        concurrency=args.concurrency,
+        use_processes=args.processes,
+        use_async=args.use_async,
+        ranking_system=ranking_system,
+        cache=cache,
+        archive=None if args.pretty_logs else GameArchive(),
+        speculate=args.speculate,
+        batch=args.batch,
+        batch_window=args.batch_window / 1000,
+        client_options={"compact": args.compact, "cache_prompt": args.cache_prompt,
+                        "legal_moves": args.legal_moves},
+        instrumentation=Instrumentation(profile_dir=args.profile, profile_every=args.profile_every),
+        checkpoint=checkpoint,
+        settings=settings,
+    )
+    total = len(tournament.schedule)
+    if tournament.finished:
+        print(f"Resuming: {len(tournament.finished)} of {total} games already finished")
+    print(f"Running {total - len(tournament.finished)} games with up to {tournament.concurrency} in parallel...")
+
+    def report(result):
+        done = len(tournament.results)
+        scores = ", ".join(f"{name}: {score}" for name, score in result["scores"].items())
+        print(f"[{done}/{total}] Game {result['index']} finished in {result['duration']:.1f}s ({scores})")
+
+    summary = tournament.run(on_result=report)
+    print_summary(summary)
+    if args.metrics:
+        print(f"Metrics written to {tournament.instrumentation.write(args.metrics)}")
+    if tournament.archive is not None:
+        print(f"Games archived in {tournament.archive.directory}")
+    if cache is not None:
+        cache.close()
+
+def show_ratings(args):
+    ranking_system = RankingSystem()
+    if args.method == "elo":
+        print(f"=== ELO replayed with K={args.k_factor:g} ===")
+        for rank, (model, stats) in enumerate(elo_from_history(ranking_system, args.k_factor), start=1):
+            print(f"{rank}. {model}")
+            print(f"   ELO: {stats['elo']:.0f} | Games: {stats['games_played']}")
+        return
+
+    leaderboard = BradleyTerryRatings.from_ranking_system(ranking_system, args.prior_games).fit()
+    print("=== Bradley-Terry ratings (95% CI) ===")
+    for rank, row in enumerate(leaderboard, start=1):
+        print(f"{rank}. {row['model']}")
+        print(f"   Rating: {row['rating']:.0f} [{row['ci_low']:.0f}, {row['ci_high']:.0f}] | "
+              f"{row['wins']}W/{row['losses']}L/{row['draws']}D")
+
+def run_archive(args):
+    game_archive = GameArchive()
+    if args.archive_command == "import":
+        imported = game_archive.import_legacy_logs()
+        print(f"Imported {imported} games; archive now holds {len(game_archive)}")
+    elif args.archive_command == "list":
+        filters = {k: v for k, v in (("model", args.model), ("winner", args.winner),
+                                     ("since", args.since)) if v is not None}
+        for record in game_archive.iter_games(limit=args.limit, **filters):
+            scores = ", ".join(f"{name}: {score}" for name, score in record["scores"].items())
+            print(f"{record['id']}  {record['ts'][:19]}  {scores}")
+    elif args.archive_command == "show":
+        game = game_archive.get(args.game_id, expand=True)
+        if game is None:
+            print(f"No game with id {args.game_id}")
+        else:
+            print(json.dumps(game, indent=2))
+
+def run_replay(args):
+    filters = {k: v for k, v in (("model", args.model), ("since", args.since),
+                                 ("limit", args.limit)) if v is not None}
+    summary = replay_archive(GameArchive(), **filters)
+    print(f"Replayed {summary['replayed']} games in {summary['elapsed']:.2f}s "
+          f"({summary['games_per_sec']:.0f} games/s); {summary['skipped']} skipped without a seed, "
+          f"{summary['failed']} diverged, {summary['score_mismatches']} score mismatches")
+    for failure in summary["failures"]:
+        print(f"  {failure['id']}: {failure['error']}")
+    if args.show_mismatches:
+        for result in summary["results"]:
+            if not result["match"]:
+                print(f"  {result['id']}: logged {result['logged_scores']}, now {result['scores']}")
+
+def run_evaluate(args):
+    game_archive = GameArchive()
+    if not args.report:
+        filters = {k: v for k, v in (("since", args.since), ("limit", args.limit)) if v is not None}
+        evaluator = MoveEvaluator(rollouts=args.rollouts, policy=args.policy, workers=args.workers,
+                                  seed=args.seed)
+        try:
+            summary = evaluator.evaluate_archive(game_archive, model=args.model, force=args.force, **filters)
+        finally:
+            evaluator.close()
+        print(f"Graded {summary['moves']} moves from {summary['games']} games in {summary['elapsed']:.1f}s "
+              f"({summary['moves_per_sec']:.1f} moves/s); {summary['skipped']} games already graded, "
+              f"{summary['failed']} could not be replayed")
+        for failure in summary["failures"]:
+            print(f"  {failure['id']}: {failure['error']}")
+    print(f"{'model':<40} {'moves':>6} {'regret':>7} {'optimal':>8} {'blunders':>9}")
+    for model, stats in game_archive.regret_by_model(BLUNDER_REGRET).items():
+        print(f"{model:<40} {stats['moves']:>6} {stats['mean_regret']:>7.3f} "
+              f"{stats['optimal_rate']:>8.1%} {stats['blunder_rate']:>9.1%}")
+
+def run_analytics(args):
+    if args.analytics_command == "build":
+        result = analytics.build(GameArchive(), args.dir, rebuild=args.rebuild, parquet=args.parquet)
+        print(f"Compiled {result['new_games']} new games in {result['elapsed']:.2f}s; "
+              f"{result['moves']} moves from {result['games']} games in {args.dir}")
+        return
+
+    table = analytics.MoveTable.load(args.dir)
+    conditions = {k: v for k, v in (("model", args.model), ("player_count", args.players)) if v is not None}
+    if conditions:
+        table = table.where(**conditions)
+    if args.analytics_command == "report":
+        for title, values in analytics.report(table).items():
+            print(title)
+            for group, value in values.items():
+                print(f"   {group}: {value:.3f}" if isinstance(value, float) else f"   {group}: {value}")
+        return
+
+    if args.how == "count":
+        result = table.count(by=args.by)
+    elif args.how == "per-game":
+        result = table.per_game(args.column, by=args.by)
+    else:
+        result = table.mean(args.column, by=args.by)
+    if isinstance(result, dict):
+        for group, value in result.items():
+            print(f"{group}: {value:.4g}")
+    else:
+        print(result)
+
+def run_resume(args):
+    if os.path.isdir(args.path):
+        checkpoint = TournamentCheckpoint(args.path)
+        tournament_args = parse_args(["tournament"])
+        vars(tournament_args).update(checkpoint.settings(), checkpoint=args.path, api_key=args.api_key)
+        run_tournament(tournament_args)
+        return
+    game_checkpoint = GameCheckpoint(args.path)
+    state = game_checkpoint.load()
+    if state is None:
+        print(f"No checkpoint at {args.path}")
+        return
+    players = [
+        Player(saved["name"], api_key=args.api_key, model=saved["model"],
+               strategy=make_strategy(saved["model"]) if is_bot(saved["model"]) else None)
+        for saved in state["players"]
+    ]
+    print(f"Resuming game after {state['turns_played']} turns")
+    game_manager = GameManager.restore(state, players, checkpoint=game_checkpoint)
+    # Rebuild the client the game was started with (see LLMClient.settings).
+    settings = dict(state["metadata"].get("client", {}))
+    cache = None
+    if "cache" in settings:
+        cache = MoveCache(path=settings.pop("cache"), bypass=settings.pop("cache_bypass", False))
+    try:
+        play_and_report(game_manager, LLMClient(api_key=args.api_key, cache=cache, **settings))
+    finally:
+        if cache is not None:
+            cache.close()
+    game_checkpoint.remove()
+
+def main(argv=None):
+    args = parse_args(argv)
+    setup_logging(logging.DEBUG if args.verbose else logging.INFO)
+    if args.command == "tournament":
+        run_tournament(args)
+    elif args.command == "ratings":
+        show_ratings(args)
+    elif args.command == "archive":
+        run_archive(args)
+    elif args.command == "replay":
+        run_replay(args)
+    elif args.command == "evaluate":
+        run_evaluate(args)
+    elif args.command == "analytics":
+        run_analytics(args)
+    elif args.command == "resume":
+        run_resume(args)
+    else:
+        play_interactive(getattr(args, "checkpoint", None))
+
+def play_interactive(checkpoint=None):
     print("Welcome to Escoba Bench CLI")
     
     while True:
@@ -45,9 +369,21 @@ def main():
         
         players.append(Player(model_choice, api_key=api_key, model=model_choice))
 
-    game_manager = GameManager(players)
+    game_checkpoint = GameCheckpoint(checkpoint) if checkpoint else None
+    game_manager = GameManager(players, checkpoint=game_checkpoint)
     ai_client = LLMClient(api_key=api_key)
-    
+    game_manager.metadata["client"] = ai_client.settings()
+    play_and_report(game_manager, ai_client)
+    if game_checkpoint is not None:
+        game_checkpoint.remove()
+
+def play_and_report(game_manager, ai_client):
+    """
+    Plays a (new or restored) game to the end, then updates the rankings,
+    prints the leaderboard and saves the game log.
+    """
+    ranking_system = RankingSystem()
+    players = game_manager.players
     try:
         final_scores = game_manager.play_game(ai_client=ai_client)
     except Exception as ex:
@@ -62,29 +398,29 @@ def main():
     # Update the persistent rankings
     ranking_system.update_rankings({
         player.name: final_scores.get(player.name, 0) for player in players
-    })
+    }, usage=summarize_by_model(players), stats=game_manager.player_stats())
 
-    # Get and display current rankings
+    # Display the leaderboard
     print("\n=== Overall Rankings ===")
-    all_rankings = ranking_system.get_rankings()
-    for rank, (player_name, stats) in enumerate(all_rankings, start=1):
+    for rank, (player_name, stats) in enumerate(ranking_system.get_leaderboard()["models"], start=1):
         print(f"{rank}. {player_name}")
-        print(f"   ELO: {stats['elo']:.0f} | Games: {stats['games_played']}")
-        
-        # Display top 3 matchups
-        if 'matchups' in stats:
+        print(f"   ELO: {stats['elo']:.0f} | Games: {stats['games_played']} | Win rate: {stats['win_rate']:.1%} "
+              f"| Avg score: {stats['avg_score']:.2f} | Escobas/game: {stats['escoba_rate']:.2f} "
+              f"| Error rate: {stats['error_rate']:.1%}")
+        if stats.get("usage"):
+            usage = stats["usage"]
+            latency = f"{usage['avg_latency']:.2f}s" if usage["avg_latency"] is not None else "-"
+            print(f"   Tokens/game: {usage['tokens_per_game']:.0f} | Cost/game: ${usage['cost_per_game']:.4f} "
+                  f"| Avg latency: {latency}")
+
+        if stats["top_matchups"]:
             print("   Key Matchups:")
-            opponents = sorted(
-                stats['matchups'].items(),
-                key=lambda x: (x[1]['wins'], -x[1]['losses']),
-                reverse=True
-            )[:3]  # Show top 3 opponents
-            
-            for opponent, matchup in opponents:
+            for matchup in stats["top_matchups"]:
                 total = matchup['wins'] + matchup['losses'] + matchup['draws']
                 win_rate = (matchup['wins'] / total * 100) if total > 0 else 0
-                print(f"    vs {opponent}: {matchup['wins']}W/{matchup['losses']}L/{matchup['draws']}D ({win_rate:.1f}%)")
-                
+                print(f"    vs {matchup['opponent']}: {matchup['wins']}W/{matchup['losses']}L/{matchup['draws']}D "
+                      f"({win_rate:.1f}%)")
+
         print()
 
     # Save detailed game log
@@ -93,6 +429,7 @@ def main():
         metadata=game_manager.metadata,
     )
     print(f"\nDetailed game log saved to: {log_file}")
+    GameArchive().add_game(game_manager.game_log, metadata=game_manager.metadata)
 
 if __name__ == '__main__':
     main() 
\ No newline at end of file
@@ -13,4 +13,20 @@ DEFAULT_MODELS = [
 
 # Read the API key and default model from the environment, or fall back to defaults
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY", "default_openrouter_api_key")
-DEFAULT_MODEL = os.getenv("DEFAULT_MODEL", DEFAULT_MODELS[0]) 
\ No newline at end of file
+DEFAULT_MODEL = os.getenv("DEFAULT_MODEL", DEFAULT_MODELS[0]) 
+
+# Background job queue used by the web app
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_QUEUE_LIMIT = int(os.getenv("JOB_QUEUE_LIMIT", "32"))
+
+# Per-model request scheduling for the LLM client (see scheduler.py);
+# RATE_LIMIT_RPS 0 (the default) means no client-side rate limit.
+RATE_LIMIT_RPS = float(os.getenv("RATE_LIMIT_RPS", "0"))
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "10"))
+MAX_RETRIES = int(os.getenv("MAX_RETRIES", "4"))
+
+# Web app log level (the CLI uses INFO, or DEBUG with -v)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
+# Optional JSON file the capture index (see captures.py) is loaded from and saved to
+CAPTURE_INDEX_PATH = os.getenv("CAPTURE_INDEX_PATH")
@@ -0,0 +1,344 @@
+import logging
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from archive import ACTION_CAPTURE
+from bots import legal_moves, move_value
+from game import GameManager, Player, cards_to_mask, mask_to_cards
+from replay import ALL_CARDS, ReplayError, ScriptedClient
+from scoring import score_game
+
+logger = logging.getLogger(__name__)
+
+MAX_PLAYERS = 4
+# A position is one row of int64s, so batches can sit in shared memory.
+SEAT, PLAYERS, DEALER, HAND, TABLE, PLAYED, CAPTURED, LAST_CAPTURE, SEED = range(9)
+HAND_SIZES = 9
+PILES = HAND_SIZES + MAX_PLAYERS
+ESCOBAS = PILES + MAX_PLAYERS
+FIELDS = ESCOBAS + MAX_PLAYERS
+# Positions shared with the worker pool at a time.
+BATCH_POSITIONS = 4096
+# Regret (in points of final margin) from which a move counts as a blunder.
+BLUNDER_REGRET = 0.5
+
+# -------------------------------
+# Positions
+# -------------------------------
+class _PositionRecorder(ScriptedClient):
+    """
+    Replays a record like ScriptedClient and encodes the state before every
+    move as a position row (see the field constants above).
+    """
+    def __init__(self, record, seed):
+        super().__init__(record)
+        self.game = None
+        self.seed = seed
+        self.rows = []
+
+    def get_move(self, player, table, usage=None):
+        game = self.game
+        _, _, _, played, captured, action = self.moves[self.position][:6]
+        row = [0] * FIELDS
+        row[SEAT] = game.players.index(player)
+        row[PLAYERS] = len(game.players)
+        row[DEALER] = game.dealer_index
+        row[HAND] = cards_to_mask(player.hand)
+        row[TABLE] = cards_to_mask(table)
+        row[PLAYED] = played
+        # Invalid captures were played as drops.
+        row[CAPTURED] = sum(1 << card_id for card_id in captured) if action == ACTION_CAPTURE else 0
+        row[LAST_CAPTURE] = game.players.index(game.last_capture_player) if game.last_capture_player else -1
+        row[SEED] = (self.seed * 1_000_003 + self.position) & (2 ** 63 - 1)
+        for seat, other in enumerate(game.players):
+            row[HAND_SIZES + seat] = len(other.hand)
+            row[PILES + seat] = cards_to_mask(other.captured)
+            row[ESCOBAS + seat] = other.escobas
+        self.rows.append(row)
+        return super().get_move(player, table, usage)
+
+def extract_positions(record, seed=0):
+    """
+    Re-simulates a compact archive record from its seed (see replay.py) and
+    returns one position row per logged move, in order.
+    Raises ReplayError for games without a seed or that diverge.
+    """
+    meta = record.get("meta") or {}
+    if meta.get("seed") is None:
+        raise ReplayError(f"Game {record.get('id')} has no seed (logged before game_version 1.1)")
+    players = [Player(p["name"], model=p.get("model")) for p in meta.get("players", [])]
+    if len(players) > MAX_PLAYERS:
+        raise ReplayError(f"Game {record.get('id')} has {len(players)} players")
+    recorder = _PositionRecorder(record, meta["seed"] ^ seed)
+    game = GameManager(players, seed=meta["seed"], record_log=False)
+    recorder.game = game
+    game.play_game(ai_client=recorder)
+    return recorder.rows
+
+# -------------------------------
+# Rollouts
+# -------------------------------
+def _greedy(moves, table, rng):
+    return max(moves, key=lambda move: move_value(*move, table))
+
+def _random(moves, table, rng):
+    return rng.choice(moves)
+
+POLICIES = {"greedy": _greedy, "random": _random}
+
+def _mask(cards):
+    mask = 0
+    for card in cards:
+        mask |= 1 << card.id
+    return mask
+
+def rollout(row, card, capture, hands, deck, choose, rng):
+    """
+    Plays the game out from a position after the mover plays card/capture,
+    with every player (the mover included) following the `choose` policy.
+    hands holds every seat's hand (hidden ones sampled) and deck the
+    remaining deck, top card last; both are consumed.
+    Returns the mover's final score minus the best opponent's.
+    """
+    num_players = row[PLAYERS]
+    seat = row[SEAT]
+    table = mask_to_cards(row[TABLE])
+    piles = [row[PILES + s] for s in range(num_players)]
+    escobas = [row[ESCOBAS + s] for s in range(num_players)]
+    last_capture = row[LAST_CAPTURE]
+    order = [(row[DEALER] + 1 + i) % num_players for i in range(num_players)]
+
+    def play(s, card, capture):
+        nonlocal last_capture
+        hands[s].remove(card)
+        if capture:
+            for captured in capture:
+                table.remove(captured)
+            piles[s] |= (1 << card.id) | _mask(capture)
+            last_capture = s
+            if not table:
+                escobas[s] += 1
+        else:
+            table.append(card)
+
+    def deal():
+        # Same as GameManager.deal_new_hands: only once every hand is empty.
+        if deck and not any(hands):
+            for s in range(num_players):
+                if len(deck) >= 3:
+                    hands[s] = [deck.pop() for _ in range(3)]
+
+    def turn(s):
+        card, capture, _ = choose(legal_moves(hands[s], table), table, rng)
+        play(s, card, capture)
+
+    play(seat, card, capture)
+    for s in order[order.index(seat) + 1:]:
+        if hands[s]:
+            turn(s)
+    deal()
+    while any(hands):
+        for s in order:
+            if hands[s]:
+                turn(s)
+        deal()
+
+    if table and last_capture >= 0:
+        piles[last_capture] |= _mask(table)
+    points = score_game(piles, escobas)
+    return points[seat] - max(points[s] for s in range(num_players) if s != seat)
+
+def evaluate_position(row, rollouts=200, policy="greedy"):
+    """
+    Estimates the value of every legal move in a position by sampling the
+    hidden cards (opponents' hands and the deck) from everything the mover
+    has not seen, and playing each sample out with a fast bot policy. Every
+    move is played out on the same samples, so their differences are less
+    noisy than their values.
+
+    Returns {"moves": [(card id, capture mask, mean, stderr)], "played",
+    "best", "expected", "best_expected", "regret", "rollouts"}; regret is
+    best_expected - expected, in points of final margin over the best
+    opponent.
+    """
+    row = [int(value) for value in row]
+    choose = POLICIES[policy]
+    seat = row[SEAT]
+    hand = mask_to_cards(row[HAND])
+    table = mask_to_cards(row[TABLE])
+    moves = legal_moves(hand, table)
+    keys = [(card.id, _mask(capture)) for card, capture, _ in moves]
+    if (row[PLAYED], row[CAPTURED]) not in keys:
+        raise ReplayError(f"Logged move {row[PLAYED]}/{row[CAPTURED]:#x} is not a legal move")
+    played = keys.index((row[PLAYED], row[CAPTURED]))
+
+    if len(moves) == 1:
+        return {"moves": [keys[0] + (0.0, 0.0)], "played": 0, "best": 0, "expected": 0.0,
+                "best_expected": 0.0, "regret": 0.0, "rollouts": 0}
+
+    seen = row[HAND] | row[TABLE]
+    for s in range(row[PLAYERS]):
+        seen |= row[PILES + s]
+    unseen = mask_to_cards(ALL_CARDS & ~seen)
+    sizes = [row[HAND_SIZES + s] for s in range(row[PLAYERS])]
+
+    rng = random.Random(row[SEED])
+    sums = [0.0] * len(moves)
+    squares = [0.0] * len(moves)
+    for _ in range(rollouts):
+        rng.shuffle(unseen)
+        hands, start = [], 0
+        for s, size in enumerate(sizes):
+            if s == seat:
+                hands.append(hand)
+            else:
+                hands.append(unseen[start:start + size])
+                start += size
+        deck = unseen[start:]
+        policy_seed = rng.getrandbits(32)
+        for index, (card, capture, _) in enumerate(moves):
+            value = rollout(row, card, capture, [list(h) for h in hands], list(deck), choose,
+                            random.Random(policy_seed))
+            sums[index] += value
+            squares[index] += value * value
+
+    results = []
+    for key, total, square in zip(keys, sums, squares):
+        mean = total / rollouts
+        variance = max(0.0, square / rollouts - mean * mean)
+        results.append(key + (mean, math.sqrt(variance / rollouts)))
+    best = max(range(len(results)), key=lambda index: results[index][2])
+    return {
+        "moves": results,
+        "played": played,
+        "best": best,
+        "expected": results[played][2],
+        "best_expected": results[best][2],
+        "regret": results[best][2] - results[played][2],
+        "rollouts": rollouts,
+    }
+
+# -------------------------------
+# Worker pool
+# -------------------------------
+_attached = {}
+
+def _positions(name, shape):
+    # Workers attach to each shared batch once and keep the view.
+    if name not in _attached:
+        for old in _attached.values():
+            old[0].close()
+        _attached.clear()
+        block = shared_memory.SharedMemory(name=name)
+        _attached[name] = (block, np.ndarray(shape, dtype=np.int64, buffer=block.buf))
+    return _attached[name][1]
+
+def _evaluate_shared(name, shape, index, rollouts, policy):
+    return evaluate_position(_positions(name, shape)[index].tolist(), rollouts, policy)
+
+class MoveEvaluator:
+    """
+    Grades logged moves by Monte Carlo rollouts (see evaluate_position),
+    spread over a process pool. Batches of position rows are placed in
+    shared memory, so workers only receive (batch, index) pairs.
+    workers=1 evaluates in-process.
+    """
+    def __init__(self, rollouts=200, policy="greedy", workers=None, seed=0):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown rollout policy '{policy}', expected one of {sorted(POLICIES)}")
+        self.rollouts = rollouts
+        self.policy = policy
+        self.workers = workers or os.cpu_count() or 1
+        self.seed = seed
+        self._executor = None
+
+    def evaluate_rows(self, rows):
+        """
+        Evaluates position rows, returning the evaluate_position results in order.
+        """
+        if not rows:
+            return []
+        if self.workers == 1 or len(rows) == 1:
+            return [evaluate_position(row, self.rollouts, self.policy) for row in rows]
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        array = np.asarray(rows, dtype=np.int64)
+        block = shared_memory.SharedMemory(create=True, size=array.nbytes)
+        try:
+            np.ndarray(array.shape, dtype=np.int64, buffer=block.buf)[:] = array
+            futures = [
+                self._executor.submit(_evaluate_shared, block.name, array.shape, index,
+                                      self.rollouts, self.policy)
+                for index in range(len(rows))
+            ]
+            return [future.result() for future in futures]
+        finally:
+            block.close()
+            block.unlink()
+
+    def evaluate_game(self, record):
+        """
+        Evaluates every move of one compact record; returns (move index,
+        seat, result) tuples.
+        """
+        rows = extract_positions(record, self.seed)
+        return [(index, row[SEAT], result) for index, (row, result)
+                in enumerate(zip(rows, self.evaluate_rows(rows)))]
+
+    def evaluate_archive(self, archive, model=None, force=False, **filters):
+        """
+        Evaluates the moves of every archived game matching filters (see
+        GameArchive.query) and stores the regret of each move in the archive
+        (GameArchive.annotate_moves). With model set only that model's moves
+        are graded. Games already evaluated are skipped unless force is set.
+        """
+        if model is not None:
+            filters["model"] = model
+        done = set() if force else archive.evaluated_games(model)
+        pending, summary = [], {"games": 0, "moves": 0, "skipped": 0, "failed": 0, "failures": []}
+        started = time.perf_counter()
+        previous_disable = logging.root.manager.disable
+        logging.disable(logging.CRITICAL)
+        try:
+            for record in archive.iter_games(**filters):
+                if record["id"] in done:
+                    summary["skipped"] += 1
+                    continue
+                try:
+                    rows = extract_positions(record, self.seed)
+                except ReplayError as ex:
+                    summary["failed"] += 1
+                    summary["failures"].append({"id": record.get("id"), "error": str(ex)})
+                    continue
+                models = [p.get("model") for p in record["meta"]["players"]]
+                selected = [(index, row) for index, row in enumerate(rows)
+                            if model is None or models[row[SEAT]] == model]
+                pending.append((record["id"], models, selected))
+                if sum(len(moves) for _, _, moves in pending) >= BATCH_POSITIONS:
+                    self._flush(archive, pending, summary)
+            self._flush(archive, pending, summary)
+        finally:
+            logging.disable(previous_disable)
+        summary["elapsed"] = time.perf_counter() - started
+        summary["moves_per_sec"] = summary["moves"] / summary["elapsed"] if summary["elapsed"] else 0.0
+        return summary
+
+    def _flush(self, archive, pending, summary):
+        results = iter(self.evaluate_rows([row for _, _, moves in pending for _, row in moves]))
+        for game_id, models, moves in pending:
+            annotations = [(index, models[row[SEAT]], next(results)) for index, row in moves]
+            archive.annotate_moves(game_id, annotations)
+            summary["games"] += 1
+            summary["moves"] += len(annotations)
+        pending.clear()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
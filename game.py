@@ -1,5 +1,9 @@
 import random
-from itertools import combinations
+from captures import LegalMoves, find_valid_captures
+from cards import Card, cards_to_mask, mask_to_cards  # noqa: F401 (re-exported)
+from scoring import score_game
+from instrumentation import NULL_INSTRUMENTATION
+from telemetry import new_usage, summarize_usage
 import logging
 from datetime import datetime
 
@@ -12,47 +16,16 @@ class EarlyTermination(Exception):
     """
     pass
 
-# -------------------------------
-# Card Class
-# -------------------------------
-class Card:
-    SUITS = ["Coins", "Cups", "Batons", "Swords"]
-    RANKS = ["1", "2", "3", "4", "5", "6", "7", "Sota", "Caballo", "Rey"]
-    CAPTURE_VALUES = {
-        "1": 1,
-        "2": 2,
-        "3": 3,
-        "4": 4,
-        "5": 5,
-        "6": 6,
-        "7": 7,
-        "Sota": 8,
-        "Caballo": 9,
-        "Rey": 10,
-    }
-    # Prime ranking order: best card is '7', then '6', '1', etc.
-    PRIME_ORDER = ["7", "6", "1", "5", "4", "3", "2", "Sota", "Caballo", "Rey"]
-
-    def __init__(self, suit, rank):
-        self.suit = suit
-        self.rank = rank
-
-    @property
-    def value(self):
-        return self.CAPTURE_VALUES[self.rank]
-
-    def __repr__(self):
-        return f"{self.rank} of {self.suit}"
-
 # -------------------------------
 # Deck Class
 # -------------------------------
 class Deck:
-    def __init__(self):
-        self.cards = [Card(suit, rank) for suit in Card.SUITS for rank in Card.RANKS]
+    def __init__(self, rng=None):
+        self.cards = list(Card.ALL)
+        self.rng = rng or random
 
     def shuffle(self):
-        random.shuffle(self.cards)
+        self.rng.shuffle(self.cards)
 
     def deal_cards(self, num):
         dealt = [self.cards.pop() for _ in range(num)] if len(self.cards) >= num else []
@@ -62,14 +35,19 @@ class Deck:
 # Player Class
 # -------------------------------
 class Player:
-    def __init__(self, name, api_key=None, model="google/gemini-2.0-flash-001"):
+    def __init__(self, name, api_key=None, model="google/gemini-2.0-flash-001", strategy=None):
         self.name = name
         self.hand = []
         self.captured = []  # List to store captured cards.
         self.escobas = 0
+        self.moves = 0
         self.api_key = api_key  # Holds API key if needed for LLM integration.
         self.model = model    # Model identifier for this player's LLM.
         self.error_count = 0  # Tracks invalid responses/moves
+        self.transport_errors = 0  # Requests that never got an answer; not the model's fault.
+        self.strategy = strategy  # Local bot (see bots.py); overrides the LLM client when set.
+        self.rng = None  # Game RNG, set by GameManager; used for fallback moves.
+        self.usage = new_usage()  # LLM requests, tokens, cost and latency (see telemetry.py).
 
     def __repr__(self):
         return f"{self.name}"
@@ -78,9 +56,33 @@ class Player:
 # GameManager Class
 # -------------------------------
 class GameManager:
-    def __init__(self, players):
+    def __init__(self, players, rng=None, record_log=True, on_event=None, seed=None, instrumentation=None,
+                 checkpoint=None):
+        """
+        seed: per-game RNG seed, recorded in metadata so the deal can be
+              replayed (see replay.py); a fresh one is drawn when omitted.
+        rng: optional random.Random to use instead (the seed is then unknown).
+        record_log: set to False for headless simulation to skip building game_log.
+        on_event: optional callback invoked with every game_log entry as it happens.
+        instrumentation: optional instrumentation.Instrumentation collecting
+              phase timings and event counts (no-op by default).
+        checkpoint: optional callable invoked with the game after the deal
+              and after every turn, e.g. checkpoint.GameCheckpoint.
+        """
+        self.instrumentation = instrumentation or NULL_INSTRUMENTATION
+        if rng is None:
+            if seed is None:
+                seed = random.SystemRandom().getrandbits(63)
+            rng = random.Random(seed)
+        self.seed = seed
+        self.rng = rng
         self.players = players
-        self.deck = Deck()
+        for player in players:
+            player.rng = rng
+        self.record_log = record_log
+        self.on_event = on_event
+        self.checkpoint = checkpoint
+        self.deck = Deck(rng)
         self.deck.shuffle()
         self.table = []
         self.game_log = []
@@ -93,7 +95,8 @@ class GameManager:
                 } for player in players
             ],
             "dealer_index": len(players) - 1,
-            "game_version": "1.0",
+            "game_version": "1.2",
+            "seed": seed,
             "rules": {
                 "capture_sum": 15,
                 "cards_per_hand": 3,
@@ -104,15 +107,18 @@ class GameManager:
         self.last_capture_player = None
         self.early_termination = False
         self.early_loser = None
+        self.turns_played = 0
+        self.dealt = False
 
     def initial_deal(self):
         # Each player gets 3 cards; the table gets 4 cards.
         # logging.debug("Starting initial deal")
         for player in self.players:
             player.hand = self.deck.deal_cards(3)
-            logging.debug(f"{player.name} hand: {player.hand}")
+            logging.debug("%s hand: %s", player.name, player.hand)
         self.table = self.deck.deal_cards(4)
-        logging.debug(f"Initial table: {self.table}")
+        self.dealt = True
+        logging.debug("Initial table: %s", self.table)
 
         # Check for immediate capture in the opening deal.
         table_sum = sum(card.value for card in self.table)
@@ -121,7 +127,7 @@ class GameManager:
             logging.debug("Immediate capture: Table sums to 15, dealer collects and scores an escoba")
             dealer.captured.extend(self.table)
             dealer.escobas += 1
-            self.game_log.append({
+            self.log_event({
                 "event": "immediate_capture",
                 "player": dealer.name,
                 "cards": [str(card) for card in self.table]
@@ -131,7 +137,7 @@ class GameManager:
             logging.debug("Immediate capture: Table sums to 30, dealer collects and scores two escobas")
             dealer.captured.extend(self.table)
             dealer.escobas += 2
-            self.game_log.append({
+            self.log_event({
                 "event": "immediate_capture",
                 "player": dealer.name,
                 "cards": [str(card) for card in self.table]
@@ -139,56 +145,162 @@ class GameManager:
             self.table.clear()
 
     def find_valid_captures(self, played_card, table_cards):
-        needed = 15 - played_card.value
-        valid_sets = []
-        for i in range(1, len(table_cards) + 1):
-            for combo in combinations(table_cards, i):
-                if sum(card.value for card in combo) == needed:
-                    valid_sets.append(list(combo))
-        return valid_sets
+        return find_valid_captures(played_card, table_cards)
 
     def play_turn(self, player, ai_client=None):
         """
-        Processes a single turn for a player using the LLM to decide the move.
+        Processes a single turn for a player using the LLM (or the player's
+        local strategy) to decide the move.
         Now properly removes the played card from the player's hand.
         """
-        logging.debug(f"{player.name}'s turn with hand: {player.hand}")
-        logging.debug(f"Current table: {self.table}")
-        move_log = {
+        logging.debug("%s's turn with hand: %s", player.name, player.hand)
+        logging.debug("Current table: %s", self.table)
+        move_log = self.new_move_log(player)
+
+        # Let a speculating client (see speculation.py) start on the next
+        # player's likely positions while this move is in flight.
+        prefetch = getattr(ai_client, "prefetch", None)
+        if prefetch is not None:
+            prefetch(self, player)
+
+        legal = self.legal_moves(player)
+        # Use the player's local strategy if it has one, otherwise the LLM.
+        with self.instrumentation.timer("decide"):
+            if player.strategy:
+                card_str, capture_cards_strs, move_error = player.strategy.get_move(
+                    player, self.table, legal=legal, captured=self.captured_cards()
+                )
+            else:
+                card_str, capture_cards_strs, move_error = ai_client.get_move(
+                    player, self.table, usage=player.usage, **self.client_legal(ai_client, legal)
+                )
+        self.apply_move(player, move_log, card_str, capture_cards_strs, move_error, legal=legal)
+
+    async def play_turn_async(self, player, ai_client=None):
+        """
+        Same as play_turn, but awaits an async client (e.g. AsyncLLMClient).
+        """
+        logging.debug("%s's turn with hand: %s", player.name, player.hand)
+        logging.debug("Current table: %s", self.table)
+        move_log = self.new_move_log(player)
+        legal = self.legal_moves(player)
+        with self.instrumentation.timer("decide"):
+            if player.strategy:
+                card_str, capture_cards_strs, move_error = player.strategy.get_move(
+                    player, self.table, legal=legal, captured=self.captured_cards()
+                )
+            else:
+                card_str, capture_cards_strs, move_error = await ai_client.get_move(
+                    player, self.table, usage=player.usage, **self.client_legal(ai_client, legal)
+                )
+        self.apply_move(player, move_log, card_str, capture_cards_strs, move_error, legal=legal)
+
+    def legal_moves(self, player):
+        """
+        Every legal move for the player this turn (captures.LegalMoves),
+        computed once and shared by the strategy or client and validate_move.
+        """
+        with self.instrumentation.timer("legal"):
+            return LegalMoves(player.hand, self.table)
+
+    def captured_cards(self):
+        # Every captured pile; public information that bots may use.
+        return [card for player in self.players for card in player.captured]
+
+    @staticmethod
+    def client_legal(ai_client, legal):
+        # Only clients that opt in (legal_move_list) take the precomputed
+        # moves, so replay and custom clients keep their old signature.
+        return {"legal": legal} if getattr(ai_client, "legal_move_list", False) else {}
+
+    def new_move_log(self, player):
+        if not self.record_log:
+            return {"player": player.name}
+        return {
             "player": player.name,
             "hand": [str(card) for card in player.hand],
             "table_before": [str(card) for card in self.table]
         }
 
-        # Always use LLM-based decision.
-        card_str, capture_cards_strs, move_error = ai_client.get_move(player, self.table)
+    def log_event(self, entry):
+        if self.record_log:
+            self.game_log.append(entry)
+        if self.on_event:
+            self.on_event(entry)
 
+    def validate_move(self, player, card_str, capture_cards_strs, legal=None):
+        """
+        Maps the client's answer onto real cards. Returns (card, capture_cards,
+        capture_valid): an unknown card falls back to the first card in hand,
+        and capture_cards keeps only table cards, without duplicates. With
+        the turn's LegalMoves the capture is checked by a single lookup.
+        """
         # Map the returned card string to an actual Card object from the player's hand.
-        selected_card = None
-        for card in player.hand:
-            if str(card) == card_str:
-                selected_card = card
-                break
-        if not selected_card:
+        selected_card = Card.from_str(card_str) if isinstance(card_str, str) else None
+        if selected_card not in player.hand:
             selected_card = player.hand[0]  # Fallback if not found.
-
-        # IMPORTANT FIX: Remove the played card from the player's hand
-        player.hand.remove(selected_card)
+            self.instrumentation.count("invalid_cards")
 
         # Map each capture card string to actual Card objects from the table.
         capture_cards = []
         for cap_str in capture_cards_strs:
-            for card in self.table:
-                if str(card) == cap_str:
-                    capture_cards.append(card)
-                    break
+            card = Card.from_str(cap_str) if isinstance(cap_str, str) else None
+            if card in self.table and card not in capture_cards:
+                capture_cards.append(card)
 
-        logging.debug(f"AI {player.name} decided to play {selected_card} with capture {capture_cards}")
+        if legal is not None:
+            capture_valid = bool(capture_cards) and legal.find(selected_card, capture_cards) is not None
+        else:
+            capture_valid = bool(capture_cards) and (
+                selected_card.value + sum(card.value for card in capture_cards) == 15
+            )
+        if capture_cards and not capture_valid:
+            self.instrumentation.count("invalid_captures")
+        return selected_card, capture_cards, capture_valid
+
+    def apply_move(self, player, move_log, card_str, capture_cards_strs, move_error, legal=None):
+        """
+        Validates and applies the move returned by the client, then records it.
+        """
+        with self.instrumentation.timer("validate"):
+            selected_card, capture_cards, capture_valid = self.validate_move(
+                player, card_str, capture_cards_strs, legal
+            )
+        with self.instrumentation.timer("apply"):
+            self.place_card(player, move_log, selected_card, capture_cards, capture_valid, move_error)
+        player.moves += 1
+        self.instrumentation.count("moves")
+
+        # Transport failures (see scheduler.py) are counted but never end the game.
+        if move_error == "transport":
+            player.transport_errors += 1
+            self.instrumentation.count("transport_errors")
+            logging.warning("%s got no response from the API. Transport errors: %d",
+                            player.name, player.transport_errors)
+        # Check for early termination: if a player reaches 3 errors.
+        elif move_error:
+            player.error_count += 1
+            self.instrumentation.count("model_errors")
+            logging.error("%s encountered an LLM response error. Error count: %d",
+                          player.name, player.error_count)
+            if player.error_count >= 3:
+                logging.error("%s reached 3 errors. Terminating game early.", player.name)
+                self.early_loser = player.name
+                raise EarlyTermination(player.name)
+
+    def place_card(self, player, move_log, selected_card, capture_cards, capture_valid, move_error):
+        """
+        Plays the validated move: takes the card from the hand, captures or
+        drops it, and logs the move.
+        """
+        # IMPORTANT FIX: Remove the played card from the player's hand
+        player.hand.remove(selected_card)
+
+        logging.debug("AI %s decided to play %s with capture %s", player.name, selected_card, capture_cards)
         move_log["played_card"] = str(selected_card)
 
         if capture_cards:
-            total = selected_card.value + sum(card.value for card in capture_cards)
-            if total == 15:
+            if capture_valid:
                 for captured in capture_cards:
                     if captured in self.table:
                         self.table.remove(captured)
@@ -196,11 +308,12 @@ class GameManager:
                 player.captured.append(selected_card)
                 player.captured.extend(capture_cards)
                 self.last_capture_player = player
-                move_log["action"] = f"Captured {', '.join(str(c) for c in capture_cards)}"
+                if self.record_log:
+                    move_log["action"] = f"Captured {', '.join(str(c) for c in capture_cards)}"
                 if not self.table:
                     player.escobas += 1
                     move_log["escoba"] = True
-                    logging.debug(f"{player.name} made an escoba!")
+                    logging.debug("%s made an escoba!", player.name)
                 else:
                     move_log["escoba"] = False
             else:
@@ -214,37 +327,34 @@ class GameManager:
             move_log["action"] = "Played card to table (no capture)"
             move_log["escoba"] = False
 
-        move_log["table_after"] = [str(card) for card in self.table]
-        logging.debug(f"After move, table: {self.table}")
-        self.game_log.append(move_log)
-
-        # Check for early termination: if a player reaches 3 errors.
-        if move_error:
-            player.error_count += 1
-            logging.error(f"{player.name} encountered an LLM response error. Error count: {player.error_count}")
-            if player.error_count >= 3:
-                logging.error(f"{player.name} reached 3 errors. Terminating game early.")
-                self.early_loser = player.name
-                raise EarlyTermination(player.name)
+        if self.record_log:
+            move_log["table_after"] = [str(card) for card in self.table]
+            if move_error:
+                move_log["error"] = move_error
+        logging.debug("After move, table: %s", self.table)
+        self.log_event(move_log)
+        self.turns_played += 1
 
     def deal_new_hands(self):
         """
         When players' hands are empty yet cards remain in the deck, deal new hands.
         """
+        if any(player.hand for player in self.players):
+            return
         for player in self.players:
             if self.deck.cards:
                 new_cards = self.deck.deal_cards(3)
                 player.hand = new_cards
-                logging.debug(f"{player.name} new hand: {player.hand}")
+                logging.debug("%s new hand: %s", player.name, player.hand)
 
     def finalize_round(self):
         """
         When the round ends, award any remaining table cards to the last capturing player.
         """
         if self.table and self.last_capture_player:
-            logging.debug(f"{self.last_capture_player.name} collects remaining table cards: {self.table}")
+            logging.debug("%s collects remaining table cards: %s", self.last_capture_player.name, self.table)
             self.last_capture_player.captured.extend(self.table)
-            self.game_log.append({
+            self.log_event({
                 "event": "finalize_round",
                 "player": self.last_capture_player.name,
                 "collected": [str(card) for card in self.table]
@@ -253,79 +363,212 @@ class GameManager:
 
     def calculate_scores(self):
         """
-        Computes points for each player.
-        For this demo we give:
-         - 1 point for most captured cards (Cartas)
-         - 1 point for most Coins (Oros)
-         - 1 point for capturing the 7 of Coins (Siete de Oros)
-         - 1 point per escoba achieved
-        (The prime calculation is omitted for now.)
-        """
-        scores = {}
-        # Cartas: score bonus for most captured
-        captured_counts = {player.name: len(player.captured) for player in self.players}
-        max_captured = max(captured_counts.values())
-        cartas_winners = [name for name, count in captured_counts.items() if count == max_captured and count > 0]
-
-        # Coins (Oros)
-        coins_counts = {}
-        for player in self.players:
-            coins_counts[player.name] = len([card for card in player.captured if card.suit == "Coins"])
-        max_coins = max(coins_counts.values())
-        oros_winners = [name for name, count in coins_counts.items() if count == max_coins and count > 0]
+        Computes points for each player with the full Escoba rules (cartas,
+        oros, siete de oros, sietes, primera and escobas; see scoring.py).
+        """
+        captured_masks = [cards_to_mask(player.captured) for player in self.players]
+        escobas = [player.escobas for player in self.players]
+        points = score_game(captured_masks, escobas)
+        return {player.name: score for player, score in zip(self.players, points)}
 
-        # Siete de Oros
-        siete_de_oros_winner = None
-        for player in self.players:
-            for card in player.captured:
-                if card.suit == "Coins" and card.rank == "7":
-                    siete_de_oros_winner = player.name
-                    break
-            if siete_de_oros_winner:
-                break
-
-        # Tally points.
-        for player in self.players:
-            score = 0
-            if player.name in cartas_winners:
-                score += 1
-            if player.name in oros_winners:
-                score += 1
-            if player.name == siete_de_oros_winner:
-                score += 1
-            score += player.escobas
-            scores[player.name] = score
-        return scores
+    def turn_order(self):
+        """
+        Players in the order they act each round, starting with dealer's right.
+        """
+        num_players = len(self.players)
+        starting_index = (self.dealer_index + 1) % num_players
+        return [self.players[(starting_index + i) % num_players] for i in range(num_players)]
+
+    def next_player(self, player):
+        """
+        The player who moves after `player` without a new deal in between,
+        or None if the next move comes from a fresh hand.
+        """
+        order = self.turn_order()
+        start = order.index(player)
+        for offset in range(1, len(order)):
+            candidate = order[(start + offset) % len(order)]
+            if candidate.hand:
+                return candidate
+        return None
+
+    def next_to_move(self):
+        """
+        The player whose turn it is, or None once every hand is empty. Each
+        deal gives everyone the same number of cards, so it is the first
+        player in turn order still holding the most.
+        """
+        most = max(len(player.hand) for player in self.players)
+        if not most:
+            return None
+        return next(player for player in self.turn_order() if len(player.hand) == most)
+
+    def end_turn(self):
+        # Deal again once the hand is played out, then checkpoint the turn.
+        if self.deck.cards and not any(player.hand for player in self.players):
+            with self.instrumentation.timer("deal"):
+                self.deal_new_hands()
+        self.save_checkpoint()
+
+    def start_game(self):
+        # A restored game (see restore) is already dealt.
+        if not self.dealt:
+            with self.instrumentation.timer("deal"):
+                self.initial_deal()
+            self.save_checkpoint()
+
+    def save_checkpoint(self):
+        if self.checkpoint is not None:
+            with self.instrumentation.timer("checkpoint"):
+                self.checkpoint(self)
 
     def play_game(self, ai_client=None):
         """
         Main game loop executing rounds until the deck is exhausted.
         """
-        self.initial_deal()
-
-        # Play rounds until players have no cards.
-        try:
-            while any(player.hand for player in self.players):
-                # Play in order starting with dealer's right.
-                starting_index = (self.dealer_index + 1) % len(self.players)
-                num_players = len(self.players)
-                for i in range(num_players):
-                    idx = (starting_index + i) % num_players
-                    player = self.players[idx]
-                    if player.hand:
-                        self.play_turn(player, ai_client=ai_client)
-                if self.deck.cards:
-                    self.deal_new_hands()
-        except EarlyTermination as et:
-            logging.error(f"Game terminated early due to invalid moves by {et}.")
-            self.game_log.append({"event": "early_termination", "player": str(et)})
+        with self.instrumentation.profile(self):
+            self.start_game()
+
+            # Play turns until players have no cards.
+            try:
+                player = self.next_to_move()
+                while player is not None:
+                    self.play_turn(player, ai_client=ai_client)
+                    self.end_turn()
+                    player = self.next_to_move()
+            except EarlyTermination as et:
+                self.record_early_termination(et)
+
+            return self.finish_game()
+
+    async def play_game_async(self, ai_client=None):
+        """
+        Async game loop, so many games can be driven from a single event loop.
+        """
+        with self.instrumentation.profile(self):
+            self.start_game()
+
+            try:
+                player = self.next_to_move()
+                while player is not None:
+                    await self.play_turn_async(player, ai_client=ai_client)
+                    self.end_turn()
+                    player = self.next_to_move()
+            except EarlyTermination as et:
+                self.record_early_termination(et)
+
+            return self.finish_game()
+
+    # -------------------------------
+    # Checkpoints
+    # -------------------------------
+    def snapshot(self):
+        """
+        The engine state between turns as plain JSON data, with cards as
+        Card.id: deck order, hands, table, captured piles, escobas, error
+        counts, usage, the last capturer, the RNG state, metadata and the
+        game log so far. restore() continues the game from it exactly.
+        """
+        version, internal, gauss_next = self.rng.getstate()
+        return {
+            "seed": self.seed,
+            "rng": [version, list(internal), gauss_next],
+            "dealt": self.dealt,
+            "deck": [card.id for card in self.deck.cards],
+            "table": [card.id for card in self.table],
+            "dealer_index": self.dealer_index,
+            "last_capture": (self.players.index(self.last_capture_player)
+                             if self.last_capture_player is not None else None),
+            "early_loser": self.early_loser,
+            "turns_played": self.turns_played,
+            "players": [
+                {
+                    "name": player.name,
+                    "model": player.model,
+                    "hand": [card.id for card in player.hand],
+                    "captured": [card.id for card in player.captured],
+                    "escobas": player.escobas,
+                    "moves": player.moves,
+                    "error_count": player.error_count,
+                    "transport_errors": player.transport_errors,
+                    "usage": player.usage,
+                } for player in self.players
+            ],
+            "metadata": self.metadata,
+            "game_log": self.game_log,
+        }
 
+    @classmethod
+    def restore(cls, state, players, **kwargs):
+        """
+        Rebuilds a game from snapshot() with fresh Players (same names, in
+        seat order, with their strategies). kwargs go to GameManager.
+        """
+        names = [player["name"] for player in state["players"]]
+        if [player.name for player in players] != names:
+            raise ValueError(f"Checkpoint is for players {names}")
+        game = cls(players, rng=random.Random(), **kwargs)
+        version, internal, gauss_next = state["rng"]
+        game.rng.setstate((version, tuple(internal), gauss_next))
+        game.seed = state["seed"]
+        game.dealt = state["dealt"]
+        game.deck.cards = [Card.from_id(card_id) for card_id in state["deck"]]
+        game.table = [Card.from_id(card_id) for card_id in state["table"]]
+        game.dealer_index = state["dealer_index"]
+        game.early_loser = state["early_loser"]
+        game.turns_played = state["turns_played"]
+        for player, saved in zip(players, state["players"]):
+            player.hand = [Card.from_id(card_id) for card_id in saved["hand"]]
+            player.captured = [Card.from_id(card_id) for card_id in saved["captured"]]
+            player.escobas = saved["escobas"]
+            player.moves = saved["moves"]
+            player.error_count = saved["error_count"]
+            player.transport_errors = saved["transport_errors"]
+            player.usage = saved["usage"]
+        if state["last_capture"] is not None:
+            game.last_capture_player = players[state["last_capture"]]
+        game.metadata = state["metadata"]
+        game.game_log = state["game_log"]
+        return game
+
+    def player_stats(self):
+        """
+        {name: {"escobas", "moves", "errors"}} for the leaderboard, summed
+        over seats sharing a name. errors are model errors only.
+        """
+        stats = {}
+        for player in self.players:
+            entry = stats.setdefault(player.name, {"escobas": 0, "moves": 0, "errors": 0})
+            entry["escobas"] += player.escobas
+            entry["moves"] += player.moves
+            entry["errors"] += player.error_count
+        return stats
+
+    def record_early_termination(self, et):
+        logging.error("Game terminated early due to invalid moves by %s.", et)
+        self.instrumentation.count("early_terminations")
+        self.log_event({"event": "early_termination", "player": str(et)})
+
+    def finish_game(self):
+        """
+        Settles the round and returns the final scores.
+        """
         # End-of-round: assign any leftover table cards.
-        self.finalize_round()
-        final_scores = self.calculate_scores()
+        with self.instrumentation.timer("score"):
+            self.finalize_round()
+            final_scores = self.calculate_scores()
+        self.instrumentation.count("games")
         # If early termination, set the offender's score to 0.
         if self.early_loser:
             final_scores[self.early_loser] = 0
-        self.game_log.append({"event": "final_scores", "scores": final_scores})
-        logging.debug(f"Final scores: {final_scores}")
+        self.metadata["errors"] = {
+            player.name: {"model": player.error_count, "transport": player.transport_errors}
+            for player in self.players
+        }
+        self.metadata["usage"] = {
+            player.name: dict(summarize_usage(player.usage), model=player.model)
+            for player in self.players if player.strategy is None
+        }
+        self.log_event({"event": "final_scores", "scores": final_scores})
+        logging.debug("Final scores: %s", final_scores)
         return final_scores 
\ No newline at end of file
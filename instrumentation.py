@@ -0,0 +1,195 @@
+import cProfile
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+logger = logging.getLogger(__name__)
+
+# Game phases timed by GameManager. "decide" is the wait for the player's
+# client (network for LLMs); everything else is engine overhead. "legal" is
+# listing the turn's legal moves, "validate" checking the answer against them.
+PHASES = ("deal", "legal", "decide", "validate", "apply", "score", "checkpoint")
+
+# Games on one event loop share a thread, and only one profiler can collect there at a time.
+_profiling = threading.local()
+# Event counters.
+COUNTERS = ("games", "moves", "invalid_cards", "invalid_captures", "model_errors",
+            "transport_errors", "early_terminations")
+
+class _Timer:
+    __slots__ = ("instrumentation", "phase", "started")
+
+    def __init__(self, instrumentation, phase):
+        self.instrumentation = instrumentation
+        self.phase = phase
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.instrumentation.observe(self.phase, time.perf_counter() - self.started)
+        return False
+
+class Instrumentation:
+    """
+    Per-phase timers and event counters for GameManager, safe to share
+    between threads (e.g. every game of a tournament or the web app).
+
+    profile_dir turns on cProfile for one in every `profile_every` games;
+    each profile is written as <profile_dir>/game-<seed>.prof for pstats or
+    snakeviz. A sampled game that starts while another profile is running in
+    the same thread (async games share the event loop's) is not profiled,
+    and an async profile also covers whatever else the loop ran meanwhile.
+    """
+    def __init__(self, profile_dir=None, profile_every=1):
+        self.profile_dir = profile_dir
+        self.profile_every = max(1, profile_every)
+        self._lock = threading.Lock()
+        self._profiled = 0
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.phases = {phase: {"count": 0, "seconds": 0.0, "max": 0.0} for phase in PHASES}
+            self.counters = dict.fromkeys(COUNTERS, 0)
+
+    def for_game(self, index):
+        """
+        A fresh instance for one game of a batch (merge its snapshot back
+        afterwards); it profiles only if game `index` is sampled.
+        """
+        sampled = self.profile_dir is not None and index % self.profile_every == 0
+        return Instrumentation(profile_dir=self.profile_dir if sampled else None)
+
+    def timer(self, phase):
+        return _Timer(self, phase)
+
+    def observe(self, phase, seconds):
+        with self._lock:
+            stats = self.phases[phase]
+            stats["count"] += 1
+            stats["seconds"] += seconds
+            if seconds > stats["max"]:
+                stats["max"] = seconds
+
+    def count(self, counter, n=1):
+        with self._lock:
+            self.counters[counter] += n
+
+    @contextmanager
+    def profile(self, game):
+        """
+        Profiles the enclosed game if profiling is on and this game is sampled.
+        """
+        with self._lock:
+            sampled = self.profile_dir is not None and self._profiled % self.profile_every == 0
+            self._profiled += 1
+        if not sampled or getattr(_profiling, "active", False):
+            yield
+            return
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Python 3.12+: another thread's profiler is already active.
+            yield
+            return
+        _profiling.active = True
+        try:
+            yield
+        finally:
+            profiler.disable()
+            _profiling.active = False
+            os.makedirs(self.profile_dir, exist_ok=True)
+            path = os.path.join(self.profile_dir, f"game-{game.seed}.prof")
+            profiler.dump_stats(path)
+            logger.info("Wrote game profile to %s", path)
+
+    def snapshot(self):
+        with self._lock:
+            phases = {phase: dict(stats) for phase, stats in self.phases.items()}
+            counters = dict(self.counters)
+        for stats in phases.values():
+            stats["mean"] = stats["seconds"] / stats["count"] if stats["count"] else 0.0
+        engine = sum(stats["seconds"] for phase, stats in phases.items() if phase != "decide")
+        return {
+            "phases": phases,
+            "counters": counters,
+            "engine_seconds": engine,
+            "decide_seconds": phases["decide"]["seconds"],
+        }
+
+    def merge(self, snapshot):
+        """
+        Adds another instance's snapshot (e.g. from a worker process).
+        """
+        with self._lock:
+            for phase, stats in snapshot["phases"].items():
+                own = self.phases[phase]
+                own["count"] += stats["count"]
+                own["seconds"] += stats["seconds"]
+                own["max"] = max(own["max"], stats["max"])
+            for counter, value in snapshot["counters"].items():
+                self.counters[counter] += value
+
+    def write(self, path):
+        """
+        Writes the current snapshot as a JSON metrics file.
+        """
+        with open(path, "w") as f:
+            json.dump(self.snapshot(), f, indent=2)
+        return path
+
+    def __getstate__(self):
+        # Only the settings cross process boundaries; workers start empty.
+        return {"profile_dir": self.profile_dir, "profile_every": self.profile_every}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def prometheus(self, prefix="escoba"):
+        """
+        The snapshot in the Prometheus text exposition format.
+        """
+        snapshot = self.snapshot()
+        lines = [
+            f"# HELP {prefix}_phase_seconds Time spent in each game phase.",
+            f"# TYPE {prefix}_phase_seconds summary",
+        ]
+        for phase, stats in snapshot["phases"].items():
+            lines.append(f'{prefix}_phase_seconds_sum{{phase="{phase}"}} {stats["seconds"]:.6f}')
+            lines.append(f'{prefix}_phase_seconds_count{{phase="{phase}"}} {stats["count"]}')
+        lines += [
+            f"# HELP {prefix}_phase_seconds_max Longest single observation of each game phase.",
+            f"# TYPE {prefix}_phase_seconds_max gauge",
+        ]
+        for phase, stats in snapshot["phases"].items():
+            lines.append(f'{prefix}_phase_seconds_max{{phase="{phase}"}} {stats["max"]:.6f}')
+        lines += [
+            f"# HELP {prefix}_events_total Game events.",
+            f"# TYPE {prefix}_events_total counter",
+        ]
+        for counter, value in snapshot["counters"].items():
+            lines.append(f'{prefix}_events_total{{event="{counter}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+class NullInstrumentation(Instrumentation):
+    """
+    Default for GameManager: timers and counters are no-ops.
+    """
+    _timer = nullcontext()
+
+    def timer(self, phase):
+        return self._timer
+
+    def observe(self, phase, seconds):
+        pass
+
+    def count(self, counter, n=1):
+        pass
+
+NULL_INSTRUMENTATION = NullInstrumentation()
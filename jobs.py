@@ -0,0 +1,182 @@
+import logging
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+class QueueFull(Exception):
+    """
+    Raised when a job is submitted while the queue is at its length limit.
+    """
+    pass
+
+# -------------------------------
+# Job
+# -------------------------------
+class Job:
+    """
+    A game queued or running in the background whose events can be followed live.
+
+    Events are appended with consecutive ids (their index), so a client that
+    reconnects with the last id it saw resumes exactly where it left off.
+    """
+    def __init__(self, params=None):
+        self.id = uuid.uuid4().hex
+        self.params = params or {}
+        self.status = "queued"
+        self.events = []
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self._condition = threading.Condition()
+
+    def publish(self, entry, kind=None):
+        with self._condition:
+            self.events.append((kind or event_kind(entry), entry))
+            self._condition.notify_all()
+
+    def start(self):
+        with self._condition:
+            self.status = "running"
+            self.started = time.time()
+            self.events.append(("status", {"status": self.status}))
+            self._condition.notify_all()
+
+    def finish(self, result, summary=None):
+        """
+        result is kept for /jobs/<id>/result; summary (default: result) is
+        what the final "done" event carries.
+        """
+        with self._condition:
+            self.result = result
+            self.status = "finished"
+            self.finished = time.time()
+            self.events.append(("done", result if summary is None else summary))
+            self._condition.notify_all()
+
+    def fail(self, error):
+        with self._condition:
+            self.error = str(error)
+            self.status = "failed"
+            self.finished = time.time()
+            self.events.append(("failed", {"error": self.error}))
+            self._condition.notify_all()
+
+    @property
+    def done(self):
+        return self.status in ("finished", "failed")
+
+    def describe(self):
+        return {
+            "id": self.id,
+            "status": self.status,
+            "params": self.params,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "events": len(self.events),
+            "error": self.error,
+        }
+
+    def events_after(self, last_id, timeout=15.0):
+        """
+        Blocks until there are events after last_id (or timeout) and returns
+        them as (id, kind, data) tuples. last_id of -1 means from the start.
+        """
+        with self._condition:
+            if len(self.events) <= last_id + 1 and not self.done:
+                self._condition.wait(timeout)
+            return [
+                (index, kind, data)
+                for index, (kind, data) in enumerate(self.events[last_id + 1:], start=last_id + 1)
+            ]
+
+def event_kind(entry):
+    # game_log entries are either moves or named events (immediate_capture, ...).
+    return entry.get("event", "move")
+
+# -------------------------------
+# Job store
+# -------------------------------
+class JobStore:
+    """
+    Keeps jobs by id; only the most recent `max_finished` finished jobs are
+    retained so the store does not grow forever.
+    """
+    def __init__(self, max_finished=100):
+        self.max_finished = max_finished
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, job):
+        with self._lock:
+            self._jobs[job.id] = job
+            finished = [job_id for job_id, j in self._jobs.items() if j.done]
+            for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+                del self._jobs[job_id]
+        return job
+
+    def remove(self, job_id):
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+# -------------------------------
+# Job queue
+# -------------------------------
+class JobQueue:
+    """
+    Fixed pool of worker threads fed from a bounded queue.
+
+    submit() returns immediately with the queued job; when max_pending jobs
+    are already waiting it raises QueueFull instead of queueing without
+    limit, so callers can push back on clients (HTTP 503).
+    """
+    def __init__(self, store, workers=4, max_pending=32):
+        self.store = store
+        self.workers = workers
+        self.max_pending = max_pending
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._threads = [
+            threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, job, target, *args):
+        """
+        Queues target(job, *args) to run on a worker.
+        """
+        # Store first, so a worker or a poll can never see a job the store does not know.
+        self.store.add(job)
+        try:
+            self._queue.put_nowait((job, target, args))
+        except queue.Full:
+            self.store.remove(job.id)
+            raise QueueFull(f"Job queue is full ({self.max_pending} pending)") from None
+        return job
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def _work(self):
+        while True:
+            job, target, args = self._queue.get()
+            try:
+                job.start()
+                target(job, *args)
+            except Exception as ex:
+                logger.error(f"Job {job.id} failed: {ex}")
+                if not job.done:
+                    job.fail(ex)
+            finally:
+                self._queue.task_done()
@@ -1,19 +1,98 @@
+import asyncio
+import httpx
 import requests
 import json
 import logging
 import random
 import re
-from itertools import combinations
+import time
+from functools import partial
+from captures import LegalMoves, find_valid_captures
+from requests.adapters import HTTPAdapter
+from cards import Card
+from scheduler import RequestScheduler, TransportError
+from telemetry import add_usage, record_request
+
+API_URL = "https://openrouter.ai/api/v1/chat/completions"
+
+# Compact prompt encoding: "<capture value><suit letter>", e.g. "7o" is the
+# 7 of Coins and "10e" the Rey of Swords.
+SUIT_CODES = {"Coins": "o", "Cups": "c", "Batons": "b", "Swords": "e"}
+CARD_CODES = {card: f"{card.value}{SUIT_CODES[card.suit]}" for card in Card.ALL}
+CODE_NAMES = {code: str(card) for card, code in CARD_CODES.items()}
+
+COMPACT_SYSTEM_PROMPT = """Escoba. Cards are <value><suit>: value 1-10 (8 Sota, 9 Caballo, 10 Rey); suit o=Coins c=Cups b=Batons e=Swords.
+Play one card from your hand. If the played card plus some table cards sum to exactly 15 you may capture those table cards; capturing the whole table is an escoba (+1 point). Otherwise the card stays on the table.
+Reply with JSON only: {"card":"7o","capture":["5c","3b"]} (capture [] if none)."""
+
+# Appended to either system prompt when the legal moves are listed.
+LEGAL_MOVES_PROMPT = """Every legal move is listed with a number. Pick one and reply with JSON only: {"move": <number>}"""
+
+def format_legal_moves(legal, compact=False):
+    """
+    The numbered move list for the prompt, e.g. "1. 7o drop" and
+    "2. 7o x 5c 3b (escoba)" in compact form.
+    """
+    lines = []
+    for number, (card, capture, escoba) in enumerate(legal, 1):
+        if compact:
+            move = CARD_CODES[card] + (" x " + " ".join(CARD_CODES[c] for c in capture) if capture else " drop")
+        else:
+            move = f"play {card}" + (f", capture {', '.join(str(c) for c in capture)}" if capture
+                                     else " to the table")
+        lines.append(f"{number}. {move}{' (escoba)' if escoba else ''}")
+    return "\n".join(lines)
+
+def legal_moves_schema(legal):
+    # OpenRouter structured output: the reply must be {"move": n} with n in range.
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "move",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": {"move": {"type": "integer", "minimum": 1, "maximum": len(legal)}},
+                "required": ["move"],
+                "additionalProperties": False,
+            },
+        },
+    }
 
 class LLMClient:
     """
     LLM client that integrates with OpenRouter API to decide moves.
     Now returns a triple: (card, capture_set, error_flag)
-    where error_flag is True if an exception occurred.
+    where error_flag is True if the model's answer was unusable, or
+    "transport" if no answer arrived at all (see scheduler.py).
+
+    compact=True sends short card codes and a condensed system prompt;
+    cache_prompt=True marks the system prompt as a cacheable prefix
+    (cache_control) for providers that support prompt caching.
+    legal_moves="list" adds the numbered legal moves to the prompt and asks
+    for {"move": n}; "constrained" also sends a response_format schema so
+    providers with structured output can only return a listed move.
     """
-    def __init__(self, api_key):
+    def __init__(self, api_key, timeout=60, pool_size=10, cache=None, scheduler=None,
+                 compact=False, cache_prompt=False, legal_moves=None):
+        if legal_moves not in (None, "list", "constrained"):
+            raise ValueError(f"Unknown legal_moves mode: {legal_moves}")
         self.api_key = api_key
-        print(self.api_key)
+        self.timeout = timeout
+        self.compact = compact
+        self.cache_prompt = cache_prompt
+        self.legal_moves = legal_moves
+        # GameManager passes its precomputed LegalMoves only to clients that ask.
+        self.legal_move_list = legal_moves is not None
+        # Optional MoveCache; identical positions reuse an earlier answer.
+        self.cache = cache
+        # Rate limits, retries and circuit breaking per model; share one
+        # scheduler between clients that hit the same endpoints.
+        self.scheduler = scheduler or RequestScheduler()
+        # Keep-alive session so consecutive moves reuse the same TLS connection.
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
         self.system_prompt = """You are playing the Spanish card game Escoba. Your role is to make valid moves according to these rules:
         
 Card Values:
@@ -42,73 +121,304 @@ Your responses must be valid JSON objects with:
   "card": "The card you choose to play from your hand",
   "capture": ["Array of table cards to capture (empty if no capture)"]
 }"""
+        if compact:
+            self.system_prompt = COMPACT_SYSTEM_PROMPT
+        if self.legal_move_list:
+            self.system_prompt += "\n" + LEGAL_MOVES_PROMPT
 
     def find_valid_captures(self, played_card, table_cards):
-        needed = 15 - played_card.value
-        valid_sets = []
-        # Check every non-empty subset of table_cards.
-        for i in range(1, len(table_cards) + 1):
-            for combo in combinations(table_cards, i):
-                if sum(card.value for card in combo) == needed:
-                    valid_sets.append(list(combo))
-        return valid_sets
+        return find_valid_captures(played_card, table_cards)
 
-    def get_move(self, player, table_cards):
+    def user_prompt(self, player, table_cards, legal=None):
         """
-        Constructs a prompt for the LLM and returns a tuple:
-           (card, capture_set, error_flag)
-        where card is a string representing the chosen card,
-        capture_set is a list of table card strings to capture, and
-        error_flag is True if an error occurred.
+        Describes the player's current state, listing the legal moves if given.
         """
-        hand_list = [str(card) for card in player.hand]
-        table_list = [str(card) for card in table_cards]
-        
-        user_prompt = f"""Current Game State:
+        if self.compact:
+            hand = " ".join(CARD_CODES[card] for card in player.hand)
+            table = " ".join(CARD_CODES[card] for card in table_cards)
+            user_prompt = f"Hand: {hand}\nTable: {table or '-'}"
+        else:
+            hand_list = [str(card) for card in player.hand]
+            table_list = [str(card) for card in table_cards]
+
+            user_prompt = f"""Current Game State:
 Your hand: {hand_list}
 Table cards: {table_list}
 
 Choose your move, responding with only a JSON object."""
+        if legal is not None:
+            user_prompt += "\nLegal moves:\n" + format_legal_moves(legal, self.compact)
+        return user_prompt
 
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "HTTP-Referer": "<YOUR_SITE_URL>",
-            "X-Title": "<YOUR_SITE_NAME>"
-        }
-        # Use the player's model if specified, or default.
-        model_name = getattr(player, "model", "google/gemini-2.0-flash-001")
-        data = json.dumps({
-            "model": model_name,
+    def system_content(self, system_prompt=None):
+        system_prompt = system_prompt or self.system_prompt
+        if self.cache_prompt:
+            # The system prompt is identical for every move, so providers can cache it.
+            return [{"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}]
+        return system_prompt
+
+    def build_payload(self, player, table_cards, legal=None):
+        """
+        Builds the chat completion request body for the player's current state,
+        listing the legal moves if given.
+        """
+        body = {
+            "model": self.model_name(player),
             "messages": [
                 {
                     "role": "system",
-                    "content": self.system_prompt
+                    "content": self.system_content()
                 },
                 {
                     "role": "user",
-                    "content": user_prompt
+                    "content": self.user_prompt(player, table_cards, legal)
                 }
-            ]
-        })
+            ],
+            # Ask OpenRouter to include the cost in the usage block.
+            "usage": {"include": True}
+        }
+        if legal is not None and self.legal_moves == "constrained":
+            body["response_format"] = legal_moves_schema(legal)
+        return json.dumps(body)
+
+    def model_name(self, player):
+        # Use the player's model if specified, or default.
+        return getattr(player, "model", "google/gemini-2.0-flash-001")
+
+    def listed_moves(self, player, table_cards, legal=None):
+        # The moves to put in the prompt, or None when they are not listed.
+        if not self.legal_move_list:
+            return None
+        return legal if legal is not None else LegalMoves(player.hand, table_cards)
+
+    def settings(self):
+        """
+        The options this client was built with, as JSON data: the LLMClient
+        keyword arguments plus the move cache's path and bypass flag. Games
+        record it in their metadata so a resumed game gets the same client.
+        """
+        settings = {"compact": self.compact, "cache_prompt": self.cache_prompt,
+                    "legal_moves": self.legal_moves}
+        if self.cache is not None:
+            settings["cache"] = self.cache.path
+            settings["cache_bypass"] = self.cache.bypass
+        return settings
+
+    @property
+    def prompt_variant(self):
+        # Part of the MoveCache key: answers to one prompt format are not reused for another.
+        variant = "compact" if self.compact else "full"
+        return f"{variant}+{self.legal_moves}" if self.legal_moves else variant
+
+    def cached_move(self, player, table_cards):
+        if self.cache is None:
+            return None
+        return self.cache.get(self.model_name(player), player.hand, table_cards, self.prompt_variant)
+
+    def store_move(self, player, table_cards, card, capture, legal=None):
+        """
+        Caches an answer, but only if it is a legal move; anything else would
+        be served again on every later hit.
+        """
+        if self.cache is None:
+            return
+        legal = legal if legal is not None else LegalMoves(player.hand, table_cards)
+        played = Card.from_str(card)
+        captured = [Card.from_str(name) for name in capture]
+        if played is None or None in captured or legal.find(played, captured) is None:
+            return
+        self.cache.put(self.model_name(player), player.hand, table_cards, card, capture, self.prompt_variant)
+
+    def headers(self):
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "HTTP-Referer": "<YOUR_SITE_URL>",
+            "X-Title": "<YOUR_SITE_NAME>",
+            "Content-Type": "application/json",
+        }
+
+    def parse_move(self, response_data, legal=None):
+        """
+        Extracts (card, capture_set) from an OpenRouter chat completion response.
+        With legal moves listed, a {"move": n} answer picks the n-th one.
+        """
+        return self.move_from_json(self.response_json(response_data), legal)
+
+    def response_json(self, response_data):
+        """
+        The JSON object in a chat completion's message content.
+        """
+        if "choices" not in response_data and "error" in response_data:
+            # OpenRouter reports upstream provider failures in a 200 body.
+            raise TransportError(f"Provider error: {response_data['error']}")
+        content = response_data["choices"][0]["message"]["content"]
+        # Extract JSON from a markdown code block if present.
+        match = re.search(r"```(?:json)?\s*(\{.*\})\s*```", content, re.DOTALL)
+        if match:
+            json_str = match.group(1)
+        else:
+            json_str = content.strip()
+        return json.loads(json_str)
+
+    def move_from_json(self, move, legal=None):
+        """
+        Maps one decoded answer to (card, capture_set).
+        """
+        if legal is not None and "move" in move:
+            number = move["move"]
+            if not isinstance(number, int) or not 1 <= number <= len(legal):
+                raise ValueError(f"Move {number!r} is not one of the {len(legal)} listed")
+            card, capture, _ = legal[number - 1]
+            return str(card), [str(c) for c in capture]
+        # Compact codes map back to card names; anything else passes through.
+        return (CODE_NAMES.get(move["card"], move["card"]),
+                [CODE_NAMES.get(card, card) for card in move["capture"]])
+
+    def fallback_move(self, player, error, kind=True):
+        if kind == "transport":
+            logging.error(f"No response from {self.model_name(player)}: {error}")
+        else:
+            logging.error(f"Error parsing API response: {error}")
+        # Fallback: randomly select a card with no capture, and flag an error.
+        # Use the game's RNG when there is one, so seeded games stay reproducible.
+        chosen_card = (getattr(player, "rng", None) or random).choice(player.hand)
+        return str(chosen_card), [], kind
+
+    def answer(self, player, table_cards, response, usage=None, legal=None):
+        """
+        Turns a successful HTTP response into the get_move triple, adding its
+        token counts to usage if given.
+        """
+        model = self.model_name(player)
         try:
-            response = requests.post(
-                url="https://openrouter.ai/api/v1/chat/completions",
-                headers=headers,
-                data=data
-            )
-            # logging.debug(f"OpenRouter API response: {response.text}")
             response_data = response.json()
-            content = response_data["choices"][0]["message"]["content"]
-            # Extract JSON from a markdown code block if present.
-            match = re.search(r"```(?:json)?\s*(\{.*\})\s*```", content, re.DOTALL)
-            if match:
-                json_str = match.group(1)
-            else:
-                json_str = content.strip()
-            move = json.loads(json_str)
-            return move["card"], move["capture"], False
+            if usage is not None:
+                add_usage(usage, response_data)
+            card, capture = self.parse_move(response_data, legal)
+        except TransportError as e:
+            self.scheduler.record_failure(model)
+            return self.fallback_move(player, e, "transport")
         except Exception as e:
-            logging.error(f"Error parsing API response: {e}")
-            # Fallback: randomly select a card with no capture, and flag an error.
-            chosen_card = random.choice(player.hand)
-            return str(chosen_card), [], True 
\ No newline at end of file
+            # The provider answered; the model's reply was unusable.
+            self.scheduler.record_success(model)
+            return self.fallback_move(player, e)
+        self.scheduler.record_success(model)
+        self.store_move(player, table_cards, card, capture, legal)
+        return card, capture, False
+
+    def get_move(self, player, table_cards, usage=None, legal=None):
+        """
+        Constructs a prompt for the LLM and returns a tuple:
+           (card, capture_set, error_flag)
+        where card is a string representing the chosen card,
+        capture_set is a list of table card strings to capture, and
+        error_flag is True if an error occurred.
+        usage, if given, is a usage dict (see telemetry.py) that accumulates
+        requests, tokens, cost and latency. legal is the turn's
+        captures.LegalMoves (computed here if the prompt lists moves and the
+        caller did not pass them).
+        """
+        cached = self.cached_move(player, table_cards)
+        if cached is not None:
+            if usage is not None:
+                usage["cached"] = usage.get("cached", 0) + 1
+            return cached[0], cached[1], False
+        return self.request_move(player, table_cards, usage, legal)
+
+    def request_move(self, player, table_cards, usage=None, legal=None):
+        """
+        The request half of get_move: always asks the model, without
+        looking in the move cache first.
+        """
+        legal = self.listed_moves(player, table_cards, legal)
+        data = self.build_payload(player, table_cards, legal)
+        started = time.perf_counter()
+        try:
+            response = self.scheduler.send(self.model_name(player), partial(
+                self.session.post,
+                url=API_URL,
+                headers=self.headers(),
+                data=data,
+                timeout=self.timeout
+            ))
+        except TransportError as e:
+            return self.fallback_move(player, e, "transport")
+        if usage is not None:
+            record_request(usage, time.perf_counter() - started)
+        # logging.debug(f"OpenRouter API response: {response.text}")
+        return self.answer(player, table_cards, response, usage, legal)
+
+# -------------------------------
+# Async client
+# -------------------------------
+class AsyncLLMClient(LLMClient):
+    """
+    Async variant of LLMClient so many games can share one event loop.
+
+    Requests go through one httpx.AsyncClient, so a request in flight is a
+    coroutine waiting on a socket rather than a blocked thread. Its
+    keep-alive connection pool holds max_connections connections, and every
+    request carries the client timeout. Each model additionally gets its own
+    semaphore of per_model_limit (capped at max_connections) so one slow
+    endpoint cannot take every connection; when the models are known up
+    front the pool is sized to per_model_limit connections per model.
+
+    Call aclose() from the event loop when done.
+    """
+    def __init__(self, api_key, max_connections=32, per_model_limit=8, timeout=60, cache=None,
+                 scheduler=None, compact=False, cache_prompt=False, legal_moves=None, models=None):
+        self.per_model_limit = min(per_model_limit, max_connections)
+        if models:
+            max_connections = min(max_connections, self.per_model_limit * len(set(models)))
+        super().__init__(api_key, timeout=timeout, pool_size=1, cache=cache,
+                         scheduler=scheduler, compact=compact, cache_prompt=cache_prompt,
+                         legal_moves=legal_moves)
+        self.max_connections = max_connections
+        self.http = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_connections,
+                                max_keepalive_connections=max_connections),
+            timeout=httpx.Timeout(timeout),
+        )
+        self._semaphores = {}
+
+    def _semaphore(self, model_name):
+        if model_name not in self._semaphores:
+            self._semaphores[model_name] = asyncio.Semaphore(self.per_model_limit)
+        return self._semaphores[model_name]
+
+    async def get_move(self, player, table_cards, usage=None, legal=None):
+        """
+        Async version of LLMClient.get_move with the same return triple.
+        """
+        cached = self.cached_move(player, table_cards)
+        if cached is not None:
+            if usage is not None:
+                usage["cached"] = usage.get("cached", 0) + 1
+            return cached[0], cached[1], False
+        return await self.request_move(player, table_cards, usage, legal)
+
+    async def request_move(self, player, table_cards, usage=None, legal=None):
+        """
+        Async version of LLMClient.request_move.
+        """
+        legal = self.listed_moves(player, table_cards, legal)
+        data = self.build_payload(player, table_cards, legal)
+        model_name = self.model_name(player)
+        started = time.perf_counter()
+
+        async def attempt():
+            async with self._semaphore(model_name):
+                return await self.http.post(API_URL, headers=self.headers(), content=data,
+                                            timeout=self.timeout)
+
+        try:
+            response = await self.scheduler.send_async(model_name, attempt)
+        except TransportError as e:
+            return self.fallback_move(player, e, "transport")
+        if usage is not None:
+            record_request(usage, time.perf_counter() - started)
+        return self.answer(player, table_cards, response, usage, legal)
+
+    async def aclose(self):
+        await self.http.aclose()
+        self.session.close()
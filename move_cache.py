@@ -0,0 +1,122 @@
+import json
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+class MoveCache:
+    """
+    Cache of parsed LLM moves keyed by (model, prompt variant, hand, table).
+
+    The prompt only depends on those things, so identical positions can
+    reuse an earlier answer instead of paying for another API call. The
+    variant names the prompt format (see LLMClient.prompt_variant), since
+    the compact and legal-move prompts can get different answers. Keys are
+    canonical (cards sorted by id), entries live in an in-memory LRU and, when
+    a path is given, in a sqlite file shared across runs and processes.
+
+    With bypass=True lookups always miss but answers are still stored, which
+    lets a benchmark measure how stochastic a model is for repeated positions.
+    """
+    def __init__(self, path=None, capacity=4096, bypass=False):
+        self.path = path
+        self.capacity = capacity
+        self.bypass = bypass
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+
+    @staticmethod
+    def make_key(model, hand, table_cards, variant=""):
+        hand_ids = ",".join(str(i) for i in sorted(card.id for card in hand))
+        table_ids = ",".join(str(i) for i in sorted(card.id for card in table_cards))
+        return f"{model}|{variant}|{hand_ids}|{table_ids}"
+
+    def _db(self):
+        if self._conn is None and self.path:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS moves (key TEXT PRIMARY KEY, card TEXT, capture TEXT)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def get(self, model, hand, table_cards, variant=""):
+        """
+        Returns the cached (card, capture) for this position, or None.
+        """
+        if self.bypass:
+            with self._lock:
+                self.bypassed += 1
+            return None
+        key = self.make_key(model, hand, table_cards, variant)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            db = self._db()
+            row = db.execute("SELECT card, capture FROM moves WHERE key = ?", (key,)).fetchone() if db else None
+            if row is None:
+                self.misses += 1
+                return None
+            move = (row[0], json.loads(row[1]))
+            self._remember(key, move)
+            self.hits += 1
+            self.disk_hits += 1
+            return move
+
+    def put(self, model, hand, table_cards, card, capture, variant=""):
+        key = self.make_key(model, hand, table_cards, variant)
+        move = (card, list(capture))
+        with self._lock:
+            self._remember(key, move)
+            db = self._db()
+            if db:
+                db.execute(
+                    "INSERT OR REPLACE INTO moves (key, card, capture) VALUES (?, ?, ?)",
+                    (key, card, json.dumps(move[1]))
+                )
+                db.commit()
+
+    def _remember(self, key, move):
+        self._entries[key] = move
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+        }
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def __getstate__(self):
+        # Process-pool workers get their own connection and an empty LRU.
+        state = self.__dict__.copy()
+        state["_conn"] = None
+        state["_lock"] = None
+        state["_entries"] = OrderedDict()
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
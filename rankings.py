@@ -1,131 +1,498 @@
 import json
+import sqlite3
+import threading
+import time
+from datetime import datetime
 from pathlib import Path
-import os
 import logging
 
 logger = logging.getLogger(__name__)
 RANKINGS_FILE = "rankings.json"
+RANKINGS_DB = "rankings.db"
+# Opponents kept per model in the materialized leaderboard.
+TOP_MATCHUPS = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ratings (
+    model TEXT PRIMARY KEY,
+    elo REAL NOT NULL,
+    games_played INTEGER NOT NULL DEFAULT 0,
+    total_score INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS matchups (
+    model TEXT NOT NULL,
+    opponent TEXT NOT NULL,
+    wins INTEGER NOT NULL DEFAULT 0,
+    losses INTEGER NOT NULL DEFAULT 0,
+    draws INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (model, opponent)
+);
+CREATE TABLE IF NOT EXISTS model_usage (
+    model TEXT PRIMARY KEY,
+    games INTEGER NOT NULL DEFAULT 0,
+    requests INTEGER NOT NULL DEFAULT 0,
+    cached INTEGER NOT NULL DEFAULT 0,
+    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+    completion_tokens INTEGER NOT NULL DEFAULT 0,
+    cost REAL NOT NULL DEFAULT 0,
+    latency_sum REAL NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    results TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS leaderboard (
+    model TEXT PRIMARY KEY,
+    games INTEGER NOT NULL DEFAULT 0,
+    wins INTEGER NOT NULL DEFAULT 0,
+    draws INTEGER NOT NULL DEFAULT 0,
+    losses INTEGER NOT NULL DEFAULT 0,
+    total_score INTEGER NOT NULL DEFAULT 0,
+    escobas INTEGER NOT NULL DEFAULT 0,
+    moves INTEGER NOT NULL DEFAULT 0,
+    errors INTEGER NOT NULL DEFAULT 0,
+    top_matchups TEXT NOT NULL DEFAULT '[]'
+);
+CREATE TABLE IF NOT EXISTS leaderboard_meta (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    revision INTEGER NOT NULL,
+    updated REAL
+);
+INSERT OR IGNORE INTO leaderboard_meta (id, revision, updated) VALUES (1, 0, NULL);
+"""
+
+LEADERBOARD_QUERY = """
+SELECT r.model, r.elo, r.games_played, l.games, l.wins, l.draws, l.losses, l.total_score,
+       l.escobas, l.moves, l.errors, l.top_matchups,
+       u.games, u.requests, u.cached, u.prompt_tokens, u.completion_tokens, u.cost, u.latency_sum
+FROM ratings r
+LEFT JOIN leaderboard l ON l.model = r.model
+LEFT JOIN model_usage u ON u.model = r.model
+ORDER BY r.elo DESC
+"""
+
+def apply_elo(rankings, game_results, k_factor):
+    """
+    Applies one game's pairwise ELO updates to the rankings dict in place.
+    Every player in game_results must already have an entry in rankings.
+    """
+    # Convert game results to list of (player, score) and sort by score
+    sorted_results = sorted(game_results.items(), key=lambda x: x[1], reverse=True)
+
+    # Update ELO for all player pairs
+    for i, (player_a, score_a) in enumerate(sorted_results):
+        for j, (player_b, score_b) in enumerate(sorted_results):
+            if i >= j or player_a == player_b:
+                continue
+
+            # Get current ratings
+            ra = rankings[player_a]["elo"]
+            rb = rankings[player_b]["elo"]
+
+            # Calculate expected scores
+            ea = 1 / (1 + 10 ** ((rb - ra) / 400))
+            eb = 1 / (1 + 10 ** ((ra - rb) / 400))
+
+            # Initialize matchups if needed
+            rankings[player_a]["matchups"].setdefault(player_b, {"wins": 0, "losses": 0, "draws": 0})
+            rankings[player_b]["matchups"].setdefault(player_a, {"wins": 0, "losses": 0, "draws": 0})
+
+            # Update head-to-head stats
+            if score_a > score_b:
+                rankings[player_a]["matchups"][player_b]["wins"] += 1
+                rankings[player_b]["matchups"][player_a]["losses"] += 1
+            elif score_a < score_b:
+                rankings[player_a]["matchups"][player_b]["losses"] += 1
+                rankings[player_b]["matchups"][player_a]["wins"] += 1
+            else:
+                rankings[player_a]["matchups"][player_b]["draws"] += 1
+                rankings[player_b]["matchups"][player_a]["draws"] += 1
+
+            # Determine actual scores based on game outcome
+            if score_a > score_b:
+                sa, sb = 1, 0
+            elif score_a < score_b:
+                sa, sb = 0, 1
+            else:
+                sa = sb = 0.5
+
+            # Update ratings
+            new_ra = ra + k_factor * (sa - ea)
+            new_rb = rb + k_factor * (sb - eb)
+
+            # Update games played and scores
+            rankings[player_a]["games_played"] += 1
+            rankings[player_b]["games_played"] += 1
+            rankings[player_a]["total_score"] += score_a
+            rankings[player_b]["total_score"] += score_b
+
+            # Apply updated ratings
+            rankings[player_a]["elo"] = new_ra
+            rankings[player_b]["elo"] = new_rb
+
+def _usage_stats(games, requests, cached, prompt, completion, cost, latency_sum):
+    return {
+        "games": games,
+        "requests": requests,
+        "cached": cached,
+        "prompt_tokens": prompt,
+        "completion_tokens": completion,
+        "cost": cost,
+        "tokens_per_game": (prompt + completion) / games if games else 0,
+        "cost_per_game": cost / games if games else 0,
+        "avg_latency": latency_sum / requests if requests else None,
+    }
 
 class RankingSystem:
-    def __init__(self, initial_elo=1000, k_factor=32):
-        self.rankings_path = Path(RANKINGS_FILE)
+    """
+    ELO rankings stored in sqlite (WAL mode).
+
+    Each game is applied as one atomic transaction that only touches the rows
+    of the models involved, so concurrent writers (parallel tournaments, the
+    web app, several processes) never overwrite each other's updates. Every
+    game's results are also appended to the `games` table, which is the full
+    rating-event history.
+
+    Each game also updates a materialized leaderboard: per-model aggregates
+    (win rate, average score, escoba and error rates) and each model's top
+    matchups, plus a revision number and timestamp for HTTP caching.
+    get_leaderboard reads it with one query, and nothing is re-sorted per request.
+
+    get_rankings and get_leaderboard serve from in-memory caches that are
+    invalidated by local writes and by commits from other connections
+    (PRAGMA data_version).
+    A legacy rankings.json is imported the first time the database is created.
+    """
+    def __init__(self, initial_elo=1000, k_factor=32, db_path=None, legacy_path=None):
+        self.db_path = Path(db_path or RANKINGS_DB)
+        self.rankings_path = Path(legacy_path or RANKINGS_FILE)
         self.initial_elo = initial_elo
         self.k_factor = k_factor
-        self._ensure_rankings_file()
-        
-    def _ensure_rankings_file(self):
-        if not self.rankings_path.exists():
-            logger.info(f"Creating new rankings file at {self.rankings_path}")
-            self._save_rankings({})
-            
-    def _load_rankings(self):
+        self._lock = threading.Lock()
+        self._cache = None
+        self._cache_version = None
+        self._board = None
+        self._board_version = None
+        self._conn = self._connect()
+        self._ensure_schema()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _ensure_schema(self):
+        with self._lock:
+            self._conn.executescript(SCHEMA)
+            empty = self._conn.execute("SELECT COUNT(*) FROM ratings").fetchone()[0] == 0
+            stale = self._conn.execute(
+                "SELECT COUNT(*) FROM ratings WHERE model NOT IN (SELECT model FROM leaderboard)"
+            ).fetchone()[0] > 0
+        if empty and self.rankings_path.exists():
+            self._import_legacy()
+            stale = True
+        if stale:
+            self.rebuild_leaderboard()
+
+    def _import_legacy(self):
         try:
             with open(self.rankings_path, 'r') as f:
-                # Handle empty file case
                 content = f.read()
-                if not content.strip():
-                    logger.warning("Rankings file is empty")
-                    return {}
-                # Reset file pointer to beginning before json.load
-                f.seek(0)
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError) as e:
-            logger.error(f"Error loading rankings: {e}")
-            return {}
-            
-    def _save_rankings(self, rankings):
-        with open(self.rankings_path, 'w') as f:
-            logger.debug(f"Saving rankings to {self.rankings_path}")
-            json.dump(rankings, f, indent=2)
-            
-    def update_rankings(self, game_results):
+            rankings = json.loads(content) if content.strip() else {}
+        except (OSError, json.JSONDecodeError) as e:
+            logger.error(f"Error loading legacy rankings: {e}")
+            return
+        logger.info(f"Importing {len(rankings)} models from {self.rankings_path}")
+        with self._transaction() as conn:
+            for model, stats in rankings.items():
+                self._write_model(conn, model, stats)
+
+    def _transaction(self):
+        return _Transaction(self)
+
+    def _data_version(self):
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _read_model(self, conn, model):
+        row = conn.execute(
+            "SELECT elo, games_played, total_score FROM ratings WHERE model = ?", (model,)
+        ).fetchone()
+        if row is None:
+            return {
+                "elo": self.initial_elo,
+                "games_played": 0,
+                "total_score": 0,
+                "matchups": {}
+            }
+        matchups = {
+            opponent: {"wins": wins, "losses": losses, "draws": draws}
+            for opponent, wins, losses, draws in conn.execute(
+                "SELECT opponent, wins, losses, draws FROM matchups WHERE model = ?", (model,)
+            )
+        }
+        return {"elo": row[0], "games_played": row[1], "total_score": row[2], "matchups": matchups}
+
+    def _write_model(self, conn, model, stats):
+        conn.execute(
+            "INSERT INTO ratings (model, elo, games_played, total_score) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(model) DO UPDATE SET elo = excluded.elo, "
+            "games_played = excluded.games_played, total_score = excluded.total_score",
+            (model, stats["elo"], stats["games_played"], stats["total_score"])
+        )
+        conn.executemany(
+            "INSERT INTO matchups (model, opponent, wins, losses, draws) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(model, opponent) DO UPDATE SET wins = excluded.wins, "
+            "losses = excluded.losses, draws = excluded.draws",
+            [
+                (model, opponent, m["wins"], m["losses"], m["draws"])
+                for opponent, m in stats.get("matchups", {}).items()
+            ]
+        )
+
+    def _add_usage(self, conn, usage):
+        conn.executemany(
+            "INSERT INTO model_usage (model, games, requests, cached, prompt_tokens, completion_tokens, "
+            "cost, latency_sum) VALUES (?, 1, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(model) DO UPDATE SET games = games + 1, "
+            "requests = requests + excluded.requests, cached = cached + excluded.cached, "
+            "prompt_tokens = prompt_tokens + excluded.prompt_tokens, "
+            "completion_tokens = completion_tokens + excluded.completion_tokens, "
+            "cost = cost + excluded.cost, latency_sum = latency_sum + excluded.latency_sum",
+            [
+                (model, u.get("requests", 0), u.get("cached", 0), u.get("prompt_tokens", 0),
+                 u.get("completion_tokens", 0), u.get("cost", 0.0), u.get("latency_sum", 0.0))
+                for model, u in usage.items()
+            ]
+        )
+
+    def _add_to_leaderboard(self, conn, game_results, stats):
+        if not game_results:
+            return
+        best = max(game_results.values())
+        leaders = [model for model, score in game_results.items() if score == best]
+        rows = []
+        for model, score in game_results.items():
+            won = model in leaders and len(leaders) == 1
+            drew = model in leaders and len(leaders) > 1
+            extra = stats.get(model, {})
+            rows.append((model, int(won), int(drew), int(not won and not drew), score,
+                         extra.get("escobas", 0), extra.get("moves", 0), extra.get("errors", 0)))
+        conn.executemany(
+            "INSERT INTO leaderboard (model, games, wins, draws, losses, total_score, escobas, moves, errors) "
+            "VALUES (?, 1, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(model) DO UPDATE SET games = games + 1, wins = wins + excluded.wins, "
+            "draws = draws + excluded.draws, losses = losses + excluded.losses, "
+            "total_score = total_score + excluded.total_score, escobas = escobas + excluded.escobas, "
+            "moves = moves + excluded.moves, errors = errors + excluded.errors",
+            rows
+        )
+
+    def _refresh_top_matchups(self, conn, models):
+        for model in models:
+            top = conn.execute(
+                "SELECT opponent, wins, losses, draws FROM matchups WHERE model = ? "
+                "ORDER BY wins DESC, losses ASC, opponent LIMIT ?", (model, TOP_MATCHUPS)
+            ).fetchall()
+            conn.execute(
+                "INSERT INTO leaderboard (model, top_matchups) VALUES (?, ?) "
+                "ON CONFLICT(model) DO UPDATE SET top_matchups = excluded.top_matchups",
+                (model, json.dumps(top))
+            )
+
+    def _bump_revision(self, conn):
+        conn.execute("UPDATE leaderboard_meta SET revision = revision + 1, updated = ? WHERE id = 1",
+                     (time.time(),))
+
+    def rebuild_leaderboard(self):
+        """
+        Recomputes the materialized leaderboard from the game history and
+        matchups. Escobas, moves and errors are not in the history, so they
+        only count games recorded since the leaderboard existed.
+        """
+        with self._lock:
+            history = self._conn.execute("SELECT results FROM games ORDER BY id").fetchall()
+        with self._transaction() as conn:
+            kept = {
+                model: {"escobas": escobas, "moves": moves, "errors": errors}
+                for model, escobas, moves, errors in conn.execute(
+                    "SELECT model, escobas, moves, errors FROM leaderboard"
+                )
+            }
+            conn.execute("DELETE FROM leaderboard")
+            for (results,) in history:
+                game_results = json.loads(results)
+                if len(game_results) > 1:
+                    self._add_to_leaderboard(conn, game_results, {})
+            conn.executemany(
+                "UPDATE leaderboard SET escobas = ?, moves = ?, errors = ? WHERE model = ?",
+                [(s["escobas"], s["moves"], s["errors"], model) for model, s in kept.items()]
+            )
+            models = [row[0] for row in conn.execute("SELECT model FROM ratings")]
+            self._refresh_top_matchups(conn, models)
+            self._bump_revision(conn)
+
+    def update_rankings(self, game_results, usage=None, stats=None):
         """
         Update ELO ratings based on game results
         game_results: dict with player names as keys and their scores as values
+        usage: optional {model: usage summary} (see telemetry.summarize_usage)
+               added to the per-model token, cost and latency totals
+        stats: optional {model: {"escobas", "moves", "errors"}} (see
+               GameManager.player_stats) for the leaderboard rates
         """
         # Skip games where all players are the same model
         unique_models = set(game_results.keys())
         if len(unique_models) == 1:
             logger.info(f"Skipping ranking update for solo game with {unique_models.pop()}")
+            # Its tokens were still spent.
+            if usage:
+                with self._transaction() as conn:
+                    self._add_usage(conn, usage)
+                    self._bump_revision(conn)
             return
 
-        rankings = self._load_rankings()
-        
-        # Convert game results to list of (player, score) and sort by score
-        sorted_results = sorted(game_results.items(), key=lambda x: x[1], reverse=True)
-        
-        # Update ELO for all player pairs
-        for i, (player_a, score_a) in enumerate(sorted_results):
-            for j, (player_b, score_b) in enumerate(sorted_results):
-                if i >= j or player_a == player_b:
-                    continue
-                
-                # Initialize new players with full stats FIRST
-                if player_a not in rankings:
-                    rankings[player_a] = {
-                        "elo": self.initial_elo,
-                        "games_played": 0,
-                        "total_score": 0,
-                        "matchups": {}
-                    }
-                if player_b not in rankings:
-                    rankings[player_b] = {
-                        "elo": self.initial_elo,
-                        "games_played": 0,
-                        "total_score": 0,
-                        "matchups": {}
-                    }
-                
-                # Get current ratings
-                ra = rankings[player_a]["elo"]
-                rb = rankings[player_b]["elo"]
-                
-                # Calculate expected scores
-                ea = 1 / (1 + 10 ** ((rb - ra) / 400))
-                eb = 1 / (1 + 10 ** ((ra - rb) / 400))
-                
-                # Initialize matchups if needed (now safe to access)
-                rankings[player_a]["matchups"].setdefault(player_b, {"wins": 0, "losses": 0, "draws": 0})
-                rankings[player_b]["matchups"].setdefault(player_a, {"wins": 0, "losses": 0, "draws": 0})
-
-                # Update head-to-head stats
-                if score_a > score_b:
-                    rankings[player_a]["matchups"][player_b]["wins"] += 1
-                    rankings[player_b]["matchups"][player_a]["losses"] += 1
-                elif score_a < score_b:
-                    rankings[player_a]["matchups"][player_b]["losses"] += 1
-                    rankings[player_b]["matchups"][player_a]["wins"] += 1
-                else:
-                    rankings[player_a]["matchups"][player_b]["draws"] += 1
-                    rankings[player_b]["matchups"][player_a]["draws"] += 1
-                
-                # Determine actual scores based on game outcome
-                if score_a > score_b:
-                    sa, sb = 1, 0
-                elif score_a < score_b:
-                    sa, sb = 0, 1
-                else:
-                    sa = sb = 0.5
-                
-                # Update ratings
-                new_ra = ra + self.k_factor * (sa - ea)
-                new_rb = rb + self.k_factor * (sb - eb)
-                
-                # Update games played and scores
-                rankings[player_a]["games_played"] += 1
-                rankings[player_b]["games_played"] += 1
-                rankings[player_a]["total_score"] += score_a
-                rankings[player_b]["total_score"] += score_b
-                
-                # Apply updated ratings
-                rankings[player_a]["elo"] = new_ra
-                rankings[player_b]["elo"] = new_rb
-        
-        self._save_rankings(rankings)
-        
+        with self._transaction() as conn:
+            if usage:
+                self._add_usage(conn, usage)
+            # Only the models in this game are read and written.
+            rankings = {player: self._read_model(conn, player) for player in game_results}
+            apply_elo(rankings, game_results, self.k_factor)
+            for player, model_stats in rankings.items():
+                self._write_model(conn, player, model_stats)
+            conn.execute(
+                "INSERT INTO games (timestamp, results) VALUES (?, ?)",
+                (datetime.now().isoformat(), json.dumps(game_results))
+            )
+            self._add_to_leaderboard(conn, game_results, stats or {})
+            self._refresh_top_matchups(conn, game_results)
+            self._bump_revision(conn)
+
+    def _load_rankings(self):
+        with self._lock:
+            models = [row[0] for row in self._conn.execute("SELECT model FROM ratings")]
+            rankings = {model: self._read_model(self._conn, model) for model in models}
+            usage = self._conn.execute(
+                "SELECT model, games, requests, cached, prompt_tokens, completion_tokens, cost, latency_sum "
+                "FROM model_usage"
+            ).fetchall()
+        for model, *row in usage:
+            if model in rankings:
+                rankings[model]["usage"] = _usage_stats(*row)
+        return rankings
+
     def get_rankings(self):
         """
         Return rankings sorted by ELO rating with matchup data
         """
+        with self._lock:
+            version = self._data_version()
+            if self._cache is not None and self._cache_version == version:
+                return self._cache
         rankings = self._load_rankings()
-        return sorted(rankings.items(), key=lambda x: x[1]["elo"], reverse=True) 
\ No newline at end of file
+        result = sorted(rankings.items(), key=lambda x: x[1]["elo"], reverse=True)
+        with self._lock:
+            self._cache = result
+            self._cache_version = version
+        return result
+
+    def get_leaderboard(self):
+        """
+        The materialized leaderboard: {"revision", "updated" (unix time or
+        None), "models": [(model, stats), ...]} sorted by ELO, where stats
+        has elo, games, wins, draws, losses, win_rate, avg_score,
+        escoba_rate (escobas per game), error_rate (model errors per move),
+        top_matchups ([{"opponent", "wins", "losses", "draws"}], best first)
+        and usage when known.
+        """
+        with self._lock:
+            version = self._data_version()
+            if self._board is not None and self._board_version == version:
+                return self._board
+            revision, updated = self._conn.execute(
+                "SELECT revision, updated FROM leaderboard_meta WHERE id = 1"
+            ).fetchone()
+            rows = self._conn.execute(LEADERBOARD_QUERY).fetchall()
+        models = []
+        for row in rows:
+            model, elo, games_played, games, wins, draws, losses, total, escobas, moves, errors, top = row[:12]
+            games = games or 0
+            stats = {
+                "elo": elo,
+                "games_played": games_played,
+                "games": games,
+                "wins": wins or 0,
+                "draws": draws or 0,
+                "losses": losses or 0,
+                "win_rate": (wins or 0) / games if games else 0.0,
+                "avg_score": (total or 0) / games if games else 0.0,
+                "escoba_rate": (escobas or 0) / games if games else 0.0,
+                "error_rate": (errors or 0) / moves if moves else 0.0,
+                "top_matchups": [
+                    {"opponent": opponent, "wins": w, "losses": l, "draws": d}
+                    for opponent, w, l, d in json.loads(top or "[]")
+                ],
+            }
+            if row[12] is not None:
+                stats["usage"] = _usage_stats(*row[12:])
+            models.append((model, stats))
+        board = {"revision": revision, "updated": updated, "models": models}
+        with self._lock:
+            self._board = board
+            self._board_version = version
+        return board
+
+    def game_history(self):
+        """
+        Yields (timestamp, results) for every recorded game, oldest first.
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT timestamp, results FROM games ORDER BY id").fetchall()
+        for timestamp, results in rows:
+            yield timestamp, json.loads(results)
+
+    def export_json(self, path=None):
+        """
+        Writes the current rankings in the legacy rankings.json format.
+        """
+        path = Path(path or self.rankings_path)
+        with open(path, 'w') as f:
+            json.dump(dict(self.get_rankings()), f, indent=2)
+        return path
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class _Transaction:
+    """
+    BEGIN IMMEDIATE ... COMMIT under the instance lock; takes the sqlite
+    write lock up front so concurrent writers queue instead of failing.
+    """
+    def __init__(self, ranking_system):
+        self.ranking_system = ranking_system
+
+    def __enter__(self):
+        self.ranking_system._lock.acquire()
+        conn = self.ranking_system._conn
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+        except Exception:
+            self.ranking_system._lock.release()
+            raise
+        return conn
+
+    def __exit__(self, exc_type, exc, tb):
+        conn = self.ranking_system._conn
+        try:
+            if exc_type is None:
+                conn.execute("COMMIT")
+            else:
+                conn.execute("ROLLBACK")
+            # Our own commits do not bump data_version on this connection.
+            self.ranking_system._cache = None
+            self.ranking_system._board = None
+        finally:
+            self.ranking_system._lock.release()
+        return False
@@ -0,0 +1,174 @@
+import math
+
+import numpy as np
+
+from rankings import apply_elo
+
+# Bradley-Terry strengths are reported on the familiar ELO scale.
+BASE_RATING = 1000
+ELO_SCALE = 400 / math.log(10)
+
+class BradleyTerryRatings:
+    """
+    Batch Bradley-Terry ratings fitted from the full game history.
+
+    Every game is expanded into the same pairwise outcomes the ELO system
+    uses (each pair of players, draws counting half a win each) and
+    accumulated into a model x model win matrix. fit() then solves for all
+    strengths at once with the MM algorithm (Hunter, 2004), using only
+    vectorized NumPy operations over that matrix, so the result does not
+    depend on game order and there is no K-factor to tune.
+
+    A virtual anchor player with fixed strength 1 plays `prior_games` drawn
+    games against every model, which keeps models with only wins or only
+    losses finite. Ratings are reported relative to the field's average
+    (which sits at BASE_RATING), and confidence intervals come from the
+    inverse Fisher information of the log-strengths, projected onto that
+    same centering.
+
+    Incremental use: keep the instance, add_games() with new results and call
+    fit() again; it warm-starts from the previous solution.
+    """
+    def __init__(self, prior_games=1.0):
+        self.prior_games = prior_games
+        self.models = []
+        self._index = {}
+        self.wins = np.zeros((0, 0))    # decisive pairwise wins, row beat column
+        self.draws = np.zeros((0, 0))   # pairwise draws, symmetric
+        self._strengths = None
+
+    def _model_index(self, model):
+        if model not in self._index:
+            self._index[model] = len(self.models)
+            self.models.append(model)
+        return self._index[model]
+
+    def _grow(self):
+        size = len(self.models)
+        if self.wins.shape[0] < size:
+            old = self.wins.shape[0]
+            for name in ("wins", "draws"):
+                grown = np.zeros((size, size))
+                grown[:old, :old] = getattr(self, name)
+                setattr(self, name, grown)
+            if self._strengths is not None:
+                self._strengths = np.concatenate([self._strengths, np.ones(size - old)])
+
+    def add_games(self, games):
+        """
+        games: iterable of {model: score} dicts, one per game.
+        """
+        winners, losers, draws_a, draws_b = [], [], [], []
+        for results in games:
+            if len(results) < 2:
+                continue
+            items = list(results.items())
+            for i, (model_a, score_a) in enumerate(items):
+                a = self._model_index(model_a)
+                for model_b, score_b in items[i + 1:]:
+                    b = self._model_index(model_b)
+                    if score_a > score_b:
+                        winners.append(a)
+                        losers.append(b)
+                    elif score_a < score_b:
+                        winners.append(b)
+                        losers.append(a)
+                    else:
+                        draws_a.append(a)
+                        draws_b.append(b)
+        self._grow()
+        np.add.at(self.wins, (winners, losers), 1.0)
+        np.add.at(self.draws, (draws_a, draws_b), 1.0)
+        np.add.at(self.draws, (draws_b, draws_a), 1.0)
+        return self
+
+    def add_game(self, results):
+        return self.add_games([results])
+
+    def fit(self, max_iter=10000, tol=1e-10):
+        """
+        Fits strengths and returns the leaderboard (see leaderboard()).
+        """
+        size = len(self.models)
+        if size == 0:
+            return []
+        # Append the anchor as the last row/column.
+        wins = np.zeros((size + 1, size + 1))
+        wins[:size, :size] = self.wins + self.draws / 2
+        wins[:size, size] = self.prior_games / 2
+        wins[size, :size] = self.prior_games / 2
+        games = wins + wins.T
+        total_wins = wins.sum(axis=1)
+
+        strengths = np.ones(size + 1)
+        if self._strengths is not None:
+            strengths[:size] = self._strengths
+        for _ in range(max_iter):
+            denom = (games / (strengths[:, None] + strengths[None, :])).sum(axis=1)
+            updated = total_wins / denom
+            updated[size] = 1.0
+            converged = np.max(np.abs(np.log(updated) - np.log(strengths))) < tol
+            strengths = updated
+            if converged:
+                break
+
+        # Fisher information of the log-strengths, anchor held fixed.
+        pair = games * strengths[:, None] * strengths[None, :] / (strengths[:, None] + strengths[None, :]) ** 2
+        information = np.diag(pair.sum(axis=1)) - pair
+        covariance = np.linalg.inv(information[:size, :size])
+        centering = np.eye(size) - np.full((size, size), 1 / size)
+        covariance = centering @ covariance @ centering
+        log_strengths = np.log(strengths[:size])
+        self._strengths = strengths[:size]
+        self._log_ratings = log_strengths - log_strengths.mean()
+        self._std_errors = np.sqrt(np.clip(np.diag(covariance), 0, None))
+        return self.leaderboard()
+
+    def leaderboard(self, z=1.96):
+        """
+        Rows sorted by rating: model, rating, ci_low, ci_high, games, wins,
+        losses and draws (pairwise, matching the ELO matchup counts).
+        """
+        if self._strengths is None:
+            return []
+        size = len(self._strengths)
+        wins = self.wins[:size, :size].sum(axis=1)
+        losses = self.wins[:size, :size].sum(axis=0)
+        draws = self.draws[:size, :size].sum(axis=1)
+        ratings = BASE_RATING + ELO_SCALE * self._log_ratings
+        margin = z * ELO_SCALE * self._std_errors
+        rows = []
+        for i, model in enumerate(self.models[:size]):
+            rows.append({
+                "model": model,
+                "rating": float(ratings[i]),
+                "ci_low": float(ratings[i] - margin[i]),
+                "ci_high": float(ratings[i] + margin[i]),
+                "games": int(wins[i] + losses[i] + draws[i]),
+                "wins": int(wins[i]),
+                "losses": int(losses[i]),
+                "draws": int(draws[i]),
+            })
+        return sorted(rows, key=lambda row: row["rating"], reverse=True)
+
+    @classmethod
+    def from_ranking_system(cls, ranking_system, prior_games=1.0):
+        ratings = cls(prior_games=prior_games)
+        ratings.add_games(results for _, results in ranking_system.game_history())
+        return ratings
+
+def elo_from_history(ranking_system, k_factor=32, initial_elo=1000):
+    """
+    Replays the stored game history through the sequential ELO update with a
+    different K-factor, without touching the stored rankings.
+    """
+    rankings = {}
+    for _, results in ranking_system.game_history():
+        if len(set(results)) < 2:
+            continue
+        for player in results:
+            rankings.setdefault(player, {
+                "elo": initial_elo, "games_played": 0, "total_score": 0, "matchups": {}
+            })
+        apply_elo(rankings, results, k_factor)
+    return sorted(rankings.items(), key=lambda x: x[1]["elo"], reverse=True)
@@ -0,0 +1,150 @@
+import logging
+import time
+
+from archive import ACTION_CAPTURE
+from game import Card, GameManager, Player, cards_to_mask
+
+ALL_CARDS = (1 << len(Card.ALL)) - 1
+
+class ReplayError(Exception):
+    """
+    Raised when a logged game cannot be re-simulated: it has no seed, or the
+    rebuilt state diverges from what the log says happened.
+    """
+    pass
+
+def _mask(card_ids):
+    mask = 0
+    for card_id in card_ids:
+        mask |= 1 << card_id
+    return mask
+
+# -------------------------------
+# Scripted client
+# -------------------------------
+class ScriptedClient:
+    """
+    Stands in for the LLM client during replay: answers every get_move with
+    the next move from a compact record (see archive.compact_game), after
+    checking that the seat, hand and table match the logged ones.
+    """
+    def __init__(self, record):
+        self.players = record["players"]
+        self.moves = [entry for entry in record["log"] if entry[0] == "m"]
+        self.table = _mask(record["table0"])
+        self.position = 0
+
+    def get_move(self, player, table, usage=None):
+        if self.position >= len(self.moves):
+            raise ReplayError(f"{player.name} asked for move {self.position + 1}, "
+                              f"but the log only has {len(self.moves)}")
+        move = self.moves[self.position]
+        _, seat, hand, played, captured, action = move[:6]
+        extra = move[7] if len(move) > 7 else {}
+        where = f"move {self.position + 1}"
+        if self.players[seat] != player.name:
+            raise ReplayError(f"{where}: expected {self.players[seat]} to play, got {player.name}")
+        if cards_to_mask(player.hand) != _mask(hand):
+            raise ReplayError(f"{where}: {player.name} holds {player.hand}, log says {_mask(hand):#x}")
+        if cards_to_mask(table) != self.table:
+            raise ReplayError(f"{where}: table {table} does not match the log")
+
+        if action == ACTION_CAPTURE:
+            self.table &= ~_mask(captured)
+        else:
+            self.table |= 1 << played
+        self.position += 1
+        capture_strs = [str(Card.from_id(card_id)) for card_id in captured]
+        return str(Card.from_id(played)), capture_strs, extra.get("error", False)
+
+# -------------------------------
+# Replay
+# -------------------------------
+def check_conservation(game):
+    """
+    Every card must be in exactly one place: the deck, a hand, the table or a
+    capture pile. Done on 40-bit masks, so it is cheap enough to run per move.
+    """
+    masks = [cards_to_mask(game.deck.cards), cards_to_mask(game.table)]
+    for player in game.players:
+        masks.append(cards_to_mask(player.hand))
+        masks.append(cards_to_mask(player.captured))
+    seen = 0
+    for mask in masks:
+        if seen & mask:
+            raise ReplayError(f"Cards in two places at once: {seen & mask:#x}")
+        seen |= mask
+    held = len(game.deck.cards) + len(game.table) + sum(
+        len(player.hand) + len(player.captured) for player in game.players
+    )
+    if seen != ALL_CARDS or held != len(Card.ALL):
+        raise ReplayError(f"Card conservation violated: {held} cards held, missing {ALL_CARDS & ~seen:#x}")
+
+def replay_game(record):
+    """
+    Re-simulates one compact archive record from its seed and logged moves,
+    without calling any model. Card conservation is checked after every move
+    and the final scores are recomputed with the current scoring code.
+
+    Returns {"id", "moves", "scores", "logged_scores", "match"}.
+    Raises ReplayError if the record has no seed or the replay diverges.
+    """
+    meta = record.get("meta") or {}
+    seed = meta.get("seed")
+    if seed is None:
+        raise ReplayError(f"Game {record.get('id')} has no seed (logged before game_version 1.1)")
+
+    players = [Player(p["name"], model=p.get("model")) for p in meta.get("players", [])]
+    client = ScriptedClient(record)
+    game = GameManager(players, seed=seed, record_log=False)
+
+    def on_event(entry):
+        if "event" not in entry:
+            check_conservation(game)
+    game.on_event = on_event
+
+    scores = game.play_game(ai_client=client)
+    if client.position != len(client.moves):
+        raise ReplayError(f"Replay ended after {client.position} of {len(client.moves)} logged moves")
+    logged_scores = record.get("scores") or {}
+    return {
+        "id": record.get("id"),
+        "moves": client.position,
+        "scores": scores,
+        "logged_scores": logged_scores,
+        "match": scores == logged_scores,
+    }
+
+def replay_archive(archive, **filters):
+    """
+    Replays every archived game matching filters (see GameArchive.query) and
+    returns a summary plus the per-game results. Games without a seed are
+    counted as skipped; diverging games as failed.
+    """
+    results, failures = [], []
+    skipped = 0
+    previous_disable = logging.root.manager.disable
+    logging.disable(logging.CRITICAL)
+    started = time.perf_counter()
+    try:
+        for record in archive.iter_games(**filters):
+            if (record.get("meta") or {}).get("seed") is None:
+                skipped += 1
+                continue
+            try:
+                results.append(replay_game(record))
+            except ReplayError as ex:
+                failures.append({"id": record.get("id"), "error": str(ex)})
+    finally:
+        logging.disable(previous_disable)
+    elapsed = time.perf_counter() - started
+    return {
+        "replayed": len(results),
+        "skipped": skipped,
+        "failed": len(failures),
+        "score_mismatches": sum(1 for result in results if not result["match"]),
+        "elapsed": elapsed,
+        "games_per_sec": len(results) / elapsed if elapsed else 0.0,
+        "results": results,
+        "failures": failures,
+    }
@@ -0,0 +1,307 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import httpx
+import requests
+
+from config import RATE_LIMIT_RPS, RATE_LIMIT_BURST, MAX_RETRIES
+
+logger = logging.getLogger(__name__)
+
+# Statuses worth retrying: rate limited, request timeout, and server-side failures.
+RETRY_STATUSES = {408, 409, 425, 429, 500, 502, 503, 504}
+# Exceptions of one attempt from the sync (requests) and async (httpx) clients,
+# and the ones worth retrying: connection failures and timeouts.
+REQUEST_ERRORS = (requests.RequestException, httpx.HTTPError, asyncio.TimeoutError)
+RETRY_ERRORS = (requests.ConnectionError, requests.Timeout, httpx.TransportError, asyncio.TimeoutError)
+
+class TransportError(Exception):
+    """
+    The request never produced a usable model answer: connection failures,
+    timeouts, HTTP errors after all retries, or an open circuit. These are
+    counted separately from the model's own (reasoning/format) errors.
+    """
+    pass
+
+class CircuitOpen(TransportError):
+    """
+    Raised without sending anything while a model's circuit breaker is open.
+    """
+    pass
+
+# -------------------------------
+# Token bucket
+# -------------------------------
+class TokenBucket:
+    """
+    Thread-safe token bucket with an adaptive rate: every throttled (429)
+    response halves the rate, every success adds back a small step, up to
+    the configured rate (AIMD).
+    """
+    def __init__(self, rate, burst, min_rate=0.1):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """
+        Takes a token and returns how many seconds the caller must wait
+        before using it (0 when one was available).
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def throttled(self):
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+
+    def succeeded(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+# -------------------------------
+# Circuit breaker
+# -------------------------------
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive transport failures; while open,
+    requests fail fast. After reset_timeout one trial request is let through
+    (half-open): success closes the circuit, failure opens it again.
+    """
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self.trial_running:
+                self.trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.trial_running = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+# -------------------------------
+# Scheduler
+# -------------------------------
+def retry_after_seconds(response):
+    """
+    Parses a Retry-After header (delta seconds or an HTTP date); None if absent.
+    """
+    value = response.headers.get("Retry-After") if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class RequestScheduler:
+    """
+    Per-model request scheduling shared by every game using one client:
+    an optional token bucket rate limit (rate <= 0 disables it), jittered
+    exponential backoff on retryable failures (honouring Retry-After), and a
+    circuit breaker.
+
+    send() / send_async() take a zero-argument function performing one HTTP
+    attempt and return its successful response, or raise TransportError once
+    retries are exhausted. A 2xx response can still carry a provider error,
+    so the caller reports the outcome to the breaker with record_success()
+    or record_failure() once it has read the body.
+    """
+    def __init__(self, rate=RATE_LIMIT_RPS, burst=RATE_LIMIT_BURST, max_retries=MAX_RETRIES,
+                 base_delay=0.5, max_delay=30.0, failure_threshold=5, reset_timeout=30.0, rng=None):
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        # Separate from the game RNG, so retries never change a seeded game.
+        self.rng = rng or random.Random()
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def _model(self, model):
+        with self._lock:
+            if model not in self._models:
+                self._models[model] = {
+                    "bucket": TokenBucket(self.rate, self.burst) if self.rate > 0 else None,
+                    "breaker": CircuitBreaker(self.failure_threshold, self.reset_timeout),
+                    "stats": {"requests": 0, "retries": 0, "throttled": 0,
+                              "transport_failures": 0, "rejected": 0},
+                }
+            return self._models[model]
+
+    def _count(self, state, key):
+        with self._lock:
+            state["stats"][key] += 1
+
+    def backoff(self, attempt, retry_after=None):
+        # Full jitter: uniform in [0, base * 2^attempt], capped; Retry-After is a floor.
+        delay = self.rng.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay))
+        return delay
+
+    def before_attempt(self, model):
+        """
+        Returns the rate-limit wait before the next attempt; raises CircuitOpen
+        if the model's circuit is open.
+        """
+        state = self._model(model)
+        if not state["breaker"].allow():
+            self._count(state, "rejected")
+            raise CircuitOpen(f"Circuit open for {model}")
+        self._count(state, "requests")
+        return state["bucket"].reserve() if state["bucket"] is not None else 0.0
+
+    def after_attempt(self, model, attempt, response=None, error=None):
+        """
+        Classifies one attempt. Returns None when the response is usable, or
+        the delay before retrying; raises TransportError when out of retries
+        or the failure is not retryable.
+        """
+        state = self._model(model)
+        if error is None and response.status_code < 400:
+            # The breaker waits for the caller's verdict on the body (record_success/record_failure).
+            if state["bucket"] is not None:
+                state["bucket"].succeeded()
+            return None
+
+        if error is not None:
+            retryable = isinstance(error, RETRY_ERRORS)
+            reason = f"{type(error).__name__}: {error}"
+        else:
+            retryable = response.status_code in RETRY_STATUSES
+            reason = f"HTTP {response.status_code}"
+            if response.status_code == 429:
+                self._count(state, "throttled")
+                if state["bucket"] is not None:
+                    state["bucket"].throttled()
+
+        state["breaker"].record_failure()
+        if not retryable or attempt >= self.max_retries:
+            self._count(state, "transport_failures")
+            raise TransportError(f"{model}: {reason} after {attempt + 1} attempt(s)") from error
+        self._count(state, "retries")
+        delay = self.backoff(attempt, retry_after_seconds(response))
+        logger.warning("%s: %s, retrying in %.1fs (attempt %d)", model, reason, delay, attempt + 1)
+        return delay
+
+    def record_success(self, model):
+        """
+        The response returned by send() held a usable answer.
+        """
+        self._model(model)["breaker"].record_success()
+
+    def record_failure(self, model):
+        """
+        The response returned by send() was a provider error in disguise
+        (e.g. an error payload with status 200).
+        """
+        state = self._model(model)
+        state["breaker"].record_failure()
+        self._count(state, "transport_failures")
+
+    def send(self, model, attempt_fn):
+        attempt = 0
+        while True:
+            wait = self.before_attempt(model)
+            if wait:
+                time.sleep(wait)
+            response, error = None, None
+            try:
+                response = attempt_fn()
+            except REQUEST_ERRORS as ex:
+                error = ex
+            delay = self.after_attempt(model, attempt, response, error)
+            if delay is None:
+                return response
+            time.sleep(delay)
+            attempt += 1
+
+    async def send_async(self, model, attempt_fn):
+        """
+        Same as send, but attempt_fn returns an awaitable and waits are
+        asyncio.sleep, so the event loop keeps running other games.
+        """
+        attempt = 0
+        while True:
+            wait = self.before_attempt(model)
+            if wait:
+                await asyncio.sleep(wait)
+            response, error = None, None
+            try:
+                response = await attempt_fn()
+            except REQUEST_ERRORS as ex:
+                error = ex
+            delay = self.after_attempt(model, attempt, response, error)
+            if delay is None:
+                return response
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                model: dict(state["stats"], circuit=state["breaker"].state,
+                            rate=state["bucket"].rate if state["bucket"] is not None else None)
+                for model, state in self._models.items()
+            }
+
+    def __getstate__(self):
+        # Process-pool workers get a fresh scheduler with the same settings.
+        state = self.__dict__.copy()
+        del state["_lock"]
+        state["_models"] = {}
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
@@ -0,0 +1,120 @@
+import numpy as np
+
+from cards import Card
+
+# Scoring works on 40-bit captured-pile masks (bit i = Card.id i, see
+# game.cards_to_mask). Card.id is suit_index * 10 + rank_index, so each suit
+# occupies 10 consecutive bits.
+SUIT_BITS = 10
+SUIT_MASK = (1 << SUIT_BITS) - 1
+COINS_SHIFT = Card.SUITS.index("Coins") * SUIT_BITS
+SEVEN_OF_COINS = 1 << Card("Coins", "7").id
+SEVENS = sum(1 << card.id for card in Card.ALL if card.rank == "7")
+
+# Primera points per rank, in Card.PRIME_ORDER order (7 best, figures worst).
+PRIME_POINTS = [21, 18, 16, 15, 14, 13, 12, 10, 10, 10]
+RANK_PRIME_POINTS = [PRIME_POINTS[Card.PRIME_ORDER.index(rank)] for rank in Card.RANKS]
+
+def _best_prime(suit_bits):
+    return max((RANK_PRIME_POINTS[i] for i in range(SUIT_BITS) if suit_bits >> i & 1), default=0)
+
+# Best primera points for every possible set of ranks within one suit.
+PRIME_TABLE = [_best_prime(bits) for bits in range(1 << SUIT_BITS)]
+PRIME_TABLE_NP = np.array(PRIME_TABLE, dtype=np.int32)
+
+CATEGORIES = ("cartas", "oros", "siete_de_oros", "sietes", "primera", "escobas")
+
+def primera_points(mask):
+    """
+    Sum of the best card per suit, or 0 unless the pile holds all four suits.
+    """
+    table = PRIME_TABLE
+    coins, cups = table[mask & SUIT_MASK], table[mask >> 10 & SUIT_MASK]
+    batons, swords = table[mask >> 20 & SUIT_MASK], table[mask >> 30 & SUIT_MASK]
+    if coins and cups and batons and swords:
+        return coins + cups + batons + swords
+    return 0
+
+def _leaders(values):
+    # Everyone tied for the most scores, as long as they have any at all.
+    best = max(values)
+    return [int(best > 0 and value == best) for value in values]
+
+def _category_points(captured_masks, escobas):
+    # Per-category point lists, in CATEGORIES order.
+    return (
+        _leaders([mask.bit_count() for mask in captured_masks]),
+        _leaders([(mask >> COINS_SHIFT & SUIT_MASK).bit_count() for mask in captured_masks]),
+        [int(bool(mask & SEVEN_OF_COINS)) for mask in captured_masks],
+        _leaders([(mask & SEVENS).bit_count() for mask in captured_masks]),
+        _leaders([primera_points(mask) for mask in captured_masks]),
+        list(escobas),
+    )
+
+def score_breakdown(captured_masks, escobas):
+    """
+    Full Escoba scoring for one game.
+
+    captured_masks: one 40-bit captured-pile mask per player.
+    escobas: escoba count per player.
+    Returns one {category: points} dict per player:
+     - cartas: 1 point for most cards captured
+     - oros: 1 point for most Coins
+     - siete_de_oros: 1 point for the 7 of Coins
+     - sietes: 1 point for most sevens
+     - primera: 1 point for the best primera (best card per suit by
+       Card.PRIME_ORDER; a player needs all four suits to compete)
+     - escobas: 1 point per escoba
+    Ties share the point, matching how cartas and oros have always been scored.
+    """
+    columns = _category_points(captured_masks, escobas)
+    return [dict(zip(CATEGORIES, points)) for points in zip(*columns)]
+
+def score_game(captured_masks, escobas):
+    """
+    Total points per player for one game (see score_breakdown).
+    """
+    return [sum(points) for points in zip(*_category_points(captured_masks, escobas))]
+
+# -------------------------------
+# Batch scoring
+# -------------------------------
+def _popcount(masks):
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(masks).astype(np.int32)
+    # NumPy < 2.0: fold the bytes through a 256-entry table.
+    table = np.array([bin(i).count("1") for i in range(256)], dtype=np.int32)
+    return table[np.ascontiguousarray(masks).view(np.uint8)].reshape(masks.shape + (8,)).sum(axis=-1)
+
+def _batch_leaders(values):
+    best = values.max(axis=1, keepdims=True)
+    return ((values == best) & (best > 0)).astype(np.int32)
+
+def score_batch(captured_masks, escobas, breakdown=False):
+    """
+    Scores many games at once.
+
+    captured_masks: (games, players) array of 40-bit captured masks; pad games
+    with fewer players with 0 masks and 0 escobas, which never score.
+    escobas: (games, players) escoba counts.
+    Returns a (games, players) int array of totals, or a dict of per-category
+    arrays (see CATEGORIES) when breakdown is set.
+    """
+    masks = np.asarray(captured_masks, dtype=np.uint64)
+    escobas = np.asarray(escobas, dtype=np.int32)
+
+    suits = [(masks >> np.uint64(suit * SUIT_BITS)) & np.uint64(SUIT_MASK) for suit in range(len(Card.SUITS))]
+    best = np.stack([PRIME_TABLE_NP[bits.astype(np.intp)] for bits in suits])
+    primera = np.where((best > 0).all(axis=0), best.sum(axis=0), 0)
+
+    points = {
+        "cartas": _batch_leaders(_popcount(masks)),
+        "oros": _batch_leaders(_popcount(suits[COINS_SHIFT // SUIT_BITS])),
+        "siete_de_oros": ((masks & np.uint64(SEVEN_OF_COINS)) != 0).astype(np.int32),
+        "sietes": _batch_leaders(_popcount(masks & np.uint64(SEVENS))),
+        "primera": _batch_leaders(primera),
+        "escobas": escobas,
+    }
+    if breakdown:
+        return points
+    return sum(points[category] for category in CATEGORIES)
@@ -0,0 +1,135 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from bots import legal_moves, move_value
+from cards import cards_to_mask
+from telemetry import merge_usage, total_tokens
+
+logger = logging.getLogger(__name__)
+
+def likely_tables(hand, table_cards, width=3):
+    """
+    The `width` most likely tables after a player with `hand` moves, best
+    guess first. Moves are ranked by their immediate value (see
+    bots.move_value), so available captures come first, then the drops.
+    """
+    moves = sorted(legal_moves(hand, table_cards),
+                   key=lambda move: move_value(move[0], move[1], move[2], table_cards), reverse=True)
+    tables, seen = [], set()
+    for card, capture, _ in moves:
+        if capture:
+            table = [c for c in table_cards if c not in capture]
+        else:
+            table = table_cards + [card]
+        mask = cards_to_mask(table)
+        if mask not in seen:
+            seen.add(mask)
+            tables.append(table)
+            if len(tables) == width:
+                break
+    return tables
+
+class _Snapshot:
+    """
+    What a speculative request sees of the next player: their hand is frozen
+    and there is no game RNG, so a speculative fallback move can never
+    consume random numbers from the real game.
+    """
+    def __init__(self, player):
+        self.name = player.name
+        self.model = player.model
+        self.hand = list(player.hand)
+        self.rng = None
+
+class SpeculativeClient:
+    """
+    Opt-in pipelining wrapper around a (sync) LLMClient.
+
+    Before each move GameManager calls prefetch(), and while the current
+    player's request is in flight this client asks the model about the next
+    player's position on the `width` most likely tables (see likely_tables).
+    When that player's turn comes, an answer for the real table is used
+    as-is (a hit). Other answers are discarded, but their tokens still count
+    as extra spend. Answers that came back as errors are never used, so the
+    real request is made and the game's error handling and RNG behave as if
+    there had been no speculation.
+    """
+    def __init__(self, client, width=3, workers=None):
+        self.client = client
+        self.width = width
+        self._executor = ThreadPoolExecutor(max_workers=workers or 2 * width,
+                                            thread_name_prefix="speculation")
+        self._pending = {}  # id(player) -> {(hand mask, table mask): (future, usage)}
+        self._lock = threading.Lock()
+        self.stats = {"turns": 0, "speculated_turns": 0, "hits": 0, "requests": 0,
+                      "extra_requests": 0, "extra_tokens": 0}
+
+    def __getattr__(self, name):
+        # Everything else (model_name, cache, scheduler, ...) is the wrapped client's.
+        return getattr(self.client, name)
+
+    def prefetch(self, game, player):
+        next_player = game.next_player(player)
+        if next_player is None or next_player.strategy is not None:
+            return
+        snapshot = _Snapshot(next_player)
+        hand_mask = cards_to_mask(next_player.hand)
+        pending = self._pending.setdefault(id(next_player), {})
+        for table in likely_tables(player.hand, game.table, self.width):
+            key = (hand_mask, cards_to_mask(table))
+            if key in pending:
+                continue
+            usage = {}
+            pending[key] = (self._executor.submit(self.client.get_move, snapshot, table, usage), usage)
+            with self._lock:
+                self.stats["requests"] += 1
+
+    def get_move(self, player, table_cards, usage=None, legal=None):
+        pending = self._pending.pop(id(player), {})
+        key = (cards_to_mask(player.hand), cards_to_mask(table_cards))
+        hit = pending.pop(key, None)
+        with self._lock:
+            self.stats["turns"] += 1
+            if pending or hit:
+                self.stats["speculated_turns"] += 1
+        for future, spent in pending.values():
+            self._discard(future, spent)
+
+        if hit is not None:
+            future, spent = hit
+            result = future.result()
+            if not result[2]:
+                with self._lock:
+                    self.stats["hits"] += 1
+                if usage is not None:
+                    merge_usage(usage, spent)
+                return result
+            self._discard(future, spent)
+        return self.client.get_move(player, table_cards, usage=usage, legal=legal)
+
+    def _discard(self, future, usage):
+        # Requests that never started cost nothing; the rest are counted once they finish.
+        if future.cancel():
+            with self._lock:
+                self.stats["requests"] -= 1
+            return
+
+        def count(_):
+            with self._lock:
+                self.stats["extra_requests"] += 1
+                self.stats["extra_tokens"] += total_tokens(usage)
+        future.add_done_callback(count)
+
+    def speculation_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        stats["hit_rate"] = stats["hits"] / stats["speculated_turns"] if stats["speculated_turns"] else 0.0
+        return stats
+
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        for pending in self._pending.values():
+            for future, usage in pending.values():
+                self._discard(future, usage)
+        self._pending.clear()
@@ -41,6 +41,82 @@ $(document).ready(function(){
     
     $("#num-players").trigger("change");
 
+    function formatEvent(event){
+        let line = "";
+        if(event.event){ 
+            line += `Event: ${event.event}`;
+            if(event.player) line += ` by ${event.player}`;
+            if(event.cards) line += ` | Cards: ${event.cards.join(", ")}`;
+            if(event.collected) line += ` | Cards: ${event.collected.join(", ")}`;
+            if(event.scores) {
+                line += "\nFinal Scores:";
+                for(const [player, score] of Object.entries(event.scores)) {
+                    line += `\n  ${player}: ${score}`;
+                }
+            }
+        } else if(event.player && event.action){
+            line += `${event.player}: ${event.action}`;
+            if(event.played_card) line += ` (Played: ${event.played_card})`;
+            if(event.error) line += ` [Error: ${event.error}]`;
+        }
+        return line + "\n";
+    }
+
+    function appendLog(text){
+        const log = $("#log-messages");
+        log.append(document.createTextNode(text));
+        log.scrollTop(log[0].scrollHeight);
+    }
+
+    function finishGame(){
+        clearInterval(timerInterval);
+        $("#timer").hide();
+        $("#start-btn").prop("disabled", false);
+    }
+
+    // Follow a game's events as they happen. EventSource reconnects on its
+    // own and resumes from the last event id it received.
+    function followJob(jobId){
+        const source = new EventSource("/jobs/" + jobId + "/events");
+        const onGameEvent = function(message){
+            appendLog(formatEvent(JSON.parse(message.data)));
+        };
+        ["move", "immediate_capture", "finalize_round", "early_termination", "final_scores"].forEach(function(kind){
+            source.addEventListener(kind, onGameEvent);
+        });
+        source.addEventListener("status", function(message){
+            if(JSON.parse(message.data).status === "running") appendLog("Game started\n\n");
+        });
+        source.addEventListener("done", function(message){
+            const result = JSON.parse(message.data);
+            appendLog(`\nLog saved to ${result.log_file}\n`);
+            source.close();
+            localStorage.removeItem("escobaJobId");
+            finishGame();
+        });
+        source.addEventListener("failed", function(message){
+            appendLog(`Error running game simulation: ${JSON.parse(message.data).error}\n`);
+            source.close();
+            localStorage.removeItem("escobaJobId");
+            finishGame();
+        });
+        source.onerror = function(){
+            if(source.readyState === EventSource.CLOSED){
+                // The job is gone (e.g. server restarted); stop retrying.
+                localStorage.removeItem("escobaJobId");
+                finishGame();
+            }
+        };
+    }
+
+    // Reattach to a game that was still running when the page was left.
+    const pendingJob = localStorage.getItem("escobaJobId");
+    if(pendingJob){
+        $("#start-btn").prop("disabled", true);
+        $("#log-messages").text("=== Game Log ===\n\n");
+        followJob(pendingJob);
+    }
+
     $("#start-btn").click(function(){
         $(this).prop("disabled", true);
         $("#log-messages").empty();
@@ -76,38 +152,17 @@ $(document).ready(function(){
                 "models": models
             }),
             success: function(data){
-                clearInterval(timerInterval);
-                $("#timer").hide();
-                
-                // Format and display the complete game log
-                let logOutput = "=== Game Log ===\n\n";
-                data.game_log.forEach(event => {
-                    if(event.event){ 
-                        logOutput += `Event: ${event.event}`;
-                        if(event.player) logOutput += ` by ${event.player}`;
-                        if(event.cards) logOutput += ` | Cards: ${event.cards.join(", ")}`;
-                        if(event.scores) {
-                            logOutput += "\nFinal Scores:";
-                            for(const [player, score] of Object.entries(event.scores)) {
-                                logOutput += `\n  ${player}: ${score}`;
-                            }
-                        }
-                    } else if(event.player && event.action){
-                        logOutput += `${event.player}: ${event.action}`;
-                        if(event.played_card) logOutput += ` (Played: ${event.played_card})`;
-                        if(event.error) logOutput += ` [Error: ${event.error}]`;
-                    }
-                    logOutput += "\n";
-                });
-                
-                $("#log-messages").text(logOutput);
-                $("#start-btn").prop("disabled", false);
+                localStorage.setItem("escobaJobId", data.job_id);
+                $("#log-messages").text("=== Game Log ===\n\nWaiting for a free worker...\n");
+                followJob(data.job_id);
             },
-            error: function(){
-                clearInterval(timerInterval);
-                $("#timer").hide();
-                $("#log-messages").append("Error running game simulation");
-                $("#start-btn").prop("disabled", false);
+            error: function(xhr){
+                finishGame();
+                if(xhr.status === 503){
+                    $("#log-messages").append("Server is busy, too many games queued. Try again shortly.");
+                } else {
+                    $("#log-messages").append("Error running game simulation");
+                }
             }
         });
     });
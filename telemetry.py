@@ -0,0 +1,72 @@
+import math
+from collections import defaultdict
+
+# Per-player LLM usage. A usage dict accumulates, over one game:
+#   requests, cached (answers served by MoveCache), prompt_tokens,
+#   completion_tokens, cost (USD, as reported by OpenRouter) and the
+#   latency of every request in seconds.
+USAGE_KEYS = ("prompt_tokens", "completion_tokens")
+COUNTER_KEYS = ("requests", "cached") + USAGE_KEYS + ("cost",)
+
+def new_usage():
+    return {"requests": 0, "cached": 0, "prompt_tokens": 0, "completion_tokens": 0,
+            "cost": 0.0, "latencies": []}
+
+def add_usage(usage, response_data):
+    """
+    Adds a completion response's token counts and cost to the usage dict in place.
+    """
+    reported = response_data.get("usage") or {}
+    for key in USAGE_KEYS:
+        usage[key] = usage.get(key, 0) + (reported.get(key) or 0)
+    usage["cost"] = usage.get("cost", 0.0) + (reported.get("cost") or 0.0)
+
+def record_request(usage, latency):
+    usage["requests"] = usage.get("requests", 0) + 1
+    usage.setdefault("latencies", []).append(latency)
+
+def merge_usage(into, usage):
+    for key in COUNTER_KEYS:
+        into[key] = into.get(key, 0) + usage.get(key, 0)
+    into.setdefault("latencies", []).extend(usage.get("latencies", ()))
+    return into
+
+def total_tokens(usage):
+    return sum(usage.get(key, 0) for key in USAGE_KEYS)
+
+def percentile(values, q):
+    """
+    Nearest-rank percentile (q in 0..100) of an unsorted list; None if empty.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(q / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+def summarize_usage(usage):
+    """
+    Totals plus latency percentiles, in the form stored in game metadata.
+    """
+    latencies = usage.get("latencies", [])
+    summary = {key: usage.get(key, 0) for key in COUNTER_KEYS}
+    summary["total_tokens"] = total_tokens(usage)
+    summary["latency_sum"] = sum(latencies)
+    summary["latency_mean"] = summary["latency_sum"] / len(latencies) if latencies else None
+    for q in (50, 90, 99):
+        summary[f"latency_p{q}"] = percentile(latencies, q)
+    return summary
+
+def usage_by_model(players):
+    """
+    Merges the raw usage of every LLM player (those without a local
+    strategy), keyed by model.
+    """
+    merged = defaultdict(new_usage)
+    for player in players:
+        if player.strategy is None:
+            merge_usage(merged[player.model], player.usage)
+    return dict(merged)
+
+def summarize_by_model(players):
+    return {model: summarize_usage(usage) for model, usage in usage_by_model(players).items()}
@@ -0,0 +1,400 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from itertools import combinations, cycle, islice, permutations
+
+from batching import BatchingClient
+from bots import is_bot, make_strategy
+from checkpoint import GameCheckpoint
+from game import GameManager, Player
+from instrumentation import Instrumentation
+from llm_client import LLMClient, AsyncLLMClient
+from scheduler import RequestScheduler
+from speculation import SpeculativeClient
+from telemetry import merge_usage, new_usage, summarize_usage, usage_by_model
+from utils import save_game_log
+
+logger = logging.getLogger(__name__)
+
+SCHEDULES = ("round-robin", "all-pairs")
+
+# -------------------------------
+# Scheduling
+# -------------------------------
+def build_schedule(models, num_games, players_per_game=2, schedule="round-robin"):
+    """
+    Returns the list of seatings (tuples of model names) to play.
+
+    round-robin: num_games games in total, cycling through every combination
+                 of players_per_game distinct models.
+    all-pairs:   every ordered seating of players_per_game distinct models is
+                 played num_games times, so each model gets every seat/dealer slot.
+    """
+    if schedule not in SCHEDULES:
+        raise ValueError(f"Unknown schedule '{schedule}', expected one of {SCHEDULES}")
+    if len(models) < players_per_game:
+        raise ValueError(f"Need at least {players_per_game} models, got {len(models)}")
+
+    if schedule == "round-robin":
+        pairings = list(combinations(models, players_per_game))
+        return list(islice(cycle(pairings), num_games))
+
+    pairings = list(permutations(models, players_per_game))
+    return [seating for seating in pairings for _ in range(num_games)]
+
+# -------------------------------
+# Worker
+# -------------------------------
+def new_game(models, api_key, instrumentation=None, checkpoint=None):
+    """
+    A fresh game for the seating, or the game saved in `checkpoint` (a
+    GameCheckpoint) if there is one, continued from its last turn.
+    """
+    players = [
+        Player(model, api_key=api_key, model=model,
+               strategy=make_strategy(model) if is_bot(model) else None)
+        for model in models
+    ]
+    state = checkpoint.load() if checkpoint is not None else None
+    if state is not None:
+        logger.info("Resuming game from %s after %d turns", checkpoint.path, state["turns_played"])
+        return GameManager.restore(state, players, instrumentation=instrumentation, checkpoint=checkpoint)
+    return GameManager(players, instrumentation=instrumentation, checkpoint=checkpoint)
+
+def play_single_game(game_index, models, api_key, cache=None, archive=None, scheduler=None, speculate=0,
+                     client_options=None, instrumentation=None, ai_client=None, checkpoint=None):
+    """
+    Plays one game with its own Players, GameManager and Deck.
+    Runs inside a pool worker, so it only returns plain data.
+    speculate > 0 prefetches that many likely positions for the next player;
+    client_options are extra LLMClient arguments (compact, cache_prompt, legal_moves).
+    ai_client, if given, is a client shared between games (thread pool
+    only, e.g. a BatchingClient) and replaces the per-game LLMClient.
+    checkpoint is a path to save the game to after every turn; a game
+    already saved there is resumed.
+    """
+    metrics = (instrumentation or Instrumentation()).for_game(game_index)
+    game_manager = new_game(models, api_key, metrics, GameCheckpoint(checkpoint) if checkpoint else None)
+    if ai_client is None:
+        ai_client = LLMClient(api_key=api_key, cache=cache, scheduler=scheduler, **(client_options or {}))
+    game_manager.metadata["client"] = ai_client.settings()
+    if speculate:
+        ai_client = SpeculativeClient(ai_client, width=speculate)
+    started = time.perf_counter()
+    error = None
+    try:
+        final_scores = game_manager.play_game(ai_client=ai_client)
+    except Exception as ex:
+        logger.error(f"Game {game_index} failed: {ex}")
+        error = str(ex)
+        final_scores = game_manager.calculate_scores()
+    finally:
+        if speculate:
+            ai_client.close()
+    result = game_result(game_index, models, game_manager, final_scores, error, started, archive)
+    result["metrics"] = metrics.snapshot()
+    if speculate:
+        result["speculation"] = ai_client.speculation_stats()
+    return result
+
+async def play_single_game_async(game_index, models, api_key, ai_client, archive=None, checkpoint=None,
+                                 instrumentation=None):
+    """
+    Async counterpart of play_single_game sharing one AsyncLLMClient.
+    """
+    metrics = (instrumentation or Instrumentation()).for_game(game_index)
+    game_manager = new_game(models, api_key, metrics, GameCheckpoint(checkpoint) if checkpoint else None)
+    game_manager.metadata["client"] = ai_client.settings()
+    started = time.perf_counter()
+    error = None
+    try:
+        final_scores = await game_manager.play_game_async(ai_client=ai_client)
+    except Exception as ex:
+        logger.error(f"Game {game_index} failed: {ex}")
+        error = str(ex)
+        final_scores = game_manager.calculate_scores()
+    result = game_result(game_index, models, game_manager, final_scores, error, started, archive)
+    result["metrics"] = metrics.snapshot()
+    return result
+
+def game_result(game_index, models, game_manager, final_scores, error, started, archive=None):
+    # Bulk runs go to the compact archive; per-game JSON files only without one.
+    game_id, log_file = None, None
+    if archive is not None:
+        game_id = archive.add_game(game_manager.game_log, metadata=game_manager.metadata)
+    else:
+        log_file = save_game_log(
+            game_manager.game_log,
+            metadata=game_manager.metadata,
+            suffix=f"{game_index:04d}",
+        )
+    transport_errors = defaultdict(int)
+    for player in game_manager.players:
+        transport_errors[player.model] += player.transport_errors
+    return {
+        "index": game_index,
+        "models": list(models),
+        "scores": final_scores,
+        "early_loser": game_manager.early_loser,
+        "transport_errors": dict(transport_errors),
+        "usage": usage_by_model(game_manager.players),
+        "stats": game_manager.player_stats(),
+        "error": error,
+        "duration": time.perf_counter() - started,
+        "log_file": log_file,
+        "game_id": game_id,
+    }
+
+# -------------------------------
+# Tournament
+# -------------------------------
+class Tournament:
+    """
+    Runs many games concurrently and merges their results.
+
+    Games run in a thread pool by default (they spend nearly all of their time
+    waiting on HTTP); use_processes=True switches to a process pool and
+    use_async=True drives every game from one event loop with a shared
+    AsyncLLMClient. Ranking
+    updates are applied from the coordinating thread as games complete, so the
+    rankings file is never written by two workers at once.
+
+    Every game shares one RequestScheduler, so per-model rate limits and
+    circuit breakers apply across the whole run (per worker process with
+    use_processes).
+
+    speculate > 0 turns on speculative prefetching of the next player's move
+    (see speculation.py) in the thread and process pools. client_options
+    are passed on to the LLM client (compact=True, cache_prompt=True,
+    legal_moves="list").
+    batch > 1 shares one BatchingClient between the thread pool's games, so
+    moves for the same model asked within batch_window seconds go out as
+    one request of up to `batch` positions.
+    Each game's phase timings and counters are merged into `instrumentation`.
+
+    checkpoint (a checkpoint.TournamentCheckpoint) saves every game after
+    each turn and every finished result. Running again with the same
+    checkpoint skips the finished games and resumes those that were in flight.
+    """
+    def __init__(self, models, api_key, num_games=1, players_per_game=2,
+                 schedule="round-robin", concurrency=4, use_processes=False,
+                 use_async=False, ranking_system=None, cache=None, archive=None, speculate=0,
+                 client_options=None, instrumentation=None, batch=0, batch_window=0.05, checkpoint=None,
+                 settings=None):
+        self.models = list(models)
+        self.api_key = api_key
+        self.concurrency = max(1, concurrency)
+        self.use_processes = use_processes
+        self.use_async = use_async
+        self.ranking_system = ranking_system
+        self.cache = cache
+        self.archive = archive
+        self.scheduler = RequestScheduler()
+        self.speculate = speculate
+        self.client_options = dict(client_options or {})
+        self.instrumentation = instrumentation or Instrumentation()
+        if speculate and use_async:
+            logger.warning("Speculative prefetch is not supported with --async; ignoring it")
+            self.speculate = 0
+        self.batcher = None
+        if batch > 1:
+            if use_async or use_processes:
+                logger.warning("Request batching needs the thread pool; ignoring it")
+            else:
+                if self.speculate:
+                    logger.warning("Speculative prefetch is not supported with batching; ignoring it")
+                    self.speculate = 0
+                self.batcher = BatchingClient(
+                    LLMClient(api_key=api_key, pool_size=self.concurrency, cache=cache,
+                              scheduler=self.scheduler, **self.client_options),
+                    window=batch_window, max_batch=batch)
+        self.schedule = build_schedule(self.models, num_games, players_per_game, schedule)
+        self.results = []
+        self.checkpoint = checkpoint
+        self.finished = {}
+        if checkpoint is not None:
+            # Games finished before a restart count towards the summary but
+            # are already in the rankings and the archive.
+            self.finished = checkpoint.start(self.schedule, settings)
+            for result in self.finished.values():
+                self.results.append(result)
+                if result.get("metrics"):
+                    self.instrumentation.merge(result["metrics"])
+
+    def pending(self):
+        return [(index, seating) for index, seating in enumerate(self.schedule) if index not in self.finished]
+
+    def game_checkpoint(self, index, seating):
+        # Bot-only games cost nothing to replay, so only games with an LLM seat are saved turn by turn.
+        if self.checkpoint is None or all(is_bot(model) for model in seating):
+            return None
+        return self.checkpoint.game_path(index)
+
+    def run(self, on_result=None):
+        """
+        Plays every scheduled game and returns the combined summary.
+        on_result, if given, is called with each game's result as it completes.
+        """
+        if self.use_async:
+            return asyncio.run(self.run_async(on_result))
+
+        executor_cls = ProcessPoolExecutor if self.use_processes else ThreadPoolExecutor
+        started = time.perf_counter()
+        with executor_cls(max_workers=self.concurrency) as executor:
+            futures = [
+                executor.submit(play_single_game, index, seating, self.api_key, self.cache, self.archive,
+                                self.scheduler, self.speculate, self.client_options, self.instrumentation,
+                                self.batcher, self.game_checkpoint(index, seating))
+                for index, seating in self.pending()
+            ]
+            for future in as_completed(futures):
+                self.record(future.result(), on_result)
+        self.results.sort(key=lambda r: r["index"])
+        return self.summary(time.perf_counter() - started)
+
+    async def run_async(self, on_result=None):
+        """
+        Plays every scheduled game on the current event loop, with at most
+        `concurrency` games in flight.
+        """
+        ai_client = AsyncLLMClient(api_key=self.api_key, max_connections=self.concurrency,
+                                   cache=self.cache, scheduler=self.scheduler,
+                                   models=[model for model in self.models if not is_bot(model)],
+                                   **self.client_options)
+        limit = asyncio.Semaphore(self.concurrency)
+        started = time.perf_counter()
+
+        async def bounded(index, seating):
+            async with limit:
+                return await play_single_game_async(index, seating, self.api_key, ai_client, self.archive,
+                                                    self.game_checkpoint(index, seating), self.instrumentation)
+
+        try:
+            tasks = [bounded(index, seating) for index, seating in self.pending()]
+            for next_result in asyncio.as_completed(tasks):
+                self.record(await next_result, on_result)
+        finally:
+            await ai_client.aclose()
+        self.results.sort(key=lambda r: r["index"])
+        return self.summary(time.perf_counter() - started)
+
+    def record(self, result, on_result=None):
+        self.results.append(result)
+        if result.get("metrics"):
+            self.instrumentation.merge(result["metrics"])
+        if self.ranking_system is not None:
+            self.ranking_system.update_rankings({
+                model: result["scores"].get(model, 0) for model in result["models"]
+            }, usage={model: summarize_usage(usage) for model, usage in result.get("usage", {}).items()},
+                stats=result.get("stats"))
+        # Only after the rankings: once recorded, resume skips the game, so a
+        # crash in between must not leave a finished game without its update.
+        if self.checkpoint is not None:
+            self.checkpoint.record(result)
+        if on_result:
+            on_result(result)
+
+    def summary(self, elapsed=None):
+        """
+        Aggregates per-model totals across every finished game.
+        """
+        usage = defaultdict(new_usage)
+        stats = defaultdict(lambda: {
+            "games": 0, "wins": 0, "draws": 0, "losses": 0,
+            "total_score": 0, "early_terminations": 0, "transport_errors": 0,
+        })
+        for result in self.results:
+            scores = result["scores"]
+            best = max(scores.values()) if scores else 0
+            leaders = [name for name, score in scores.items() if score == best]
+            for model in result["models"]:
+                entry = stats[model]
+                entry["games"] += 1
+                entry["total_score"] += scores.get(model, 0)
+                if result["early_loser"] == model:
+                    entry["early_terminations"] += 1
+                if model in leaders and len(leaders) == 1:
+                    entry["wins"] += 1
+                elif model in leaders:
+                    entry["draws"] += 1
+                else:
+                    entry["losses"] += 1
+
+            for model, count in result.get("transport_errors", {}).items():
+                stats[model]["transport_errors"] += count
+            for model, used in result.get("usage", {}).items():
+                merge_usage(usage[model], used)
+
+        for model, used in usage.items():
+            stats[model]["usage"] = summarize_usage(used)
+
+        for entry in stats.values():
+            entry["avg_score"] = entry["total_score"] / entry["games"] if entry["games"] else 0
+            entry["win_rate"] = entry["wins"] / entry["games"] if entry["games"] else 0
+
+        speculation = None
+        if self.speculate:
+            speculation = defaultdict(int)
+            for result in self.results:
+                for key, value in (result.get("speculation") or {}).items():
+                    if key != "hit_rate":
+                        speculation[key] += value
+            speculated = speculation["speculated_turns"]
+            speculation["hit_rate"] = speculation["hits"] / speculated if speculated else 0.0
+            speculation = dict(speculation)
+
+        return {
+            "games": len(self.results),
+            "cache": self.cache.stats() if self.cache is not None else None,
+            "speculation": speculation,
+            "batching": self.batcher.batching_stats() if self.batcher is not None else None,
+            "scheduler": self.scheduler.stats(),
+            "metrics": self.instrumentation.snapshot(),
+            "failed_games": sum(1 for r in self.results if r["error"]),
+            "elapsed": elapsed,
+            "models": dict(sorted(stats.items(), key=lambda x: x[1]["win_rate"], reverse=True)),
+        }
+
+def print_summary(summary):
+    print(f"\n=== Tournament Summary ({summary['games']} games) ===")
+    if summary["elapsed"] is not None:
+        print(f"Elapsed: {summary['elapsed']:.1f}s | Failed games: {summary['failed_games']}")
+    if summary.get("cache"):
+        cache = summary["cache"]
+        print(f"Move cache: {cache['hits']} hits ({cache['disk_hits']} from disk), "
+              f"{cache['misses']} misses, {cache['bypassed']} bypassed ({cache['hit_rate'] * 100:.1f}% hit rate)")
+    if summary.get("metrics"):
+        metrics = summary["metrics"]
+        phases = ", ".join(f"{phase} {stats['seconds']:.2f}s" for phase, stats in metrics["phases"].items())
+        print(f"Time: {metrics['decide_seconds']:.1f}s waiting on players, "
+              f"{metrics['engine_seconds']:.3f}s in the engine ({phases})")
+    if summary.get("speculation"):
+        spec = summary["speculation"]
+        print(f"Speculation: {spec['hits']}/{spec['speculated_turns']} turns hit "
+              f"({spec['hit_rate'] * 100:.1f}%), {spec['requests']} speculative requests, "
+              f"{spec['extra_requests']} wasted ({spec['extra_tokens']} extra tokens)")
+    if summary.get("batching"):
+        batching = summary["batching"]
+        print(f"Batching: {batching['decisions']} moves in {batching['batches']} requests "
+              f"(mean batch {batching['mean_size']:.1f}, sizes {batching['sizes']}), "
+              f"{batching['mean_wait'] * 1000:.0f}ms mean added wait (max {batching['max_wait'] * 1000:.0f}ms), "
+              f"{batching['failed_answers']} unusable answers")
+    for model, stats in (summary.get("scheduler") or {}).items():
+        if stats["retries"] or stats["transport_failures"] or stats["rejected"]:
+            print(f"{model} requests: {stats['requests']} sent, {stats['retries']} retried "
+                  f"({stats['throttled']} throttled), {stats['transport_failures']} failed, "
+                  f"{stats['rejected']} rejected by open circuit")
+    for model, entry in summary["models"].items():
+        print(f"{model}")
+        print(f"   {entry['wins']}W/{entry['losses']}L/{entry['draws']}D "
+              f"({entry['win_rate'] * 100:.1f}%) | Avg score: {entry['avg_score']:.2f} "
+              f"| Early terminations: {entry['early_terminations']} "
+              f"| Transport errors: {entry['transport_errors']}")
+        used = entry.get("usage")
+        if used and used["requests"]:
+            p50, p90 = used["latency_p50"], used["latency_p90"]
+            print(f"   {used['requests']} requests ({used['cached']} cached) | "
+                  f"{used['prompt_tokens']} prompt + {used['completion_tokens']} completion tokens | "
+                  f"${used['cost']:.4f} | latency p50 {p50:.2f}s p90 {p90:.2f}s")
@@ -3,24 +3,27 @@ import logging
 from datetime import datetime
 import os
 
-def setup_logging(level=logging.DEBUG):
+def setup_logging(level=logging.INFO):
     logging.basicConfig(
         level=level,
         format='%(asctime)s - %(levelname)s - %(message)s',
         datefmt='%H:%M:%S'
     )
 
-def generate_game_filename():
+def generate_game_filename(suffix=None):
     # Create logs directory if it doesn't exist
     os.makedirs('logs', exist_ok=True)
     
     # Generate filename with timestamp and models
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    # Concurrent games finish within the same second, so they need a suffix
+    if suffix:
+        return f'logs/game_{timestamp}_{suffix}.json'
     return f'logs/game_{timestamp}.json'
 
-def save_game_log(game_log, metadata=None, filename=None):
+def save_game_log(game_log, metadata=None, filename=None, suffix=None):
     if filename is None:
-        filename = generate_game_filename()
+        filename = generate_game_filename(suffix)
         
     # Create a complete game record with metadata
     game_record = {